@@ -1,9 +1,18 @@
-# Ce fichier permet l'importation des classes d'agents comme un module Python
-from .gaz_expert import GazExpertAgent
-from .veille_agent import VeilleAgent
-from .visualization_agent import VisualizationAgent
-from .qa_agent import QAAgent
-from .orchestrator import run_agent_workflow, setup_agent_graph
+# Ce fichier permet l'importation des classes d'agents comme un module Python.
+# Les agents et l'orchestrateur sont importés à leur premier accès (from agents import QAAgent),
+# pour que les commandes qui n'en ont pas besoin ne chargent pas LangChain.
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'GazExpertAgent': 'agents.gaz_expert',
+    'VeilleAgent': 'agents.veille_agent',
+    'VisualizationAgent': 'agents.visualization_agent',
+    'QAAgent': 'agents.qa_agent',
+    'run_agent_workflow': 'agents.orchestrator',
+    'setup_agent_graph': 'agents.orchestrator',
+    'warm_up': 'agents.orchestrator',
+    'get_startup_report': 'agents.orchestrator'
+}
 
 __all__ = [
     'GazExpertAgent',
@@ -11,5 +20,14 @@ __all__ = [
     'VisualizationAgent',
     'QAAgent',
     'run_agent_workflow',
-    'setup_agent_graph'
+    'setup_agent_graph',
+    'warm_up',
+    'get_startup_report'
 ]
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from config import BATCH_MAX_CONCURRENCY
+
+class BatchProcessingMixin:
+    """Ajoute à un agent le traitement groupé de requêtes avec une concurrence bornée"""
+
+    def _process_item(self, item):
+        # Un tuple est déplié en arguments de process (ex: (demande, données) pour la visualisation)
+        if isinstance(item, tuple):
+            return self.process(*item)
+        return self.process(item)
+
+    def process_many(self, queries: List[Any], max_concurrency: Optional[int] = None,
+                     return_exceptions: bool = False) -> List[Any]:
+        """
+        Traite plusieurs requêtes en parallèle
+
+        Args:
+            queries: Requêtes à traiter (chaînes, ou tuples d'arguments de process)
+            max_concurrency: Nombre maximal de requêtes simultanées (BATCH_MAX_CONCURRENCY par défaut)
+            return_exceptions: Retourner les exceptions à la place des réponses en échec
+                au lieu d'interrompre le lot
+
+        Returns:
+            Les réponses, dans l'ordre des requêtes
+        """
+        if not queries:
+            return []
+
+        def run(item):
+            try:
+                return self._process_item(item)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        workers = max(1, min(max_concurrency or BATCH_MAX_CONCURRENCY, len(queries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, queries))
@@ -3,13 +3,14 @@ from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from typing import Dict, Any
 from utils.azure_client import get_azure_llm
+from agents.batching import BatchProcessingMixin
 from config import MODELS, SYSTEM_MESSAGES
 
-class GazExpertAgent:
+class GazExpertAgent(BatchProcessingMixin):
     """Agent expert en gaz et infrastructure gazière"""
     
     def __init__(self):
-        self.llm = get_azure_llm(deployment_name=MODELS["gaz_expert"], temperature=0.1)
+        self.llm = get_azure_llm(deployment_name=MODELS["gaz_expert"], temperature=0.1, agent="gaz_expert")
         self.system_message = SYSTEM_MESSAGES["gaz_expert"]
         
         # Initialiser le prompt
@@ -3,15 +3,16 @@ from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain.tools import tool
 from utils.azure_client import get_azure_llm
-from utils.document_processor import search_documents
-from config import MODELS, SYSTEM_MESSAGES
+from agents.batching import BatchProcessingMixin
+from utils.hierarchical_search import search_documents_hierarchical, search_documents_hierarchical_batch
+from config import MODELS, SYSTEM_MESSAGES, BATCH_MAX_CONCURRENCY
 from typing import List, Dict
 
-class EnhancedGazExpertAgent:
+class EnhancedGazExpertAgent(BatchProcessingMixin):
     """Version améliorée de l'agent expert en gaz utilisant la base documentaire"""
     
     def __init__(self):
-        self.llm = get_azure_llm(deployment_name=MODELS["gaz_expert"], temperature=0.1)
+        self.llm = get_azure_llm(deployment_name=MODELS["gaz_expert"], temperature=0.1, agent="gaz_expert")
         self.system_message = SYSTEM_MESSAGES["gaz_expert"]
         
         # Initialiser la chaîne principale avec RAG (Retrieval Augmented Generation)
@@ -59,6 +60,11 @@ class EnhancedGazExpertAgent:
             title = metadata.get("title", "Document sans titre")
             doc_type = metadata.get("document_type", "Type inconnu")
             
+            # Passage présent dans plusieurs documents (versions d'une même procédure)
+            others = [source["title"] for source in doc.get("sources", []) if source["doc_id"] != metadata.get("doc_id")]
+            if others:
+                title = f"{title} (également dans : {', '.join(others)})"
+            
             context.append(f"Document {i} ({doc_type}): {title}\n{content}\n")
         
         return "\n".join(context)
@@ -67,7 +73,7 @@ class EnhancedGazExpertAgent:
     def distribution_gaz_info(self, query):
         """Outil permettant d'obtenir des informations sur la distribution du gaz"""
         # Rechercher des documents pertinents
-        docs = search_documents(f"distribution gaz {query}", limit=3)
+        docs = search_documents_hierarchical(f"distribution gaz {query}", limit=3)
         context = self._format_context(docs)
         
         # Exécuter la chaîne avec les documents récupérés
@@ -76,7 +82,7 @@ class EnhancedGazExpertAgent:
     @tool
     def securite_gaz_info(self, query):
         """Outil permettant d'obtenir des informations sur la sécurité liée au gaz"""
-        docs = search_documents(f"sécurité gaz {query}", limit=3)
+        docs = search_documents_hierarchical(f"sécurité gaz {query}", limit=3)
         context = self._format_context(docs)
         
         return self.chain.run(query=f"Concernant la sécurité gazière: {query}", context=context)
@@ -84,7 +90,7 @@ class EnhancedGazExpertAgent:
     @tool
     def reglementation_gaz_info(self, query):
         """Outil permettant d'obtenir des informations sur les réglementations du gaz"""
-        docs = search_documents(f"réglementation gaz {query}", limit=3)
+        docs = search_documents_hierarchical(f"réglementation gaz {query}", limit=3)
         context = self._format_context(docs)
         
         return self.chain.run(query=f"Concernant la réglementation gazière: {query}", context=context)
@@ -100,7 +106,7 @@ class EnhancedGazExpertAgent:
     def process(self, query):
         """Traite directement une requête avec l'agent expert en gaz"""
         # Rechercher des documents pertinents
-        docs = search_documents(query, limit=3)
+        docs = search_documents_hierarchical(query, limit=3)
         
         # Si des documents sont trouvés, utiliser la chaîne avec RAG
         if docs:
@@ -109,3 +115,33 @@ class EnhancedGazExpertAgent:
         
         # Sinon, utiliser la chaîne simple
         return self.simple_chain.run(query=query)
+    
+    def process_many(self, queries, max_concurrency=None, return_exceptions=False):
+        """Traite plusieurs requêtes : recherche documentaire groupée, puis générations en parallèle"""
+        if not queries:
+            return []
+        
+        # Une seule requête d'embeddings et une recherche vectorielle groupée pour tout le lot
+        docs_per_query = search_documents_hierarchical_batch(queries, limit=3)
+        
+        rag_positions, rag_inputs = [], []
+        simple_positions, simple_inputs = [], []
+        for i, (query, docs) in enumerate(zip(queries, docs_per_query)):
+            if docs:
+                rag_positions.append(i)
+                rag_inputs.append({"query": query, "context": self._format_context(docs)})
+            else:
+                simple_positions.append(i)
+                simple_inputs.append({"query": query})
+        
+        config = {"max_concurrency": max_concurrency or BATCH_MAX_CONCURRENCY}
+        responses = [None] * len(queries)
+        for chain, positions, inputs in ((self.chain, rag_positions, rag_inputs),
+                                         (self.simple_chain, simple_positions, simple_inputs)):
+            if not inputs:
+                continue
+            outputs = chain.batch(inputs, config=config, return_exceptions=return_exceptions)
+            for position, output in zip(positions, outputs):
+                responses[position] = output if isinstance(output, Exception) else output["text"]
+        
+        return responses
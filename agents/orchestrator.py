@@ -7,9 +7,26 @@ from agents.gaz_expert import GazExpertAgent
 from agents.veille_agent import VeilleAgent
 from agents.visualization_agent import VisualizationAgent
 from agents.qa_agent import QAAgent
-from config import MODELS
+from config import (
+    MODELS, AGENT_WARMUP_AGENTS, AGENT_NODE_MAX_CONCURRENCY, AGENT_NODE_CONCURRENCY, AGENT_SPECULATIVE_EXECUTION,
+    AGENT_FANOUT_BRANCHES, AGENT_FANOUT_TIMEOUT, AGENT_FANOUT_TIMEOUTS, REQUEST_TIMEOUT, DEGRADED_ANSWER_TIMEOUT,
+    METRICS_PORT
+)
+from utils.model_tiering import tiering_query_scope
+from utils.answer_warehouse import lookup_precomputed_answer
+from utils.tracing import start_metrics_server, trace_span
+from utils.process_memory import rss_bytes
+from utils.deadline import (deadline_scope, cancel_scope, call_with_deadline, check_deadline, remaining_time,
+                            DeadlineExceeded)
+import os
+import time
+import argparse
+import threading
 import traceback
-from typing import Dict, Any, TypedDict, Literal
+import contextvars
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, TypedDict, Literal, Callable, List, Optional
 
 # Définir la structure d'état du graphe
 class AgentState(TypedDict):
@@ -30,8 +47,9 @@ def create_router_chain():
     2. "veille": Agent de veille stratégique (concurrence, tendances du marché, évolutions technologiques et réglementaires)
     3. "visualisation": Agent spécialisé en visualisations et présentations de données
     4. "qa": Agent généraliste de questions-réponses quand la requête ne correspond pas clairement à un autre agent
+    5. "multi": Question mixte qui demande à la fois une expertise technique sur le gaz et une analyse de veille (marché, concurrence, tendances)
 
-    Analyse attentivement la requête suivante et réponds uniquement avec le nom de l'agent que tu recommandes (expert_gaz, veille, visualisation ou qa):
+    Analyse attentivement la requête suivante et réponds uniquement avec le nom de l'agent que tu recommandes (expert_gaz, veille, visualisation, qa ou multi):
     
     Requête: {query}
     """
@@ -44,94 +62,451 @@ def create_router_chain():
     # Utiliser RunnablePassthrough au lieu de LLMChain
     return prompt | llm
 
-def setup_agent_graph():
-    """Configure le graphe des agents avec Langgraph"""
+def create_synthesis_chain():
+    """Crée une chaîne LLM qui fusionne les réponses de plusieurs agents en une seule"""
+    llm = get_azure_llm(deployment_name=MODELS["qa"], temperature=0.1)
+    
+    synthesis_template = """
+    Tu es l'assistant de GRDF. Plusieurs agents spécialisés ont répondu en parallèle à la même requête.
+    Rédige une réponse unique, structurée et sans redite, qui combine leurs apports.
+    Signale les éventuelles contradictions plutôt que de les masquer.
+    
+    Requête: {query}
+    
+    Réponses des agents:
+    {answers}
+    """
+    
+    prompt = PromptTemplate(
+        template=synthesis_template,
+        input_variables=["query", "answers"]
+    )
+    
+    return prompt | llm
+
+# Rapport de démarrage : durée de chaque étape de construction et phase où elle a eu lieu
+_STARTUP_STAGES: Dict[str, Dict[str, Any]] = {}
+_STARTUP_LOCK = threading.Lock()
+
+def _record_startup(stage: str, seconds: float, phase: str):
+    with _STARTUP_LOCK:
+        _STARTUP_STAGES[stage] = {"seconds": round(seconds, 3), "phase": phase}
+
+def get_startup_report() -> Dict[str, Any]:
+    """Retourne les durées de construction mesurées (graphe, routeur, agents) et la mémoire résidente"""
+    with _STARTUP_LOCK:
+        stages = {stage: dict(info) for stage, info in _STARTUP_STAGES.items()}
+    return {
+        "stages": stages,
+        "built_agents": sorted(name for name, agent in AGENT_NODES.items() if agent.is_built),
+        "pending_agents": sorted(name for name, agent in AGENT_NODES.items() if not agent.is_built),
+        "total_seconds": round(sum(info["seconds"] for info in stages.values()), 3),
+        "rss_bytes": rss_bytes()
+    }
+
+def format_startup_report(report: Dict[str, Any]) -> str:
+    """Met en forme le rapport de démarrage pour l'affichage console"""
+    lines = ["Rapport de démarrage :"]
+    for stage, info in report["stages"].items():
+        lines.append(f"  - {stage}: {info['seconds']:.3f}s ({info['phase']})")
+    lines.append(f"  Total: {report['total_seconds']:.3f}s, mémoire résidente: {report['rss_bytes'] / 1e6:.1f} Mo")
+    if report["pending_agents"]:
+        lines.append(f"  Agents construits à la première requête: {', '.join(report['pending_agents'])}")
+    return "\n".join(lines)
+
+class LazyAgent:
+    """Construit un agent à sa première utilisation (une seule fois, même en concurrence)"""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_built(self) -> bool:
+        return self._instance is not None
+
+    def get(self, phase: str = "requête"):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start_time = time.perf_counter()
+                    self._instance = self.factory()
+                    _record_startup(f"agent:{self.name}", time.perf_counter() - start_time, phase)
+        return self._instance
+
+def _tools_of(name: str) -> List:
+    """Outils d'un agent (liste vide si erreur)"""
     try:
-        # Créer les instances d'agents
-        gaz_expert = GazExpertAgent()
-        veille_agent = VeilleAgent()
-        visualization_agent = VisualizationAgent()
-        
-        # Obtenir les outils (liste vide si erreur)
-        try:
-            gaz_expert_tools = gaz_expert.get_tools()
-        except Exception as e:
-            print(f"Erreur lors de l'initialisation des outils de l'expert gaz: {str(e)}")
-            gaz_expert_tools = []
-            
-        try:
-            veille_tools = veille_agent.get_tools()
-        except Exception as e:
-            print(f"Erreur lors de l'initialisation des outils de veille: {str(e)}")
-            veille_tools = []
-            
+        return AGENT_NODES[name].get().get_tools()
+    except Exception as e:
+        print(f"Erreur lors de l'initialisation des outils de l'agent {name}: {str(e)}")
+        return []
+
+# L'agent QA coordonne les autres agents : sa construction déclenche la leur
+QA_DEPENDENCIES = ["expert_gaz", "veille", "visualisation"]
+
+def _create_qa_agent():
+    return QAAgent(
+        gaz_expert_tools=_tools_of("expert_gaz"),
+        veille_tools=_tools_of("veille"),
+        visualization_tools=_tools_of("visualisation")
+    )
+
+class NodeLimiter:
+    """
+    Borne le nombre d'exécutions simultanées d'un nœud et mesure le pic atteint
+
+    À prendre dans le thread qui exécute réellement le travail (voir run_limited) : un appel
+    abandonné à l'échéance garde sa place jusqu'à sa fin effective. L'attente d'une place
+    s'arrête à l'échéance ou à l'annulation de la requête.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+
+    def __enter__(self):
+        while True:
+            check_deadline("file d'attente du nœud")
+            remaining = remaining_time()
+            # Attente par tranches : l'annulation (cancel_scope) est prise en compte sans échéance
+            if self._semaphore.acquire(timeout=0.05 if remaining is None else min(remaining, 0.05)):
+                break
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.in_flight)
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+def run_limited(limiter: NodeLimiter, function: Callable, *args: Any, stage: str = "") -> Any:
+    """
+    Exécute function sous l'échéance de la requête en occupant une place de limiter
+
+    La place est prise et rendue par le thread de call_with_deadline : un travail abandonné
+    (échéance dépassée) reste compté jusqu'à ce qu'il s'arrête, au lieu d'échapper à la limite.
+    """
+    def limited():
+        with limiter:
+            check_deadline(stage)
+            return function(*args)
+    return call_with_deadline(limited, stage=stage)
+
+def _parse_node_settings(spec: str, cast: Callable = int) -> Dict[str, Any]:
+    """Analyse "nœud=valeur,..." (AGENT_NODE_CONCURRENCY, AGENT_FANOUT_TIMEOUTS)"""
+    values = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
         try:
-            visualization_tools = visualization_agent.get_tools()
-        except Exception as e:
-            print(f"Erreur lors de l'initialisation des outils de visualisation: {str(e)}")
-            visualization_tools = []
-        
-        qa_agent = QAAgent(
-            gaz_expert_tools=gaz_expert_tools, 
-            veille_tools=veille_tools, 
-            visualization_tools=visualization_tools
-        )
-        
-        # Créer le routeur
+            values[name.strip()] = cast(value)
+        except ValueError:
+            raise ValueError(f"Valeur invalide pour le nœud {name.strip()!r}: {value!r}")
+    return values
+
+# Nœuds d'agents du graphe, construits à la demande
+AGENT_NODES: Dict[str, LazyAgent] = {
+    "expert_gaz": LazyAgent("expert_gaz", GazExpertAgent),
+    "veille": LazyAgent("veille", VeilleAgent),
+    "visualisation": LazyAgent("visualisation", VisualizationAgent),
+    "qa": LazyAgent("qa", _create_qa_agent),
+}
+
+_NODE_LIMITS = _parse_node_settings(AGENT_NODE_CONCURRENCY)
+NODE_LIMITERS: Dict[str, NodeLimiter] = {
+    name: NodeLimiter(_NODE_LIMITS.get(name, AGENT_NODE_MAX_CONCURRENCY))
+    for name in ["router", *AGENT_NODES, "multi"]
+}
+
+# Branches du nœud "multi" et délai maximal de chacune
+FANOUT_BRANCHES = [name.strip() for name in AGENT_FANOUT_BRANCHES.split(",") if name.strip()]
+_FANOUT_TIMEOUTS = _parse_node_settings(AGENT_FANOUT_TIMEOUTS, cast=float)
+
+def fanout_timeout(name: str) -> float:
+    """Délai maximal (secondes) accordé à une branche du nœud multi"""
+    return _FANOUT_TIMEOUTS.get(name, AGENT_FANOUT_TIMEOUT)
+
+def get_node_stats() -> Dict[str, Dict[str, int]]:
+    """Limite, appels, exécutions en cours et pic de concurrence de chaque nœud"""
+    return {
+        name: {"limit": limiter.limit, "calls": limiter.calls, "in_flight": limiter.in_flight, "peak": limiter.peak}
+        for name, limiter in NODE_LIMITERS.items()
+    }
+
+def normalize_route(agent_path: str) -> str:
+    """Convertit la réponse du routeur en nom de nœud (qa par défaut)"""
+    # Mapper le chemin de l'agent à la destination correspondante
+    route_map = {
+        "expert_gaz": "expert_gaz",
+        "veille": "veille", 
+        "visualisation": "visualisation",
+        "visualization": "visualisation",
+        "qa": "qa",
+        "q&a": "qa",
+        "question": "qa",
+        "multi": "multi",
+    }
+    return route_map.get(agent_path.strip().lower(), "qa")
+
+# Mots-clés de l'heuristique de spéculation (comparés sans accents ni majuscules)
+SPECULATION_KEYWORDS = {
+    "expert_gaz": ["gaz", "reseau", "distribution", "canalisation", "securite", "fuite", "compteur",
+                   "pression", "norme", "reglementation", "biomethane", "raccordement", "installation"],
+    "veille": ["veille", "concurren", "tendance", "marche", "innovation", "strategi", "actualite",
+               "evolution", "prospective"],
+    "visualisation": ["graphique", "visualis", "tableau", "excel", "courbe", "diagramme", "rapport",
+                      "presentation", "dashboard"],
+}
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", text.lower()) if unicodedata.category(c) != "Mn")
+
+def predict_route(query: str) -> Optional[str]:
+    """
+    Prédit localement l'agent spécialisé le plus probable (sans appel LLM)
+    
+    Returns:
+        Le nom du nœud prédit, ou None si aucun agent ne se détache (pas de spéculation)
+    """
+    text = _strip_accents(query)
+    scores = {route: sum(keyword in text for keyword in keywords)
+              for route, keywords in SPECULATION_KEYWORDS.items()}
+    best = max(scores.values())
+    candidates = [route for route, score in scores.items() if score == best]
+    if best == 0 or len(candidates) > 1:
+        return None
+    return candidates[0]
+
+class SpeculationStats:
+    """Compteurs de l'exécution spéculative : taux de réussite et latence économisée"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.saved_seconds = 0.0
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def record_hit(self, saved_seconds: float):
+        with self._lock:
+            self.attempts += 1
+            self.hits += 1
+            self.saved_seconds += max(saved_seconds, 0.0)
+
+    def record_miss(self, cancelled: bool):
+        with self._lock:
+            self.attempts += 1
+            self.misses += 1
+            self.cancelled += cancelled
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "cancelled_before_start": self.cancelled,
+                "hit_rate": round(self.hits / self.attempts, 3) if self.attempts else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "avg_saved_seconds_per_hit": round(self.saved_seconds / self.hits, 3) if self.hits else 0.0
+            }
+
+SPECULATION_STATS = SpeculationStats()
+
+def get_speculation_stats() -> Dict[str, Any]:
+    """Taux de réussite de la spéculation et latence économisée"""
+    return SPECULATION_STATS.snapshot()
+
+# Pool des appels d'agents lancés hors du fil de la requête (spéculation, branches du nœud multi).
+# Ces tâches n'en soumettent pas d'autres : pas d'interblocage possible.
+_NODE_EXECUTOR = None
+_NODE_EXECUTOR_LOCK = threading.Lock()
+
+def _get_node_executor() -> ThreadPoolExecutor:
+    global _NODE_EXECUTOR
+    with _NODE_EXECUTOR_LOCK:
+        if _NODE_EXECUTOR is None:
+            _NODE_EXECUTOR = ThreadPoolExecutor(max_workers=AGENT_NODE_MAX_CONCURRENCY * len(AGENT_NODES),
+                                                thread_name_prefix="agent-node")
+        return _NODE_EXECUTOR
+
+def _submit(function: Callable, *args: Any):
+    """Soumet une tâche au pool en lui transmettant le contexte (dont l'échéance) de la requête"""
+    context = contextvars.copy_context()
+    return _get_node_executor().submit(context.run, function, *args)
+
+def setup_agent_graph(speculative: Optional[bool] = None):
+    """
+    Configure le graphe des agents avec Langgraph (les agents sont construits à leur premier appel)
+    
+    Args:
+        speculative: Lancer l'agent prédit localement pendant l'appel au routeur
+            (AGENT_SPECULATIVE_EXECUTION par défaut). Sa réponse est gardée si le routeur confirme.
+    """
+    if speculative is None:
+        speculative = AGENT_SPECULATIVE_EXECUTION
+    unknown = [name for name in FANOUT_BRANCHES if name not in AGENT_NODES]
+    if unknown:
+        raise ValueError(f"Branches multi inconnues: {', '.join(unknown)} (disponibles: {', '.join(AGENT_NODES)})")
+    try:
+        # Créer le routeur et la chaîne de synthèse du nœud multi
         router_chain = create_router_chain()
+        synthesis_chain = create_synthesis_chain()
         
         # Définir l'état initial - correction pour utiliser la syntaxe actuelle
         workflow = StateGraph(AgentState)
         
         # Wrapper pour sécuriser les appels aux agents
-        def safe_process(agent, query):
+        def safe_process(name, query):
+            # Une erreur de construction remonte jusqu'au fallback de run_agent_workflow
+            agent = AGENT_NODES[name].get()
             try:
-                response = agent.process(query)
+                with trace_span(f"agent.{name}"), tiering_query_scope(query):
+                    response = run_limited(NODE_LIMITERS[name], agent.process, query, stage=name)
                 if hasattr(response, 'content'):
                     return response.content
                 return str(response)
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 traceback.print_exc()
                 return f"Erreur lors du traitement par l'agent: {str(e)}"
         
+        def timed_process(name, query, cancel):
+            # Agent spéculatif : arrêté au prochain point d'annulation si le routeur le contredit
+            with cancel_scope(cancel):
+                start_time = time.perf_counter()
+                response = safe_process(name, query)
+                return response, time.perf_counter() - start_time
+        
         # Ajouter les nœuds d'agents sécurisés
-        workflow.add_node("router", lambda state: {"agent_path": router_chain.invoke(state["query"]).content})
-        workflow.add_node("expert_gaz", lambda state: {"response": safe_process(gaz_expert, state["query"])})
-        workflow.add_node("veille", lambda state: {"response": safe_process(veille_agent, state["query"])})
-        workflow.add_node("visualisation", lambda state: {"response": safe_process(visualization_agent, state["query"])})
-        workflow.add_node("qa", lambda state: {"response": safe_process(qa_agent, state["query"])})
+        def route(state):
+            query = state["query"]
+            predicted = predict_route(query) if speculative else None
+            future = None
+            cancel = threading.Event()
+            if predicted:
+                start_time = time.perf_counter()
+                future = _submit(timed_process, predicted, query, cancel)
+            elif speculative:
+                SPECULATION_STATS.record_skip()
+            
+            router_start = time.perf_counter()
+            try:
+                with trace_span("router", speculated=predicted) as span:
+                    agent_path = run_limited(NODE_LIMITERS["router"], router_chain.invoke, query, stage="routeur").content
+                    if span is not None:
+                        span.set_attribute("route", normalize_route(agent_path))
+            except Exception:
+                if future is not None:
+                    cancel.set()
+                    future.cancel()
+                raise
+            router_seconds = time.perf_counter() - router_start
+            
+            if future is None:
+                return {"agent_path": agent_path}
+            if normalize_route(agent_path) == predicted:
+                # Le routeur confirme : réutiliser la réponse déjà en cours de calcul
+                try:
+                    response, agent_seconds = future.result(timeout=remaining_time())
+                except FutureTimeoutError:
+                    raise DeadlineExceeded(predicted)
+                SPECULATION_STATS.record_hit(router_seconds + agent_seconds - (time.perf_counter() - start_time))
+                return {"agent_path": agent_path, "response": response}
+            
+            # Mauvaise prédiction : retirer la tâche si l'agent n'a pas démarré, sinon l'arrêter
+            # à son prochain point d'annulation (appel LLM, recherche) ; sa réponse est ignorée
+            cancel.set()
+            SPECULATION_STATS.record_miss(cancelled=future.cancel())
+            return {"agent_path": agent_path}
+        
+        workflow.add_node("router", route)
+        for name in AGENT_NODES:
+            workflow.add_node(name, lambda state, name=name: {"response": safe_process(name, state["query"])})
         
         # Configurer le flux
         workflow.set_entry_point("router")
         
+        def fan_out(state):
+            """Interroge les agents de FANOUT_BRANCHES en parallèle puis fusionne leurs réponses"""
+            query = state["query"]
+            with trace_span("multi", branches=",".join(FANOUT_BRANCHES)) as span, NODE_LIMITERS["multi"]:
+                start_time = time.perf_counter()
+                futures = {name: _submit(safe_process, name, query) for name in FANOUT_BRANCHES}
+                
+                answers = {}
+                for name, future in futures.items():
+                    # Chaque branche dispose de son propre délai, compté depuis le lancement commun,
+                    # sans dépasser l'échéance de la requête
+                    remaining = fanout_timeout(name) - (time.perf_counter() - start_time)
+                    if remaining_time() is not None:
+                        remaining = min(remaining, remaining_time())
+                    try:
+                        answers[name] = future.result(timeout=max(remaining, 0))
+                    except (FutureTimeoutError, DeadlineExceeded):
+                        future.cancel()
+                        print(f"Branche {name} abandonnée après {time.perf_counter() - start_time:.1f}s")
+                    except Exception as e:
+                        print(f"Erreur dans la branche {name}: {str(e)}")
+                
+                if span is not None:
+                    span.set_attribute("answered", ",".join(answers))
+                if not answers:
+                    raise DeadlineExceeded("multi")
+                if len(answers) == 1:
+                    return {"response": next(iter(answers.values()))}
+                
+                formatted = "\n\n".join(f"[{name}]\n{answer}" for name, answer in answers.items())
+                try:
+                    with trace_span("synthesis"):
+                        synthesis = call_with_deadline(synthesis_chain.invoke, {"query": query, "answers": formatted},
+                                                       stage="synthèse")
+                except DeadlineExceeded:
+                    # Plus le temps de synthétiser : juxtaposer les réponses obtenues
+                    return {"response": formatted}
+                return {"response": synthesis.content}
+        
+        workflow.add_node("multi", fan_out)
+        
         # Fonction de routage conditionnelle - version corrigée pour les versions récentes de langgraph
         def route_based_on_agent_path(state):
-            agent_path = state["agent_path"].strip().lower()
-            
-            # Mapper le chemin de l'agent à la destination correspondante
-            route_map = {
-                "expert_gaz": "expert_gaz",
-                "veille": "veille", 
-                "visualisation": "visualisation",
-                "visualization": "visualisation",
-                "qa": "qa",
-                "q&a": "qa",
-                "question": "qa",
-            }
-            
+            # Réponse spéculative confirmée par le routeur : terminer directement
+            if state.get("response"):
+                return "end"
             # Retourner la destination mappée ou qa par défaut
-            return route_map.get(agent_path, "qa")
+            return normalize_route(state["agent_path"])
         
         # Ajouter les conditions de routage avec la syntaxe mise à jour
         workflow.add_conditional_edges("router", route_based_on_agent_path, {
             "expert_gaz": "expert_gaz",
             "veille": "veille",
             "visualisation": "visualisation",
-            "qa": "qa"
+            "qa": "qa",
+            "multi": "multi",
+            "end": END
         })
         
         # Tous les agents vont vers la fin
-        for agent in ["expert_gaz", "veille", "visualisation", "qa"]:
+        for agent in ["expert_gaz", "veille", "visualisation", "qa", "multi"]:
             workflow.add_edge(agent, END)
         
         # Compiler le graphe
@@ -142,21 +517,119 @@ def setup_agent_graph():
 
 # Initialiser le graphe d'agents
 AGENT_GRAPH = None
+_AGENT_GRAPH_LOCK = threading.Lock()
 
-def run_agent_workflow(query):
-    """Exécute le workflow d'agents pour traiter une requête"""
+def get_agent_graph(phase: str = "requête"):
+    """Retourne le graphe d'agents, construit une seule fois même si plusieurs requêtes arrivent ensemble"""
     global AGENT_GRAPH
+    if AGENT_GRAPH is None:
+        with _AGENT_GRAPH_LOCK:
+            if AGENT_GRAPH is None:
+                start_time = time.perf_counter()
+                AGENT_GRAPH = setup_agent_graph()
+                _record_startup("graphe", time.perf_counter() - start_time, phase)
+    return AGENT_GRAPH
+
+def warm_up(agents: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Préchauffe l'orchestrateur avant la première requête (mode serveur)
+    
+    Args:
+        agents: Agents à construire dès maintenant (AGENT_WARMUP_AGENTS par défaut, "all" pour tous).
+            Les autres restent construits à leur première sollicitation.
+    
+    Returns:
+        Le rapport de démarrage (voir get_startup_report)
+    """
+    if agents is None:
+        agents = [name.strip() for name in AGENT_WARMUP_AGENTS.split(",") if name.strip()]
+    if "all" in agents:
+        agents = list(AGENT_NODES)
+    if "qa" in agents:
+        agents = QA_DEPENDENCIES + agents
+    unknown = [name for name in agents if name not in AGENT_NODES]
+    if unknown:
+        raise ValueError(f"Agents inconnus: {', '.join(unknown)} (disponibles: {', '.join(AGENT_NODES)})")
+    
+    if METRICS_PORT:
+        # Serveur de métriques démarré une fois au lancement (un port occupé n'empêche pas de servir)
+        try:
+            start_metrics_server(METRICS_PORT)
+        except OSError as e:
+            print(f"⚠️ Serveur de métriques indisponible sur le port {METRICS_PORT}: {str(e)}")
     
+    get_agent_graph(phase="préchauffage")
+    for name in dict.fromkeys(agents):
+        AGENT_NODES[name].get(phase="préchauffage")
+    return get_startup_report()
+
+def degraded_answer(query):
+    """Réponse rapide (un seul appel LLM à budget court) quand le budget de la requête est épuisé"""
     try:
-        if AGENT_GRAPH is None:
-            AGENT_GRAPH = setup_agent_graph()
-        
-        # Exécuter le graphe avec la requête utilisateur
-        result = AGENT_GRAPH.invoke({"query": query, "agent_path": "", "response": ""})
-        return result["response"]
+        llm = get_azure_llm(deployment_name=MODELS["qa"], temperature=0.1, timeout=DEGRADED_ANSWER_TIMEOUT)
+        response = call_with_deadline(
+            llm.invoke,
+            f"Tu es un assistant pour GRDF qui répond aux questions sur le gaz. Réponds brièvement. Question: {query}",
+            stage="réponse dégradée", timeout=DEGRADED_ANSWER_TIMEOUT
+        ).content
     except Exception as e:
-        traceback.print_exc()
-        # Fallback en cas d'échec du graphe d'agents
-        llm = get_azure_llm(deployment_name=MODELS["qa"], temperature=0.1)
-        fallback_response = llm.invoke(f"Tu es un assistant pour GRDF qui répond aux questions sur le gaz. Question: {query}").content
-        return f"[FALLBACK] {fallback_response}"
+        print(f"Erreur lors de la réponse dégradée: {str(e)}")
+        response = ("Le service est momentanément surchargé: votre demande n'a pas pu être traitée "
+                    "dans le délai imparti. Merci de réessayer dans quelques instants.")
+    return f"[DÉGRADÉ] {response}"
+
+def run_agent_workflow(query, timeout: Optional[float] = None, use_warehouse: bool = True):
+    """
+    Exécute le workflow d'agents pour traiter une requête
+    
+    Args:
+        query: Requête utilisateur
+        timeout: Budget de temps total en secondes (REQUEST_TIMEOUT par défaut, 0 pour aucun).
+            DEGRADED_ANSWER_TIMEOUT secondes sont réservées à la réponse dégradée, renvoyée
+            à la place d'une erreur lorsque le graphe n'a pas fini à temps.
+        use_warehouse: Servir la réponse précalculée d'une question identique ou quasi identique
+            (désactivé par le précalcul lui-même)
+    """
+    budget = REQUEST_TIMEOUT if timeout is None else timeout
+    # Span racine de la requête : routeur, agents, LLM, embeddings, recherche et outils y sont rattachés
+    with trace_span("workflow", query_chars=len(query), budget=budget) as span:
+        if use_warehouse:
+            precomputed = lookup_precomputed_answer(query)
+            if precomputed is not None:
+                if span is not None:
+                    span.set_attribute("outcome", "warehouse")
+                return precomputed["answer"]
+        try:
+            graph = get_agent_graph()
+            
+            # Exécuter le graphe avec la requête utilisateur : chaque appel a son propre état,
+            # le graphe compilé et les agents (sans état par requête) sont partagés entre threads.
+            # L'échéance suit la requête dans le routeur, les agents, la recherche et les outils.
+            with deadline_scope(max(budget - DEGRADED_ANSWER_TIMEOUT, 0) if budget > 0 else None):
+                result = call_with_deadline(graph.invoke, {"query": query, "agent_path": "", "response": ""},
+                                            stage="graphe")
+            if span is not None:
+                span.set_attribute("route", normalize_route(result["agent_path"]))
+            return result["response"]
+        except DeadlineExceeded as e:
+            print(f"Budget de la requête épuisé ({e.stage}): réponse dégradée")
+            if span is not None:
+                span.set_attribute("outcome", "degraded")
+            return degraded_answer(query)
+        except Exception as e:
+            traceback.print_exc()
+            if span is not None:
+                span.set_attribute("outcome", "fallback")
+            # Fallback en cas d'échec du graphe d'agents
+            llm = get_azure_llm(deployment_name=MODELS["qa"], temperature=0.1)
+            fallback_response = llm.invoke(f"Tu es un assistant pour GRDF qui répond aux questions sur le gaz. Question: {query}").content
+            return f"[FALLBACK] {fallback_response}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Préchauffe l'orchestrateur et affiche le rapport de démarrage")
+    parser.add_argument('--agents', type=str, default=None,
+                        help='Agents à construire, séparés par des virgules ("all" pour tous, AGENT_WARMUP_AGENTS par défaut)')
+    args = parser.parse_args()
+    
+    agents = args.agents.split(",") if args.agents is not None else None
+    print(format_startup_report(warm_up(agents)))
@@ -6,15 +6,15 @@ from pydantic import BaseModel, Field  # Utilisation de pydantic directement
 from langchain_core.runnables import RunnablePassthrough
 from typing import List, Dict, Any, Optional
 from utils.azure_client import get_azure_llm
+from agents.batching import BatchProcessingMixin
 from config import MODELS, SYSTEM_MESSAGES
 
-class QAAgent:
+class QAAgent(BatchProcessingMixin):
     """Agent principal de questions-réponses qui coordonne les autres agents"""
     
     def __init__(self, gaz_expert_tools=None, veille_tools=None, visualization_tools=None):
-        self.llm = get_azure_llm(deployment_name=MODELS["qa"], temperature=0.1)
+        self.llm = get_azure_llm(deployment_name=MODELS["qa"], temperature=0.1, agent="qa")
         self.system_message = SYSTEM_MESSAGES["qa"]
-        self.memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
 
         # Collecter tous les outils disponibles et les adapter au besoin
         self.tools = []
@@ -34,6 +34,10 @@ class QAAgent:
         # Ajouter l'outil de réponse directe
         self.tools.append(self._create_answer_tool())
         
+    def _create_memory(self):
+        """Mémoire de conversation propre à une requête : l'instance de l'agent est partagée entre threads"""
+        return ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        
     def _create_answer_tool(self):
         """Crée un outil de réponse directe"""
         @tool("answer_question", return_direct=True)
@@ -63,13 +67,14 @@ class QAAgent:
                 tools=self.tools,
                 llm=self.llm,
                 agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,  # Utilisez un agent plus simple
+                memory=self._create_memory(),
                 verbose=True,
                 handle_parsing_errors=True,
                 max_iterations=3
             )
             
             #return agent_executor.run(query)
-            return agent_executor.invoke({"input": query})
+            return agent_executor.invoke({"input": query})["output"]
 
             
         except Exception as e:
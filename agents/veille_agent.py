@@ -4,13 +4,16 @@ from langchain_core.runnables import RunnablePassthrough
 from typing import Dict, Any
 from langchain_community.utilities.serpapi import SerpAPIWrapper
 from utils.azure_client import get_azure_llm
-from config import MODELS, SYSTEM_MESSAGES, SERPER_API_KEY, SERP_MAX_RESULTS
+from agents.batching import BatchProcessingMixin
+from utils.deadline import call_with_deadline, DeadlineExceeded
+from utils.tracing import trace_span
+from config import MODELS, SYSTEM_MESSAGES, SERPER_API_KEY, SERP_MAX_RESULTS, SERP_TIMEOUT
 
-class VeilleAgent:
+class VeilleAgent(BatchProcessingMixin):
     """Agent de veille stratégique et technologique"""
     
     def __init__(self):
-        self.llm = get_azure_llm(deployment_name=MODELS["veille"], temperature=0.3)
+        self.llm = get_azure_llm(deployment_name=MODELS["veille"], temperature=0.3, agent="veille")
         self.system_message = SYSTEM_MESSAGES["veille"]
         
         # Initialiser l'outil de recherche web si la clé API est disponible
@@ -49,8 +52,13 @@ class VeilleAgent:
             return "Aucune recherche web disponible: clé API de recherche non configurée."
             
         try:
-            results = self.search_tool.run(f"GRDF {query}")
+            # La recherche web ne doit pas consommer tout le budget de la requête
+            with trace_span("serpapi"):
+                results = call_with_deadline(self.search_tool.run, f"GRDF {query}", stage="recherche web",
+                                             timeout=SERP_TIMEOUT)
             return str(results)
+        except DeadlineExceeded:
+            return "Recherche web interrompue: délai dépassé. Réponds avec tes connaissances du secteur."
         except Exception as e:
             return f"Erreur lors de la recherche: {str(e)}"
     
@@ -1,15 +1,17 @@
 from langchain.tools import Tool
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from utils.azure_client import get_azure_llm
-from config import MODELS, SYSTEM_MESSAGES
+from agents.batching import BatchProcessingMixin
+from config import (MODELS, SYSTEM_MESSAGES, VISUALIZATION_OUTPUT_DIR, VISUALIZATION_FORMATS,
+                    VISUALIZATION_LLM_SPEC)
 
-class VisualizationAgent:
+class VisualizationAgent(BatchProcessingMixin):
     """Agent spécialisé dans la création de visualisations et de rapports"""
     
     def __init__(self):
-        self.llm = get_azure_llm(deployment_name=MODELS["visualization"], temperature=0.2)
+        self.llm = get_azure_llm(deployment_name=MODELS["visualization"], temperature=0.2, agent="visualization")
         self.system_message = SYSTEM_MESSAGES["visualization"]
         
         # Initialiser le prompt
@@ -37,33 +39,124 @@ class VisualizationAgent:
             )
         ) | (lambda x: x["response"])
     
+    def _load(self, data: Any):
+        """Charge les données (texte, fichier CSV/Parquet/JSON, DataFrame) ou None si elles ne sont pas tabulaires"""
+        # Import différé : numpy n'est chargé qu'à la première visualisation
+        from utils import data_ingestion
+
+        try:
+            return data_ingestion.load_data(data)
+        except ValueError as e:
+            if not isinstance(data, str) or data_ingestion.is_data_path(data):
+                print(f"Données non exploitables pour le rendu local: {str(e)}")
+            return None
+
+    def _render_locally(self, output: str, query: str, ingested: Any) -> Optional[str]:
+        """
+        Produit localement le graphique, le classeur ou le rapport demandé
+
+        Returns:
+            Un message listant les fichiers produits, ou None si aucun graphique n'est possible
+            (la demande est alors confiée au LLM)
+        """
+        from utils import chart_renderer
+
+        table = ingested.table
+        spec = chart_renderer.choose_chart_spec(table, query, self.llm if VISUALIZATION_LLM_SPEC else None)
+        if not spec.y:
+            return None
+        key = (output, spec.json(), chart_renderer.table_fingerprint(table))
+        title = spec.title or "Visualisation"
+        files = []
+        notes = []
+
+        if output == "excel":
+            path = chart_renderer.output_path(VISUALIZATION_OUTPUT_DIR, title, "xlsx", *key)
+            chart_renderer.write_xlsx(table, path)
+            files.append(path)
+        elif output == "report":
+            path = chart_renderer.output_path(VISUALIZATION_OUTPUT_DIR, title, "html", *key)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(chart_renderer.render_html_report(table, spec, title))
+            files.append(path)
+            if "pdf" in query.lower():
+                pdf_path = chart_renderer.output_path(VISUALIZATION_OUTPUT_DIR, title, "pdf", *key)
+                try:
+                    chart_renderer.render_matplotlib(table, spec, pdf_path)
+                    files.append(pdf_path)
+                except ValueError as e:
+                    notes.append(str(e))
+        else:
+            for extension in [f.strip().lower() for f in VISUALIZATION_FORMATS.split(",") if f.strip()]:
+                path = chart_renderer.output_path(VISUALIZATION_OUTPUT_DIR, title, extension, *key)
+                if extension == "svg":
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(chart_renderer.render_svg(table, spec))
+                    files.append(path)
+                elif extension in ("png", "pdf"):
+                    try:
+                        chart_renderer.render_matplotlib(table, spec, path)
+                        files.append(path)
+                    except ValueError as e:
+                        notes.append(str(e))
+                else:
+                    notes.append(f"Format de graphique inconnu: {extension}")
+
+        if not files:
+            return None
+        description = {"excel": "Classeur Excel", "report": "Rapport"}.get(output, f"Graphique ({spec.kind})")
+        reduction = f", réduites à {len(table)} points" if ingested.reduced else ""
+        message = [f"{description} généré à partir de {ingested.rows} lignes{reduction} "
+                   f"(séries: {', '.join(spec.y)}{f'; abscisse: {spec.x}' if spec.x else ''}) :"]
+        message.extend(f"- {path}" for path in files)
+        message.extend(f"Remarque: {note}" for note in notes)
+        return "\n".join(message)
+
+    def _handle(self, output: str, query: str, data: Any, llm_query: str) -> str:
+        """Rendu local si les données s'y prêtent, sinon instructions détaillées du LLM"""
+        ingested = self._load(data)
+        if ingested is not None:
+            try:
+                rendered = self._render_locally(output, query.strip(), ingested)
+            except Exception as e:
+                print(f"Erreur lors du rendu local de la visualisation: {str(e)}")
+                rendered = None
+            if rendered is not None:
+                return rendered
+            # Fichiers, tables et longues séries : le LLM ne reçoit qu'un résumé de taille constante
+            if ingested.reduced or ingested.source != "texte":
+                data = ingested.describe_for_llm()
+        elif not isinstance(data, str):
+            data = str(data)
+        return self.chain.invoke({"query": llm_query, "data": data})
+
     # Définition des méthodes d'outil sans décorateur
     def create_chart(self, query_and_data: str) -> str:
-        """Outil pour créer des instructions détaillées de graphiques ou charts."""
+        """Outil pour créer un graphique (SVG/PNG) à partir des données ou d'un fichier, ou des instructions détaillées."""
         parts = query_and_data.split("|||")
         if len(parts) != 2:
             return "Format incorrect. Utiliser 'demande||| données'"
         
         query, data = parts
-        return self.chain.invoke({"query": query, "data": data})
+        return self._handle("chart", query, data, query)
     
     def create_excel(self, query_and_data: str) -> str:
-        """Outil pour créer des instructions détaillées pour des tableaux Excel."""
+        """Outil pour créer un classeur Excel à partir des données ou d'un fichier, ou des instructions détaillées."""
         parts = query_and_data.split("|||")
         if len(parts) != 2:
             return "Format incorrect. Utiliser 'demande||| données'"
         
         query, data = parts
-        return self.chain.invoke({"query": f"Créer un tableau Excel pour {query}", "data": data})
+        return self._handle("excel", query, data, f"Créer un tableau Excel pour {query}")
     
     def create_report(self, query_and_data: str) -> str:
-        """Outil pour créer des instructions détaillées pour des rapports."""
+        """Outil pour créer un rapport HTML (et PDF) à partir des données ou d'un fichier, ou des instructions détaillées."""
         parts = query_and_data.split("|||")
         if len(parts) != 2:
             return "Format incorrect. Utiliser 'demande||| données'"
         
         query, data = parts
-        return self.chain.invoke({"query": f"Créer un rapport pour {query}", "data": data})
+        return self._handle("report", query, data, f"Créer un rapport pour {query}")
     
     def get_tools(self):
         """Retourne les outils disponibles pour cet agent"""
@@ -72,21 +165,32 @@ class VisualizationAgent:
             Tool(
                 func=self.create_chart,
                 name="create_chart",
-                description="Crée des instructions détaillées pour des graphiques (format: 'demande||| données')"
+                description="Crée un graphique à partir de données tabulaires ou d'un fichier CSV/Parquet/JSON, ou des instructions détaillées (format: 'demande||| données ou chemin')"
             ),
             Tool(
                 func=self.create_excel,
                 name="create_excel",
-                description="Crée des instructions détaillées pour des tableaux Excel (format: 'demande||| données')"
+                description="Crée un classeur Excel à partir de données tabulaires ou d'un fichier CSV/Parquet/JSON, ou des instructions détaillées (format: 'demande||| données ou chemin')"
             ),
             Tool(
                 func=self.create_report,
                 name="create_report",
-                description="Crée des instructions détaillées pour des rapports (format: 'demande||| données')"
+                description="Crée un rapport HTML à partir de données tabulaires ou d'un fichier CSV/Parquet/JSON, ou des instructions détaillées (format: 'demande||| données ou chemin')"
             )
         ]
         return tools
     
     def process(self, query, data="Aucune donnée fournie"):
-        """Traite directement une requête avec l'agent de visualisation"""
-        return self.chain.invoke({"query": query, "data": data})
+        """
+        Traite directement une requête avec l'agent de visualisation
+
+        data peut être du texte, le chemin d'un fichier CSV/Parquet/JSON, un DataFrame pandas ou une table pyarrow
+        """
+        lowered = query.lower()
+        if "excel" in lowered or "xlsx" in lowered or "tableur" in lowered:
+            output = "excel"
+        elif "rapport" in lowered or "report" in lowered:
+            output = "report"
+        else:
+            output = "chart"
+        return self._handle(output, query, data, query)
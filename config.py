@@ -8,17 +8,164 @@ load_dotenv()
 # Chemins importants
 BASE_DIR = pathlib.Path(__file__).parent.absolute()
 VECTOR_DB_PATH = os.path.join(BASE_DIR, 'vectordb')
+QUANTIZED_VECTOR_DB_PATH = os.path.join(BASE_DIR, 'vectordb_quantized')
+NUMPY_VECTOR_DB_PATH = os.path.join(BASE_DIR, 'vectordb_numpy')
 UPLOADS_DIR = os.path.join(BASE_DIR, 'uploads')
+EXTRACTION_CACHE_DIR = os.getenv('EXTRACTION_CACHE_DIR', os.path.join(BASE_DIR, 'extraction_cache'))
+# Stockage des fichiers importés : 'copy' (reflink si possible, sinon copie), 'link' (reflink/lien physique,
+# la source ne doit plus être modifiée sur place) ou 'reference'
+UPLOAD_STORAGE_MODE = os.getenv('UPLOAD_STORAGE_MODE', 'copy')
+INDEXING_QUEUE_PATH = os.getenv('INDEXING_QUEUE_PATH', os.path.join(BASE_DIR, 'indexing_queue.sqlite3'))
+
+# File d'indexation en arrière-plan
+INDEXING_WORKERS = int(os.getenv('INDEXING_WORKERS', '2'))
+INDEXING_MAX_ATTEMPTS = int(os.getenv('INDEXING_MAX_ATTEMPTS', '3'))
+INDEXING_BACKOFF_BASE = float(os.getenv('INDEXING_BACKOFF_BASE', '5'))
+# Bail (secondes) d'un travail réservé : au-delà, ou si le processus qui l'a réservé n'existe plus,
+# le travail est remis en attente au démarrage des workers
+INDEXING_LEASE_SECONDS = float(os.getenv('INDEXING_LEASE_SECONDS', '1800'))
+
+# Conversion des anciens fichiers .ppt (utils/ppt_converter.py) : processus LibreOffice persistants
+# et délai maximal de conversion d'un fichier (secondes)
+SOFFICE_POOL_SIZE = int(os.getenv('SOFFICE_POOL_SIZE', '1'))
+SOFFICE_TIMEOUT = int(os.getenv('SOFFICE_TIMEOUT', '120'))
 
 # Informations API Azure OpenAI
 AZURE_OPENAI_API_KEY = os.getenv('AZURE_OPENAI_API_KEY')
 AZURE_OPENAI_ENDPOINT = os.getenv('AZURE_OPENAI_ENDPOINT')
 AZURE_API_VERSION = os.getenv('AZURE_API_VERSION', '2023-03-15-preview')
 AZURE_DEPLOYMENT_NAME = os.getenv('AZURE_DEPLOYMENT_NAME', 'gpt-4o-mini')
+# Délai réseau maximal d'un appel Azure OpenAI (secondes) : borne les appels bloqués même sans échéance
+AZURE_REQUEST_TIMEOUT = float(os.getenv('AZURE_REQUEST_TIMEOUT', '60'))
+
+# Déploiements Azure OpenAI (régions, ressources) entre lesquels répartir la charge et basculer,
+# au format JSON par nom de déploiement logique, ex:
+# {"gpt-4o-mini": [{"endpoint": "https://fr.openai.azure.com", "deployment": "gpt-4o-mini"},
+#                  {"endpoint": "https://se.openai.azure.com", "deployment": "gpt-4o-mini", "api_key": "..."}]}
+# Sans entrée, le déploiement est appelé sur AZURE_OPENAI_ENDPOINT.
+AZURE_OPENAI_DEPLOYMENTS = os.getenv('AZURE_OPENAI_DEPLOYMENTS', '')
+# Nouvelles tentatives (429, 5xx, délais réseau) avec attente exponentielle, en secondes
+LLM_MAX_ATTEMPTS = int(os.getenv('LLM_MAX_ATTEMPTS', '4'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '20'))
+# Requête doublée vers un autre déploiement si la première n'a pas répondu après ce délai (0 = désactivé)
+LLM_HEDGE_AFTER = float(os.getenv('LLM_HEDGE_AFTER', '0'))
+# Disjoncteur : déploiement écarté après N échecs consécutifs, puis réessayé après le délai (secondes)
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+# Quotas Azure par déploiement (requêtes et tokens par minute), partagés par tous les appels du processus,
+# au format JSON, ex: {"gpt-4o-mini": {"rpm": 300, "tpm": 50000}, "text-embedding-ada-002": {"tpm": 120000}}
+# 0 = pas de limite connue : le limiteur suit alors seulement les en-têtes de quota et les 429 d'Azure
+AZURE_RATE_LIMITS = os.getenv('AZURE_RATE_LIMITS', '')
+LLM_DEFAULT_RPM = float(os.getenv('LLM_DEFAULT_RPM', '0'))
+LLM_DEFAULT_TPM = float(os.getenv('LLM_DEFAULT_TPM', '0'))
 
 # Configuration de SerpAPI pour la recherche web
 SERPER_API_KEY = os.getenv('SERPER_API_KEY')
 SERP_MAX_RESULTS = int(os.getenv('SERP_MAX_RESULTS', '5'))
+SERP_TIMEOUT = float(os.getenv('SERP_TIMEOUT', '10'))
+
+# Budget de temps d'une requête orchestrée (secondes), propagé au routeur, aux agents,
+# à la recherche documentaire et aux outils. Une part est réservée à la réponse dégradée.
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '60'))
+DEGRADED_ANSWER_TIMEOUT = float(os.getenv('DEGRADED_ANSWER_TIMEOUT', '8'))
+
+# Traçage des étapes d'une requête (routeur, agents, LLM, embeddings, recherche, indexation).
+# Les spans terminés sont ajoutés en JSON Lines à TRACE_EXPORT_PATH (vide = aucun fichier) ;
+# les métriques agrégées sont servies au format Prometheus sur METRICS_PORT (0 = désactivé).
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Base vectorielle : 'chroma' (float32, HNSW), 'numpy' (exacte en mémoire, petits corpus)
+# ou 'quantized' (index local compact mappé en mémoire)
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+# Quantification du backend 'quantized' : 'int8' ou 'pq' (quantification produit)
+VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'int8')
+VECTOR_PQ_SUBVECTORS = int(os.getenv('VECTOR_PQ_SUBVECTORS', '48'))
+# Nombre de candidats (multiple de k) dont la distance est recalculée en float32
+VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', '4'))
+# Index IVF du backend 'quantized' (0 = parcours complet) et nombre de listes sondées par requête
+VECTOR_IVF_LISTS = int(os.getenv('VECTOR_IVF_LISTS', '0'))
+VECTOR_IVF_PROBES = int(os.getenv('VECTOR_IVF_PROBES', '8'))
+# Recherche hiérarchique (expert gaz enrichi) : un résumé par document est indexé à part ; une requête
+# sélectionne d'abord HIERARCHICAL_SEARCH_DOCUMENTS documents, puis ne cherche que dans leurs chunks
+DOCUMENT_SUMMARY_DB_PATH = os.getenv('DOCUMENT_SUMMARY_DB_PATH', os.path.join(BASE_DIR, 'vectordb_summaries'))
+HIERARCHICAL_SEARCH_DOCUMENTS = int(os.getenv('HIERARCHICAL_SEARCH_DOCUMENTS', '5'))
+# Taille (caractères) du résumé extractif embarqué : début du document et extraits répartis
+DOCUMENT_SUMMARY_CHARS = int(os.getenv('DOCUMENT_SUMMARY_CHARS', '2000'))
+# Quasi-doublons à l'indexation (utils/near_duplicates.py) : un chunk dont la similarité MinHash avec un
+# chunk déjà indexé atteint le seuil n'est pas vectorisé, il est ajouté comme source du chunk existant
+NEAR_DUPLICATE_DETECTION = os.getenv('NEAR_DUPLICATE_DETECTION', 'true').lower() in ('1', 'true', 'yes')
+NEAR_DUPLICATE_PATH = os.getenv('NEAR_DUPLICATE_PATH', os.path.join(BASE_DIR, 'near_duplicates.sqlite3'))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.85'))
+# Générations d'index (utils/index_generations.py) : une ré-indexation complète est construite à côté de
+# l'index servi, validée (documents retrouvés sur un échantillon) puis activée par remplacement atomique ;
+# les INDEX_GENERATIONS_KEEP générations précédentes sont conservées pour revenir en arrière
+INDEX_GENERATIONS_DIR = os.getenv('INDEX_GENERATIONS_DIR', os.path.join(BASE_DIR, 'index_generations'))
+INDEX_GENERATIONS_KEEP = int(os.getenv('INDEX_GENERATIONS_KEEP', '2'))
+INDEX_VALIDATION_SAMPLE = int(os.getenv('INDEX_VALIDATION_SAMPLE', '50'))
+INDEX_VALIDATION_MIN_RECALL = float(os.getenv('INDEX_VALIDATION_MIN_RECALL', '0.9'))
+# Fichier verrou (fcntl) des écritures dans la base vectorielle servie, partagé par les processus
+# d'indexation (API, file d'indexation, surveillance de dossiers) et l'activation d'une génération
+VECTORSTORE_LOCK_PATH = os.getenv('VECTORSTORE_LOCK_PATH', os.path.join(BASE_DIR, 'vectorstore.lock'))
+
+# Dossiers surveillés par utils/folder_watcher.py (séparés par des virgules) : les fichiers créés, modifiés
+# ou supprimés sont (ré)indexés après WATCH_DEBOUNCE_SECONDS sans nouvelle modification. Le sondage
+# toutes les WATCH_POLL_INTERVAL secondes remplace inotify lorsqu'il n'est pas disponible
+WATCH_FOLDERS = os.getenv('WATCH_FOLDERS', '')
+WATCH_DEBOUNCE_SECONDS = float(os.getenv('WATCH_DEBOUNCE_SECONDS', '2'))
+WATCH_POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', '5'))
+WATCH_STATE_PATH = os.getenv('WATCH_STATE_PATH', os.path.join(BASE_DIR, 'folder_watcher.sqlite3'))
+# Fichiers modifiés sur place : jamais de lien physique, qui partagerait la modification avec l'upload indexé
+WATCH_STORAGE_MODE = os.getenv('WATCH_STORAGE_MODE', 'copy')
+
+# Nombre maximal de requêtes traitées simultanément par process_many
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '8'))
+
+# Rendu local de l'agent de visualisation : répertoire des fichiers produits et formats des graphiques
+# ('svg', 'png', séparés par des virgules ; 'png' et les rapports PDF nécessitent matplotlib)
+VISUALIZATION_OUTPUT_DIR = os.getenv('VISUALIZATION_OUTPUT_DIR', os.path.join(BASE_DIR, 'static', 'visualizations'))
+VISUALIZATION_FORMATS = os.getenv('VISUALIZATION_FORMATS', 'svg')
+# Demander le type de graphique au LLM quand la demande ne permet pas de le déduire localement
+VISUALIZATION_LLM_SPEC = os.getenv('VISUALIZATION_LLM_SPEC', 'false').lower() in ('1', 'true', 'yes')
+# Ingestion des données à visualiser : lignes lues par bloc et points conservés pour le rendu
+# (séries réduites par LTTB au-delà ; seul un résumé statistique est envoyé au LLM)
+VISUALIZATION_CHUNK_ROWS = int(os.getenv('VISUALIZATION_CHUNK_ROWS', '100000'))
+VISUALIZATION_MAX_POINTS = int(os.getenv('VISUALIZATION_MAX_POINTS', '2000'))
+# Répertoires (séparés par des virgules) dont les fichiers de données peuvent être lus par l'agent de
+# visualisation : un chemin fourni par l'utilisateur ou le LLM hors de ces répertoires est refusé
+VISUALIZATION_DATA_DIRS = [path for path in os.getenv(
+    'VISUALIZATION_DATA_DIRS', f"{os.path.join(BASE_DIR, 'data')},{UPLOADS_DIR}").split(',') if path.strip()]
+# Taille maximale (octets) d'un fichier .json (tableau lu en une fois, contrairement aux CSV, JSON Lines
+# et Parquet lus par blocs)
+VISUALIZATION_JSON_MAX_BYTES = int(os.getenv('VISUALIZATION_JSON_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# Réponses précalculées aux questions fréquentes (utils/answer_warehouse.py) : servies avant le graphe
+# d'agents pour une question identique ou quasi identique (similarité des mots >= seuil), tant que les
+# documents utilisés n'ont pas changé et que la réponse a moins de ANSWER_WAREHOUSE_MAX_AGE_HOURS heures
+ANSWER_WAREHOUSE_ENABLED = os.getenv('ANSWER_WAREHOUSE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ANSWER_WAREHOUSE_PATH = os.getenv('ANSWER_WAREHOUSE_PATH', os.path.join(BASE_DIR, 'answer_warehouse.sqlite3'))
+ANSWER_WAREHOUSE_MATCH_THRESHOLD = float(os.getenv('ANSWER_WAREHOUSE_MATCH_THRESHOLD', '0.85'))
+ANSWER_WAREHOUSE_MAX_AGE_HOURS = float(os.getenv('ANSWER_WAREHOUSE_MAX_AGE_HOURS', '168'))
+
+# Agents construits dès le préchauffage (mode serveur), séparés par des virgules ("all" pour tous).
+# Les autres agents sont construits à leur première sollicitation par le routeur.
+AGENT_WARMUP_AGENTS = os.getenv('AGENT_WARMUP_AGENTS', '')
+
+# Nombre maximal d'exécutions simultanées par nœud du graphe d'agents (routeur compris),
+# avec des valeurs propres à certains nœuds, ex: "veille=2,qa=4"
+AGENT_NODE_MAX_CONCURRENCY = int(os.getenv('AGENT_NODE_MAX_CONCURRENCY', '8'))
+AGENT_NODE_CONCURRENCY = os.getenv('AGENT_NODE_CONCURRENCY', '')
+
+# Exécution spéculative : lancer l'agent prédit par une heuristique locale pendant l'appel au routeur
+AGENT_SPECULATIVE_EXECUTION = os.getenv('AGENT_SPECULATIVE_EXECUTION', 'false').lower() in ('1', 'true', 'yes')
+
+# Nœud "multi" : agents interrogés en parallèle pour les questions mixtes, puis synthèse.
+# Délai maximal par branche (secondes), avec des valeurs propres à certaines branches, ex: "veille=15"
+AGENT_FANOUT_BRANCHES = os.getenv('AGENT_FANOUT_BRANCHES', 'expert_gaz,veille')
+AGENT_FANOUT_TIMEOUT = float(os.getenv('AGENT_FANOUT_TIMEOUT', '30'))
+AGENT_FANOUT_TIMEOUTS = os.getenv('AGENT_FANOUT_TIMEOUTS', '')
 
 # Configuration des modèles
 MODELS = {
@@ -28,6 +175,33 @@ MODELS = {
     "qa": os.getenv('QA_MODEL', AZURE_DEPLOYMENT_NAME)
 }
 
+# Hiérarchisation des modèles : les requêtes simples (complexité estimée sous le seuil, entre 0 et 1)
+# vont au déploiement économique de l'agent, avec escalade vers MODELS en cas d'échec ou de
+# réponse peu sûre. Sans déploiement économique, l'agent utilise toujours MODELS.
+SMALL_MODEL = os.getenv('SMALL_MODEL', '')
+MODEL_TIERS = {
+    "gaz_expert": {
+        "small": os.getenv('GAZ_EXPERT_SMALL_MODEL', SMALL_MODEL),
+        "threshold": float(os.getenv('GAZ_EXPERT_TIER_THRESHOLD', '0.35'))
+    },
+    "veille": {
+        "small": os.getenv('VEILLE_SMALL_MODEL', SMALL_MODEL),
+        "threshold": float(os.getenv('VEILLE_TIER_THRESHOLD', '0.25'))
+    },
+    "visualization": {
+        "small": os.getenv('VISUALIZATION_SMALL_MODEL', SMALL_MODEL),
+        "threshold": float(os.getenv('VISUALIZATION_TIER_THRESHOLD', '0.35'))
+    },
+    "qa": {
+        "small": os.getenv('QA_SMALL_MODEL', SMALL_MODEL),
+        "threshold": float(os.getenv('QA_TIER_THRESHOLD', '0.3'))
+    }
+}
+# Confiance minimale (probabilité moyenne des tokens, 0 à 1) d'une réponse du petit modèle
+TIER_MIN_CONFIDENCE = float(os.getenv('TIER_MIN_CONFIDENCE', '0.6'))
+# Coût en dollars pour 1000 tokens (entrée, sortie) par déploiement, pour le suivi des coûts (JSON)
+MODEL_COSTS = os.getenv('MODEL_COSTS', '{"gpt-4o": [0.0025, 0.01], "gpt-4o-mini": [0.00015, 0.0006]}')
+
 # Messages système pour différents agents
 SYSTEM_MESSAGES = {
     "gaz_expert": """Tu es un agent expert en gaz et infrastructures gazières pour GRDF (Gaz Réseau Distribution France).
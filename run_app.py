@@ -48,14 +48,32 @@ def init_environment():
     except subprocess.CalledProcessError:
         print("⚠️ Erreur lors de l'installation des dépendances.")
 
-def run_api():
-    """Lance l'API FastAPI"""
+def run_api(reload=False):
+    """
+    Lance l'API FastAPI
+    
+    Sans rechargement, uvicorn sert l'application dans ce processus : l'orchestrateur y est
+    préchauffé avant la première requête. Avec --reload, l'application vit dans un processus
+    fils relancé à chaque modification, le préchauffage est alors laissé à la première requête.
+    """
     try:
+        if reload:
+            print("🚀 Démarrage de l'API (rechargement automatique, sans préchauffage)...")
+            subprocess.run(["uvicorn", "app:app", "--reload", "--host", "0.0.0.0", "--port", "8000"])
+            return
+        import uvicorn
+        run_warmup()
         print("🚀 Démarrage de l'API...")
-        subprocess.run(["uvicorn", "app:app", "--reload", "--host", "0.0.0.0", "--port", "8000"])
+        uvicorn.run("app:app", host="0.0.0.0", port=8000)
     except KeyboardInterrupt:
         print("\n👋 API arrêtée.")
 
+def run_warmup():
+    """Préchauffe l'orchestrateur et affiche le rapport de démarrage"""
+    from agents.orchestrator import warm_up, format_startup_report
+    print("🔥 Préchauffage des agents...")
+    print(format_startup_report(warm_up()))
+
 def run_tests():
     """Lance les tests du système multi-agent"""
     try:
@@ -65,15 +83,20 @@ def run_tests():
 
 def main():
     parser = argparse.ArgumentParser(description="Interface pour le système multi-agent GRDF")
-    parser.add_argument("action", choices=["api", "tests", "init"], 
-                        help="Action à effectuer: api (lancer l'API), tests (lancer les tests), init (initialiser l'environnement)")
+    parser.add_argument("action", choices=["api", "tests", "init", "warmup"], 
+                        help="Action à effectuer: api (lancer l'API), tests (lancer les tests), init (initialiser l'environnement), warmup (mesurer le démarrage des agents)")
+    parser.add_argument("--reload", action="store_true",
+                        help="api : recharger l'API à chaque modification du code (désactive le préchauffage)")
     args = parser.parse_args()
     
     if args.action == "init":
         init_environment()
     elif args.action == "api":
         if check_environment():
-            run_api()
+            run_api(reload=args.reload)
+    elif args.action == "warmup":
+        if check_environment():
+            run_warmup()
     elif args.action == "tests":
         if check_environment():
             run_tests()
@@ -0,0 +1,139 @@
+from dotenv import load_dotenv
+import argparse
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+# Charger les variables d'environnement avant d'importer les modules qui en dépendent
+load_dotenv()
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import agents.orchestrator as orchestrator
+import agents.gaz_expert
+import agents.veille_agent
+import agents.visualization_agent
+import agents.qa_agent
+
+ROUTES = ["expert_gaz", "veille", "visualisation", "qa", "multi"]
+TOKEN_PATTERN = re.compile(r"req-\d+")
+ROUTE_PATTERN = re.compile(r"route=(\w+)")
+
+class StubChatModel(BaseChatModel):
+    """LLM factice et hors ligne : répond avec les identifiants de requête présents dans le prompt"""
+
+    max_delay: float = 0.02
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        # Latence aléatoire pour entrelacer les requêtes concurrentes
+        time.sleep(random.uniform(0, self.max_delay))
+
+        if "système intelligent de routage" in prompt:
+            route = ROUTE_PATTERN.search(prompt)
+            text = route.group(1) if route else "qa"
+        else:
+            # Format ReAct pour que l'agent QA termine immédiatement
+            text = "Final Answer: réponse à " + " ".join(sorted(set(TOKEN_PATTERN.findall(prompt))))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+def install_stub_llm(max_delay):
+    """Remplace le client Azure par le LLM factice dans l'orchestrateur et les agents"""
+    def factory(deployment_name, temperature=0.0, timeout=None, agent=None):
+        return StubChatModel(max_delay=max_delay)
+
+    for module in (orchestrator, agents.gaz_expert, agents.veille_agent,
+                   agents.visualization_agent, agents.qa_agent):
+        module.get_azure_llm = factory
+
+def count_calls(function, counter, key):
+    """Enveloppe une fonction pour compter ses appels"""
+    lock = threading.Lock()
+
+    def wrapper(*args, **kwargs):
+        with lock:
+            counter[key] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+def run_stress_test(n_queries, concurrency, max_delay, speculative=False):
+    """Lance n_queries requêtes en parallèle et vérifie l'absence de mélange entre réponses"""
+    install_stub_llm(max_delay)
+    orchestrator.AGENT_SPECULATIVE_EXECUTION = speculative
+
+    constructions = Counter()
+    orchestrator.setup_agent_graph = count_calls(orchestrator.setup_agent_graph, constructions, "graphe")
+    for name, lazy_agent in orchestrator.AGENT_NODES.items():
+        lazy_agent.factory = count_calls(lazy_agent.factory, constructions, name)
+
+    queries = [(f"req-{i}", ROUTES[i % len(ROUTES)]) for i in range(n_queries)]
+
+    def run(item):
+        token, route = item
+        return token, orchestrator.run_agent_workflow(f"route={route} Question {token} sur le réseau de gaz")
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, queries))
+    duration = time.perf_counter() - start_time
+
+    failures = []
+    for token, response in results:
+        found = set(TOKEN_PATTERN.findall(str(response)))
+        if found != {token} or "[FALLBACK]" in str(response) or "Erreur" in str(response):
+            failures.append((token, str(response)[:200]))
+
+    return {
+        "duration": duration,
+        "failures": failures,
+        "constructions": dict(constructions),
+        "nodes": orchestrator.get_node_stats(),
+        "speculation": orchestrator.get_speculation_stats()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'orchestrateur contre un LLM factice")
+    parser.add_argument('--queries', type=int, default=200, help='Nombre de requêtes')
+    parser.add_argument('--concurrency', type=int, default=32, help='Nombre de requêtes simultanées')
+    parser.add_argument('--max-delay', type=float, default=0.02, help='Latence maximale du LLM factice (secondes)')
+    parser.add_argument('--speculative', action='store_true', help="Activer l'exécution spéculative")
+    args = parser.parse_args()
+
+    report = run_stress_test(args.queries, args.concurrency, args.max_delay, args.speculative)
+
+    print(f"⏱️  {args.queries} requêtes ({args.concurrency} simultanées) en {report['duration']:.2f} secondes")
+    print(f"🏗️  Constructions: {report['constructions']}")
+    errors = list(report["failures"])
+    for name, stats in report["nodes"].items():
+        print(f"🔀 {name}: {stats['calls']} appels, pic {stats['peak']}/{stats['limit']}")
+        if stats["peak"] > stats["limit"]:
+            errors.append((name, "limite de concurrence dépassée"))
+    if args.speculative:
+        speculation = report["speculation"]
+        print(f"🎯 Spéculation: {speculation['hits']}/{speculation['attempts']} réussites "
+              f"({speculation['skipped']} sans prédiction), {speculation['saved_seconds']:.2f}s économisées")
+    for name, count in report["constructions"].items():
+        if count != 1:
+            errors.append((name, f"construit {count} fois"))
+
+    if errors:
+        for key, detail in errors[:20]:
+            print(f"❌ {key}: {detail}")
+        print(f"\n{len(errors)} anomalies détectées")
+        sys.exit(1)
+    print("\n✅ Aucune réponse mélangée, chaque composant construit une seule fois")
+
+if __name__ == "__main__":
+    main()
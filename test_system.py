@@ -12,12 +12,9 @@ from rich.table import Table
 # Charger les variables d'environnement
 load_dotenv()
 
-# Importer les modules du système multi-agent
-from agents.orchestrator import run_agent_workflow, setup_agent_graph
-from agents.gaz_expert import GazExpertAgent
-from agents.veille_agent import VeilleAgent
-from agents.visualization_agent import VisualizationAgent
-from agents.qa_agent import QAAgent
+# Importer les modules du système multi-agent (les agents sont chargés à leur premier usage,
+# --help et la recherche documentaire démarrent sans LangChain)
+import agents
 from utils.document_processor import search_documents
 
 # Configuration de l'affichage
@@ -62,26 +59,26 @@ def test_direct_agent(agent_type, query, data=None):
     agent = None
     
     if agent_type == "gaz":
-        agent = GazExpertAgent()
+        agent = agents.GazExpertAgent()
         agent_name = "Expert en Gaz"
         color = "green"
     elif agent_type == "veille":
-        agent = VeilleAgent()
+        agent = agents.VeilleAgent()
         agent_name = "Veille Stratégique"
         color = "blue"
     elif agent_type == "viz":
-        agent = VisualizationAgent()
+        agent = agents.VisualizationAgent()
         agent_name = "Visualisation"
         color = "magenta"
         if data is None:
             data = "Consommation en kWh par mois: Janvier: 120, Février: 110, Mars: 95"
     else:
         # Créer l'agent QA avec tous les outils disponibles
-        gaz_expert = GazExpertAgent()
-        veille_agent = VeilleAgent()
-        viz_agent = VisualizationAgent()
+        gaz_expert = agents.GazExpertAgent()
+        veille_agent = agents.VeilleAgent()
+        viz_agent = agents.VisualizationAgent()
         
-        agent = QAAgent(
+        agent = agents.QAAgent(
             gaz_expert_tools=gaz_expert.get_tools(),
             veille_tools=veille_agent.get_tools(),
             visualization_tools=viz_agent.get_tools()
@@ -132,7 +129,7 @@ def test_orchestrator(query):
     
     # Exécution de l'orchestrateur
     start_time = time.time()
-    response = run_agent_workflow(query)
+    response = agents.run_agent_workflow(query)
     duration = time.time() - start_time
     
     # Afficher la réponse
@@ -1,6 +1,19 @@
-# Ce fichier permet l'importation des fonctions utilitaires comme un module Python
-from .azure_client import get_azure_llm
+# Ce fichier permet l'importation des fonctions utilitaires comme un module Python.
+# Les sous-modules sont importés à la demande : importer un utilitaire léger
+# (index des documents, file d'indexation, ...) ne charge ni LangChain ni le client OpenAI.
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'get_azure_llm': 'utils.azure_client'
+}
 
 __all__ = [
     'get_azure_llm'
 ]
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
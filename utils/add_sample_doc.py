@@ -7,6 +7,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from dotenv import load_dotenv
 from utils.document_processor import process_document
+from utils.indexing_queue import get_indexing_queue
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -51,6 +52,9 @@ def create_sample_document():
             description="Document décrivant les principales normes de sécurité pour les installations de gaz domestiques"
         )
 
+        # Attendre que le document soit indexé par la file en arrière-plan
+        get_indexing_queue().wait_until_idle()
+
         print(f"✅ Document exemple créé avec succès! ID: {doc_meta.id}")
         print(f"Le document est disponible dans: {doc_meta.file_path}")
         
@@ -0,0 +1,340 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Ajouter le répertoire parent au path pour l'exécution en ligne de commande
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.document_processor import document_fingerprints, retrieval_scope
+from utils.tracing import trace_span
+from config import (ANSWER_WAREHOUSE_PATH, ANSWER_WAREHOUSE_MATCH_THRESHOLD, ANSWER_WAREHOUSE_MAX_AGE_HOURS,
+                    ANSWER_WAREHOUSE_ENABLED)
+
+# Mots ignorés pour la comparaison des questions (la négation "pas", "ne" est conservée)
+STOP_WORDS = {
+    "le", "la", "les", "l", "un", "une", "des", "de", "du", "d", "au", "aux", "et", "ou", "a", "en", "est",
+    "ce", "cet", "cette", "ces", "quel", "quelle", "quels", "quelles", "qu", "que", "qui", "quoi", "sur",
+    "pour", "par", "avec", "dans", "je", "j", "on", "il", "elle", "nous", "vous", "me", "mon", "ma", "mes",
+    "svp", "stp", "merci", "bonjour", "s", "t", "y",
+}
+
+# Réponses de secours de l'orchestrateur, jamais mises en entrepôt
+UNCACHEABLE_PREFIXES = ("[DÉGRADÉ]", "[FALLBACK]", "Erreur")
+
+def normalize_query(query: str) -> Tuple[str, List[str]]:
+    """
+    Forme normalisée d'une question (minuscules, sans accents ni ponctuation) et ses mots significatifs
+
+    Returns:
+        La clé de correspondance exacte et la liste triée des mots, sans doublons
+    """
+    text = unicodedata.normalize("NFKD", query.lower()).encode("ascii", "ignore").decode("ascii")
+    words = re.findall(r"\w+", text)
+    terms = sorted({word for word in words if word not in STOP_WORDS})
+    return " ".join(words), terms
+
+class AnswerWarehouse:
+    """
+    Entrepôt local (SQLite) des réponses précalculées
+
+    Chaque réponse garde sa provenance : l'empreinte des documents renvoyés par la recherche lors
+    de sa génération. Une réponse n'est servie que si ces documents n'ont pas changé depuis.
+    La recherche se fait par clé normalisée (correspondance exacte), puis par index inversé des
+    mots (correspondance quasi exacte, similarité de Jaccard >= match_threshold).
+    """
+
+    def __init__(self, db_path: str = ANSWER_WAREHOUSE_PATH, match_threshold: float = ANSWER_WAREHOUSE_MATCH_THRESHOLD,
+                 max_age_hours: float = ANSWER_WAREHOUSE_MAX_AGE_HOURS):
+        self.db_path = db_path
+        self.match_threshold = match_threshold
+        self.max_age_seconds = max_age_hours * 3600
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    query TEXT NOT NULL,
+                    normalized TEXT NOT NULL UNIQUE,
+                    answer TEXT NOT NULL,
+                    sources TEXT NOT NULL,
+                    term_count INTEGER NOT NULL,
+                    generated_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    stale INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answer_terms (
+                    term TEXT NOT NULL,
+                    answer_id INTEGER NOT NULL,
+                    PRIMARY KEY (term, answer_id)
+                ) WITHOUT ROWID
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def put(self, query: str, answer: str, sources: Dict[str, str]) -> int:
+        """
+        Enregistre (ou remplace) la réponse à une question
+
+        Args:
+            sources: Empreinte de chaque document utilisé, par doc_id
+
+        Returns:
+            Identifiant de l'entrée
+        """
+        normalized, terms = normalize_query(query)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO answers (query, normalized, answer, sources, term_count, generated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(normalized) DO UPDATE SET query = excluded.query, answer = excluded.answer, "
+                "sources = excluded.sources, term_count = excluded.term_count, "
+                "generated_at = excluded.generated_at, stale = 0",
+                (query, normalized, answer, json.dumps(sources), len(terms), time.time())
+            )
+            answer_id = conn.execute("SELECT id FROM answers WHERE normalized = ?", (normalized,)).fetchone()["id"]
+            conn.execute("DELETE FROM answer_terms WHERE answer_id = ?", (answer_id,))
+            conn.executemany("INSERT INTO answer_terms (term, answer_id) VALUES (?, ?)",
+                             [(term, answer_id) for term in terms])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return answer_id
+
+    def _find(self, conn, query: str) -> Tuple[Optional[sqlite3.Row], float]:
+        normalized, terms = normalize_query(query)
+        row = conn.execute("SELECT * FROM answers WHERE normalized = ?", (normalized,)).fetchone()
+        if row is not None:
+            return row, 1.0
+        if not terms:
+            return None, 0.0
+
+        placeholders = ",".join("?" * len(terms))
+        candidates = conn.execute(
+            f"SELECT answer_id, COUNT(*) AS shared FROM answer_terms WHERE term IN ({placeholders}) "
+            "GROUP BY answer_id ORDER BY shared DESC LIMIT 10", terms
+        ).fetchall()
+        best, best_similarity = None, 0.0
+        for candidate in candidates:
+            row = conn.execute("SELECT * FROM answers WHERE id = ?", (candidate["answer_id"],)).fetchone()
+            similarity = candidate["shared"] / (len(terms) + row["term_count"] - candidate["shared"])
+            if similarity > best_similarity:
+                best, best_similarity = row, similarity
+        if best_similarity < self.match_threshold:
+            return None, best_similarity
+        return best, best_similarity
+
+    def _is_fresh(self, row: sqlite3.Row, fingerprints: Dict[str, str]) -> bool:
+        if row["stale"]:
+            return False
+        if self.max_age_seconds > 0 and time.time() - row["generated_at"] > self.max_age_seconds:
+            return False
+        sources = json.loads(row["sources"])
+        if not sources:
+            # Sans provenance, aucune modification de document ne pourrait invalider la réponse
+            return False
+        return all(fingerprints.get(doc_id) == fingerprint for doc_id, fingerprint in sources.items())
+
+    def lookup(self, query: str, fingerprints: Optional[Dict[str, str]] = None) -> Optional[Dict]:
+        """
+        Cherche une réponse à jour pour la question
+
+        Returns:
+            La réponse (answer, query d'origine, similarity, generated_at, sources), ou None.
+            Une entrée trouvée mais périmée est marquée pour régénération.
+        """
+        if fingerprints is None:
+            fingerprints = document_fingerprints()
+        with closing(self._connect()) as conn:
+            row, similarity = self._find(conn, query)
+            if row is None:
+                return None
+            if not self._is_fresh(row, fingerprints):
+                conn.execute("UPDATE answers SET stale = 1 WHERE id = ?", (row["id"],))
+                return None
+            conn.execute("UPDATE answers SET hits = hits + 1 WHERE id = ?", (row["id"],))
+        return {
+            "answer": row["answer"],
+            "query": row["query"],
+            "similarity": similarity,
+            "generated_at": datetime.fromtimestamp(row["generated_at"]).isoformat(),
+            "sources": json.loads(row["sources"]),
+        }
+
+    def stale_entries(self, fingerprints: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Entrées à régénérer : documents sources modifiés ou supprimés, réponse trop ancienne ou marquée"""
+        if fingerprints is None:
+            fingerprints = document_fingerprints()
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM answers ORDER BY hits DESC").fetchall()
+        return [{"id": row["id"], "query": row["query"], "hits": row["hits"]}
+                for row in rows if not self._is_fresh(row, fingerprints)]
+
+    def stats(self) -> Dict:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS hits, COALESCE(SUM(stale), 0) AS stale "
+                "FROM answers"
+            ).fetchone()
+        return dict(row)
+
+_WAREHOUSE: Optional[AnswerWarehouse] = None
+_WAREHOUSE_LOCK = threading.Lock()
+
+def get_answer_warehouse() -> AnswerWarehouse:
+    """Entrepôt partagé du processus"""
+    global _WAREHOUSE
+    if _WAREHOUSE is None:
+        with _WAREHOUSE_LOCK:
+            if _WAREHOUSE is None:
+                _WAREHOUSE = AnswerWarehouse()
+    return _WAREHOUSE
+
+def lookup_precomputed_answer(query: str) -> Optional[Dict]:
+    """
+    Réponse précalculée pour la requête (chemin de service de run_agent_workflow)
+
+    Sans entrepôt sur le disque ou en cas d'erreur, retourne None : la requête suit le graphe d'agents.
+    """
+    if not ANSWER_WAREHOUSE_ENABLED or not os.path.exists(ANSWER_WAREHOUSE_PATH):
+        return None
+    try:
+        with trace_span("answer_warehouse") as span:
+            result = get_answer_warehouse().lookup(query)
+            if span is not None:
+                span.set_attribute("hit", result is not None)
+        return result
+    except Exception as e:
+        print(f"Erreur lors de la consultation des réponses précalculées: {str(e)}")
+        return None
+
+def top_queries(queries: List[str], top: Optional[int] = None) -> List[str]:
+    """
+    Questions distinctes d'un journal, des plus fréquentes aux moins fréquentes
+
+    Les variantes d'une même question (casse, accents, ponctuation, mots vides) sont regroupées ;
+    la formulation la plus fréquente est retenue.
+    """
+    counts = Counter()
+    variants: Dict[str, Counter] = {}
+    for query in queries:
+        query = query.strip()
+        if not query:
+            continue
+        key = " ".join(normalize_query(query)[1])
+        counts[key] += 1
+        variants.setdefault(key, Counter())[query] += 1
+    return [variants[key].most_common(1)[0][0] for key, _ in counts.most_common(top)]
+
+def load_queries(path: str) -> List[str]:
+    """Lit un journal de requêtes ou une FAQ : texte (une question par ligne), JSON ou JSON Lines"""
+    def extract(item):
+        if isinstance(item, dict):
+            return item.get("query") or item.get("question") or ""
+        return str(item)
+
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return [extract(item) for item in json.load(f)]
+        if path.endswith((".jsonl", ".ndjson")):
+            return [extract(json.loads(line)) for line in f if line.strip()]
+        return [line.strip() for line in f if line.strip()]
+
+def _default_workflow(query: str) -> str:
+    # Import différé : l'orchestrateur importe ce module pour le chemin de service
+    from agents.orchestrator import run_agent_workflow
+    return run_agent_workflow(query, use_warehouse=False)
+
+def precompute_answers(queries: List[str], warehouse: Optional[AnswerWarehouse] = None, concurrency: int = 1,
+                       workflow: Optional[Callable[[str], str]] = None) -> Dict[str, int]:
+    """
+    Génère et enregistre les réponses aux questions avec le workflow d'agents (à lancer hors des pics)
+
+    La provenance de chaque réponse est collectée pendant sa génération (retrieval_scope).
+    Les réponses dégradées ou de secours, et celles produites sans aucun document, ne sont pas enregistrées.
+
+    Returns:
+        Le nombre de réponses générées, écartées et en erreur
+    """
+    warehouse = warehouse or get_answer_warehouse()
+    workflow = workflow or _default_workflow
+    counts = Counter(generated=0, skipped=0, failed=0)
+    lock = threading.Lock()
+
+    def generate(query: str):
+        try:
+            with retrieval_scope() as retrieved:
+                answer = workflow(query)
+            if not answer or answer.startswith(UNCACHEABLE_PREFIXES) or not retrieved:
+                # Réponse sans document source : sa fraîcheur ne pourrait pas être vérifiée
+                outcome = "skipped"
+            else:
+                fingerprints = document_fingerprints()
+                warehouse.put(query, answer, {doc_id: fingerprints.get(doc_id, "") for doc_id in sorted(retrieved)})
+                outcome = "generated"
+        except Exception as e:
+            print(f"Erreur lors du précalcul de « {query} »: {str(e)}")
+            outcome = "failed"
+        with lock:
+            counts[outcome] += 1
+            print(f"[{sum(counts.values())}/{len(queries)}] {outcome}: {query}")
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        list(executor.map(generate, queries))
+    return dict(counts)
+
+def refresh_stale_answers(warehouse: Optional[AnswerWarehouse] = None, concurrency: int = 1,
+                          workflow: Optional[Callable[[str], str]] = None) -> Dict[str, int]:
+    """Régénère les réponses dont les documents sources ont changé (ou trop anciennes)"""
+    warehouse = warehouse or get_answer_warehouse()
+    queries = [entry["query"] for entry in warehouse.stale_entries()]
+    if not queries:
+        return {"generated": 0, "skipped": 0, "failed": 0}
+    return precompute_answers(queries, warehouse, concurrency, workflow)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Réponses précalculées aux questions fréquentes")
+    parser.add_argument('--build', type=str, help='Journal de requêtes ou FAQ (texte, JSON, JSON Lines) à précalculer')
+    parser.add_argument('--top', type=int, default=None, help='Nombre de questions les plus fréquentes à précalculer')
+    parser.add_argument('--refresh', action='store_true', help='Régénérer les réponses dont les sources ont changé')
+    parser.add_argument('--lookup', type=str, help='Chercher la réponse précalculée à une question')
+    parser.add_argument('--stats', action='store_true', help="Afficher l'état de l'entrepôt")
+    parser.add_argument('--concurrency', type=int, default=1, help='Questions générées en parallèle')
+    args = parser.parse_args()
+
+    if args.build:
+        queries = top_queries(load_queries(args.build), args.top)
+        print(f"{len(queries)} questions à précalculer")
+        print(precompute_answers(queries, concurrency=args.concurrency))
+    if args.refresh:
+        print(refresh_stale_answers(concurrency=args.concurrency))
+    if args.lookup:
+        result = get_answer_warehouse().lookup(args.lookup)
+        if result is None:
+            print("Aucune réponse précalculée à jour")
+        else:
+            print(f"Question: {result['query']} (similarité {result['similarity']:.2f}, générée le {result['generated_at']})")
+            print(result["answer"])
+    if args.stats or not (args.build or args.refresh or args.lookup):
+        print(get_answer_warehouse().stats())
@@ -1,22 +1,31 @@
-from langchain_openai import AzureChatOpenAI
-import os
-from config import AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_API_VERSION
+from utils.resilient_llm import ResilientChatModel, create_backends
+from utils.model_tiering import TieredChatModel
+from config import MODEL_TIERS
 
-def get_azure_llm(deployment_name, temperature=0.0):
+def get_azure_llm(deployment_name, temperature=0.0, timeout=None, agent=None):
     """
-    Crée et retourne une instance d'AzureChatOpenAI configurée
-    
+    Crée et retourne un modèle de chat Azure OpenAI résilient
+
+    Les appels sont répartis entre les points d'accès configurés pour ce déploiement
+    (AZURE_OPENAI_DEPLOYMENTS, AZURE_OPENAI_ENDPOINT par défaut), avec nouvelles
+    tentatives, bascule, doublement optionnel et disjoncteurs (voir ResilientChatModel).
+
     Args:
         deployment_name: Nom du déploiement Azure OpenAI à utiliser
         temperature: Température pour la génération (0.0 à 1.0)
-        
+        timeout: Délai réseau maximal par appel en secondes (AZURE_REQUEST_TIMEOUT par défaut)
+        agent: Nom de l'agent dans MODEL_TIERS ; si un déploiement économique y est configuré,
+            les requêtes simples lui sont envoyées (voir TieredChatModel)
+
     Returns:
-        Instance AzureChatOpenAI
+        Instance ResilientChatModel, ou TieredChatModel (modèles de chat LangChain)
     """
-    return AzureChatOpenAI(
-        azure_deployment=deployment_name,
-        openai_api_version=AZURE_API_VERSION,
-        azure_endpoint=AZURE_OPENAI_ENDPOINT,
-        api_key=AZURE_OPENAI_API_KEY,
-        temperature=temperature
-    )
+    llm = ResilientChatModel(backends=create_backends(deployment_name, temperature=temperature, timeout=timeout))
+
+    tier = MODEL_TIERS.get(agent) if agent else None
+    if not tier or not tier["small"] or tier["small"] == deployment_name:
+        return llm
+
+    small = ResilientChatModel(backends=create_backends(tier["small"], temperature=temperature, timeout=timeout))
+    return TieredChatModel(agent=agent, small=small, large=llm, small_deployment=tier["small"],
+                           large_deployment=deployment_name, threshold=tier["threshold"])
@@ -0,0 +1,361 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Ajouter le répertoire parent au path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.process_memory import rss_bytes
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CASSETTE = os.path.join(BASE_DIR, "benchmarks", "cassette.json")
+
+SCENARIOS = [
+    "ingestion", "router", "agent.expert_gaz", "agent.expert_gaz_enhanced", "agent.veille",
+    "agent.visualisation", "agent.qa", "rag_search", "orchestrator_load"
+]
+
+# Vocabulaire du corpus synthétique, par thème
+TOPICS = {
+    "sécurité": (["La détection de fuite", "Le détendeur", "La coupure d'urgence", "Le contrôle d'étanchéité"],
+                 ["impose", "garantit", "nécessite", "limite"],
+                 ["une intervention rapide", "la mise en sécurité du branchement", "un odorisant réglementaire",
+                  "une vérification annuelle"]),
+    "réseau": (["La canalisation en polyéthylène", "Le poste de détente", "Le réseau basse pression",
+                "La conduite d'acier"],
+               ["alimente", "relie", "transporte", "dessert"],
+               ["les communes rurales", "les clients résidentiels", "le gaz à 4 bars", "les zones industrielles"]),
+    "biométhane": (["L'unité de méthanisation", "Le rebours", "L'injection de biométhane", "Le digesteur"],
+                   ["valorise", "produit", "injecte", "réduit"],
+                   ["les déchets agricoles", "un gaz renouvelable", "les émissions de CO2", "le réseau de distribution"]),
+    "réglementation": (["L'arrêté de 2023", "La directive européenne", "Le code de l'énergie", "La CRE"],
+                       ["encadre", "fixe", "modifie", "contrôle"],
+                       ["les tarifs d'acheminement", "les obligations de sécurité", "les certificats d'économie",
+                        "le raccordement des producteurs"]),
+    "compteurs": (["Le compteur Gazpar", "La télérelève", "Le concentrateur", "L'index mensuel"],
+                  ["transmet", "mesure", "enregistre", "fiabilise"],
+                  ["la consommation quotidienne", "les données de comptage", "la facturation réelle",
+                   "les pics hivernaux"])
+}
+
+# Requêtes types par route (mots-clés reconnus par predict_route pour le routeur synthétique)
+QUERY_TEMPLATES = {
+    "expert_gaz": ["Quelle est la norme de sécurité pour {topic} ?", "Comment fonctionne {topic} sur le réseau de gaz ?"],
+    "veille": ["Quelles sont les tendances du marché pour {topic} ?", "Que font les concurrents sur {topic} ?"],
+    "visualisation": ["Propose un graphique sur {topic}", "Crée un tableau de bord pour {topic}"],
+    "qa": ["Bonjour, peux-tu m'aider au sujet de {topic} ?", "Résume-moi {topic}"]
+}
+
+def make_corpus(n_docs: int, seed: int = 0, paragraphs: int = 6, sentences: int = 8) -> List[Tuple[str, str]]:
+    """Corpus synthétique déterministe : (thème, texte) par document"""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(n_docs):
+        topic = rng.choice(sorted(TOPICS))
+        subjects, verbs, objects = TOPICS[topic]
+        text = "\n\n".join(
+            " ".join(f"{rng.choice(subjects)} {rng.choice(verbs)} {rng.choice(objects)} (réf. {topic}-{index}-{p}-{s})."
+                     for s in range(sentences))
+            for p in range(paragraphs)
+        )
+        corpus.append((topic, f"Procédure {topic} n°{index}\n\n{text}"))
+    return corpus
+
+def make_queries(n_queries: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """Requêtes synthétiques déterministes : (route attendue, requête)"""
+    rng = random.Random(seed + 1)
+    routes = sorted(QUERY_TEMPLATES)
+    queries = []
+    for index in range(n_queries):
+        route = routes[index % len(routes)]
+        topic = rng.choice(sorted(TOPICS))
+        queries.append((route, rng.choice(QUERY_TEMPLATES[route]).format(topic=topic)))
+    return queries
+
+class PeakMemorySampler:
+    """Échantillonne la mémoire résidente en arrière-plan pour en relever le pic pendant un scénario"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start_rss = rss_bytes()
+        self.peak = self.start_rss
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+def summarize(latencies: List[float], wall_seconds: float, memory: PeakMemorySampler) -> Dict:
+    """Percentiles de latence (ms), débit et pic mémoire d'un scénario"""
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "operations": len(latencies),
+        "latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "latency_p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "latency_p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "latency_mean_ms": round(float(np.mean(latencies_ms)), 3),
+        "throughput_per_s": round(len(latencies) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_rss_bytes": memory.peak,
+        "rss_delta_bytes": memory.peak - memory.start_rss
+    }
+
+def _timed(function: Callable, items: List, concurrency: int = 1) -> Tuple[List[float], float]:
+    """Exécute function sur chaque élément (en parallèle si concurrency > 1) et mesure chaque appel"""
+    def run(item):
+        start_time = time.perf_counter()
+        function(item)
+        return time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(run, items))
+    else:
+        latencies = [run(item) for item in items]
+    return latencies, time.perf_counter() - start_time
+
+def _isolate(workdir: str, backend: str):
+    """Redirige index, base vectorielle et caches vers workdir (avant d'importer les modules du projet)"""
+    os.environ["VECTOR_BACKEND"] = backend
+    os.environ["EXTRACTION_CACHE_DIR"] = os.path.join(workdir, "extraction_cache")
+    os.environ["INDEXING_QUEUE_PATH"] = os.path.join(workdir, "indexing_queue.sqlite3")
+    os.environ["NEAR_DUPLICATE_PATH"] = os.path.join(workdir, "near_duplicates.sqlite3")
+    os.environ["VECTORSTORE_LOCK_PATH"] = os.path.join(workdir, "vectorstore.lock")
+    # Mesurer le chemin complet des agents, sans les réponses précalculées
+    os.environ["ANSWER_WAREHOUSE_ENABLED"] = "false"
+
+    import utils.vectorstores as vectorstores
+    import utils.document_processor as document_processor
+    import utils.hierarchical_search as hierarchical_search
+    import utils.index_generations as index_generations
+    vectorstores.VECTOR_DB_PATH = os.path.join(workdir, "vectordb")
+    vectorstores.NUMPY_VECTOR_DB_PATH = os.path.join(workdir, "vectordb_numpy")
+    vectorstores.QUANTIZED_VECTOR_DB_PATH = os.path.join(workdir, "vectordb_quantized")
+    document_processor.UPLOAD_DIR = os.path.join(workdir, "uploads")
+    document_processor.DOCUMENT_INDEX_PATH = os.path.join(workdir, "document_index.json")
+    hierarchical_search.DOCUMENT_SUMMARY_DB_PATH = os.path.join(workdir, "vectordb_summaries")
+    index_generations.INDEX_GENERATIONS_DIR = os.path.join(workdir, "index_generations")
+    os.makedirs(document_processor.UPLOAD_DIR, exist_ok=True)
+
+def _install_replay_backend(cassette, mode: str, llm_latency: float, embedding_latency: float,
+                            search_latency: float, jitter: float):
+    """Remplace le client Azure, les embeddings et la recherche web par leurs versions rejouées"""
+    import agents.orchestrator as orchestrator
+    import agents.gaz_expert
+    import agents.gaz_expert_enhanced
+    import agents.veille_agent
+    import agents.visualization_agent
+    import agents.qa_agent
+    import utils.document_processor as document_processor
+    from utils.azure_client import get_azure_llm
+    from utils.replay_llm import ReplayChatModel, ReplayEmbeddings, ReplaySearch, default_answer, MODE_RECORD
+
+    record = mode == MODE_RECORD
+    create_embeddings = document_processor.create_embeddings
+
+    def synthesize(prompt: str) -> str:
+        # Le routeur synthétique suit la prédiction locale par mots-clés
+        if "système intelligent de routage" in prompt:
+            match = re.search(r"Requête: (.*)", prompt)
+            return (match and orchestrator.predict_route(match.group(1))) or "qa"
+        return default_answer(prompt)
+
+    def llm_factory(deployment_name, temperature=0.0, timeout=None, agent=None):
+        recorder = get_azure_llm(deployment_name, temperature, timeout, agent) if record else None
+        return ReplayChatModel(cassette=cassette, recorder=recorder, synthesize=synthesize,
+                               latency=llm_latency, jitter=jitter)
+
+    embeddings = ReplayEmbeddings(cassette, create_embeddings() if record else None,
+                                  latency=embedding_latency, jitter=jitter)
+    document_processor.create_embeddings = lambda: embeddings
+    for module in (orchestrator, agents.gaz_expert, agents.gaz_expert_enhanced, agents.veille_agent,
+                   agents.visualization_agent, agents.qa_agent):
+        module.get_azure_llm = llm_factory
+
+    veille = orchestrator.AGENT_NODES["veille"].get(phase="préchauffage")
+    veille.search_tool = ReplaySearch(cassette, veille.search_tool if record else None,
+                                      latency=search_latency, jitter=jitter)
+
+def run_benchmark(scenarios: List[str], n_docs: int = 50, n_queries: int = 40, concurrency: int = 8,
+                  seed: int = 0, mode: str = "replay", cassette_path: Optional[str] = DEFAULT_CASSETTE,
+                  llm_latency: float = 0.05, embedding_latency: float = 0.01, search_latency: float = 0.1,
+                  jitter: float = 0.2, backend: str = "numpy") -> Dict:
+    """
+    Exécute les scénarios demandés hors ligne et retourne le rapport JSON
+
+    Les réponses LLM, embeddings et recherches web sont rejouées depuis la cassette
+    (enregistrées au préalable avec mode="record") ou synthétisées de façon déterministe.
+    """
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Scénarios inconnus: {', '.join(unknown)} (disponibles: {', '.join(SCENARIOS)})")
+
+    workdir = tempfile.mkdtemp(prefix="bench_agents_")
+    try:
+        _isolate(workdir, backend)
+        from utils.replay_llm import Cassette
+        cassette = Cassette(cassette_path)
+        _install_replay_backend(cassette, mode, llm_latency, embedding_latency, search_latency, jitter)
+
+        import agents.orchestrator as orchestrator
+        from agents.gaz_expert_enhanced import EnhancedGazExpertAgent
+        from utils.document_processor import DocumentMetadata, index_document, search_documents
+
+        corpus = make_corpus(n_docs, seed)
+        queries = make_queries(n_queries, seed)
+        texts = [query for _, query in queries]
+
+        def ingest(item):
+            index, (topic, text) = item
+            file_path = os.path.join(workdir, "uploads", f"doc-{index}.txt")
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            meta = DocumentMetadata(id=f"doc-{index}", filename=os.path.basename(file_path), title=f"Procédure {index}",
+                                    document_type="procédure", description=topic,
+                                    upload_date=datetime.now().isoformat(), file_path=file_path)
+            index_document(meta, raise_errors=True)
+
+        def agent_scenario(name):
+            agent = orchestrator.AGENT_NODES[name].get(phase="préchauffage")
+            return lambda query: agent.process(query)
+
+        runners = {
+            "ingestion": (ingest, list(enumerate(corpus)), 1),
+            "router": (orchestrator.create_router_chain().invoke, texts, 1),
+            "rag_search": (lambda query: search_documents(query, limit=5), texts, 1),
+            "orchestrator_load": (orchestrator.run_agent_workflow, texts, concurrency),
+        }
+        for name in ("expert_gaz", "veille", "visualisation", "qa"):
+            runners[f"agent.{name}"] = (agent_scenario(name), texts, 1)
+
+        results = {}
+        # L'ingestion précède toujours la recherche : le corpus doit être indexé
+        ordered = [name for name in SCENARIOS if name in scenarios or
+                   (name == "ingestion" and {"rag_search", "agent.expert_gaz_enhanced"} & set(scenarios))]
+        for name in ordered:
+            if name == "agent.expert_gaz_enhanced":
+                enhanced = EnhancedGazExpertAgent()
+                function, items, workers = enhanced.process, texts, 1
+            else:
+                function, items, workers = runners[name]
+            with PeakMemorySampler() as memory:
+                latencies, wall_seconds = _timed(function, items, workers)
+            results[name] = summarize(latencies, wall_seconds, memory)
+            results[name]["concurrency"] = workers
+            print(f"✅ {name}: p50 {results[name]['latency_p50_ms']} ms, p95 {results[name]['latency_p95_ms']} ms, "
+                  f"{results[name]['throughput_per_s']}/s", file=sys.stderr)
+
+        if mode == "record":
+            cassette.save()
+
+        return {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "mode": mode,
+                "seed": seed,
+                "docs": n_docs,
+                "queries": n_queries,
+                "concurrency": concurrency,
+                "backend": backend,
+                "llm_latency": llm_latency,
+                "embedding_latency": embedding_latency,
+                "search_latency": search_latency,
+                "jitter": jitter,
+                "cassette_hits": cassette.hits,
+                "cassette_misses": cassette.misses
+            },
+            "scenarios": results
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare_reports(baseline: Dict, current: Dict, max_regression: float) -> List[str]:
+    """Compare deux rapports : scénarios dont la latence p95 a augmenté de plus de max_regression (fraction)"""
+    regressions = []
+    print(f"{'scénario':<28}{'p95 avant':>12}{'p95 après':>12}{'écart':>9}{'débit avant':>13}{'débit après':>13}")
+    for name, after in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        delta = (after["latency_p95_ms"] / before["latency_p95_ms"] - 1) if before["latency_p95_ms"] else 0.0
+        print(f"{name:<28}{before['latency_p95_ms']:>12}{after['latency_p95_ms']:>12}{delta:>+9.1%}"
+              f"{before['throughput_per_s']:>13}{after['throughput_per_s']:>13}")
+        if delta > max_regression:
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark hors ligne et déterministe du système multi-agent')
+    parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS),
+                        help='Scénarios à exécuter, séparés par des virgules')
+    parser.add_argument('--mode', choices=['replay', 'record'], default='replay',
+                        help='replay: hors ligne (cassette ou réponses synthétiques), record: appels réels enregistrés')
+    parser.add_argument('--cassette', type=str, default=DEFAULT_CASSETTE, help='Fichier de la cassette')
+    parser.add_argument('--docs', type=int, default=50, help='Nombre de documents du corpus synthétique')
+    parser.add_argument('--queries', type=int, default=40, help='Nombre de requêtes par scénario')
+    parser.add_argument('--concurrency', type=int, default=8, help="Requêtes simultanées (charge de l'orchestrateur)")
+    parser.add_argument('--seed', type=int, default=0, help='Graine du corpus et des requêtes')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='Latence simulée d\'un appel LLM (secondes)')
+    parser.add_argument('--embedding-latency', type=float, default=0.01, help='Latence simulée d\'un lot d\'embeddings')
+    parser.add_argument('--search-latency', type=float, default=0.1, help='Latence simulée d\'une recherche web')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Variation relative des latences simulées')
+    parser.add_argument('--backend', type=str, default='numpy', help='Backend vectoriel (numpy, chroma, quantized)')
+    parser.add_argument('--output', type=str, help='Fichier JSON de sortie')
+    parser.add_argument('--baseline', type=str, help='Rapport JSON de référence à comparer')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Hausse maximale tolérée de la latence p95 par rapport à la référence (fraction)')
+
+    args = parser.parse_args()
+
+    report = run_benchmark(args.scenarios.split(','), args.docs, args.queries, args.concurrency, args.seed,
+                           args.mode, args.cassette, args.llm_latency, args.embedding_latency,
+                           args.search_latency, args.jitter, args.backend)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_reports(json.load(f), report, args.max_regression)
+        if regressions:
+            print(f"❌ Régression de latence p95: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+# Ajouter le répertoire parent au path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.quantized_vectorstore import QuantizedVectorStore, QUANTIZATION_INT8, QUANTIZATION_PQ
+from utils.vectorstores import VECTOR_BACKENDS
+from utils.process_memory import rss_bytes
+
+class LookupEmbeddings:
+    """Embeddings factices : chaque texte 'doc-i' ou 'query-i' correspond à un vecteur précalculé"""
+
+    def __init__(self, corpus: np.ndarray, queries: np.ndarray):
+        self.corpus = corpus
+        self.queries = queries
+
+    def _lookup(self, text: str) -> List[float]:
+        kind, index = text.rsplit("-", 1)
+        source = self.corpus if kind == "doc" else self.queries
+        return source[int(index)].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._lookup(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._lookup(text)
+
+def make_corpus(n_docs: int, n_queries: int, dim: int, seed: int = 0):
+    """Génère un corpus synthétique normalisé (groupes thématiques), comme des embeddings ada-002"""
+    rng = np.random.default_rng(seed)
+    n_topics = max(1, n_docs // 100)
+    centers = rng.normal(size=(n_topics, dim))
+    corpus = centers[rng.integers(0, n_topics, n_docs)] + 0.6 * rng.normal(size=(n_docs, dim))
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+
+    queries = corpus[rng.choice(n_docs, n_queries, replace=False)] + 0.2 * rng.normal(size=(n_queries, dim))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return corpus.astype(np.float32), queries.astype(np.float32)
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """Vérité terrain : k plus proches voisins exacts (distance L2)"""
+    truth = []
+    corpus_norms = np.sum(corpus ** 2, axis=1)
+    for query in queries:
+        distances = corpus_norms - 2 * corpus @ query
+        truth.append(set(np.argpartition(distances, k)[:k].tolist()))
+    return truth
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+def run_backend(name: str, store, corpus: np.ndarray, queries: np.ndarray, truth: List[set],
+                k: int, directory: str, batch_size: int = 1000) -> Dict:
+    """Indexe le corpus puis mesure rappel, latence et mémoire d'un backend"""
+    rss_before = rss_bytes()
+
+    start_time = time.perf_counter()
+    for start in range(0, len(corpus), batch_size):
+        end = min(start + batch_size, len(corpus))
+        store.add_texts([f"doc-{i}" for i in range(start, end)],
+                        metadatas=[{"row": i} for i in range(start, end)])
+    build_seconds = time.perf_counter() - start_time
+
+    latencies = []
+    recalls = []
+    for i, expected in enumerate(truth):
+        start_time = time.perf_counter()
+        results = store.similarity_search_with_score(f"query-{i}", k=k)
+        latencies.append(time.perf_counter() - start_time)
+        found = {doc.metadata["row"] for doc, _ in results}
+        recalls.append(len(found & expected) / k)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "backend": name,
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "latency_p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "build_seconds": round(build_seconds, 3),
+        "disk_bytes": _directory_size(directory),
+        "rss_delta_bytes": rss_bytes() - rss_before
+    }
+
+def _create_store(backend: str, directory: str, embeddings, n_docs: int, pq_subvectors: int, rescore_factor: int):
+    """Instancie un backend du registre, ou une variante du backend quantifié (int8, pq, ivf)"""
+    if backend in ("int8", "pq", "ivf"):
+        ivf_lists = int(np.sqrt(n_docs)) if backend == "ivf" else 0
+        return QuantizedVectorStore(directory, embeddings,
+                                    quantization=QUANTIZATION_PQ if backend == "pq" else QUANTIZATION_INT8,
+                                    pq_subvectors=pq_subvectors, rescore_factor=rescore_factor,
+                                    ivf_lists=ivf_lists, ivf_probes=max(1, ivf_lists // 8))
+    return VECTOR_BACKENDS[backend](embeddings, directory)
+
+def run_benchmark(n_docs: int = 20000, n_queries: int = 200, dim: int = 1536, k: int = 5,
+                  backends: List[str] = None, pq_subvectors: int = 48, rescore_factor: int = 4) -> List[Dict]:
+    """Compare les backends sur un même corpus synthétique"""
+    backends = backends or ["chroma", "numpy", "int8", "pq", "ivf"]
+    if "pq" in backends and dim % pq_subvectors:
+        raise ValueError(f"La dimension {dim} doit être un multiple du nombre de sous-vecteurs PQ ({pq_subvectors})")
+    corpus, queries = make_corpus(n_docs, n_queries, dim)
+    truth = exact_neighbors(corpus, queries, k)
+    embeddings = LookupEmbeddings(corpus, queries)
+
+    reports = []
+    for backend in backends:
+        directory = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+        try:
+            store = _create_store(backend, directory, embeddings, n_docs, pq_subvectors, rescore_factor)
+            report = run_backend(backend, store, corpus, queries, truth, k, directory)
+            report["docs"] = n_docs
+            reports.append(report)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return reports
+
+def recommend_backends(reports: List[Dict], k: int, min_recall: float) -> Dict[int, str]:
+    """Pour chaque taille de corpus, le backend le plus rapide (p50) atteignant le rappel minimal"""
+    recommendations = {}
+    for n_docs in sorted({report["docs"] for report in reports}):
+        eligible = [r for r in reports if r["docs"] == n_docs and r[f"recall@{k}"] >= min_recall]
+        if eligible:
+            recommendations[n_docs] = min(eligible, key=lambda r: r["latency_p50_ms"])["backend"]
+    return recommendations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark des bases vectorielles (rappel, latence, mémoire)')
+    parser.add_argument('--sizes', type=str, default='1000,20000',
+                        help='Tailles de corpus à tester, séparées par des virgules')
+    parser.add_argument('--queries', type=int, default=200, help='Nombre de requêtes')
+    parser.add_argument('--dim', type=int, default=1536, help='Dimension des embeddings')
+    parser.add_argument('--k', type=int, default=5, help='Nombre de résultats par requête')
+    parser.add_argument('--backends', type=str, default='chroma,numpy,int8,pq,ivf',
+                        help='Backends à comparer, séparés par des virgules (registre + variantes int8, pq, ivf)')
+    parser.add_argument('--pq-subvectors', type=int, default=48, help='Nombre de sous-vecteurs PQ')
+    parser.add_argument('--rescore-factor', type=int, default=4, help='Candidats recalculés en float32 (multiple de k)')
+    parser.add_argument('--min-recall', type=float, default=0.95, help='Rappel minimal pour la recommandation')
+    parser.add_argument('--output', type=str, help='Fichier JSON de sortie')
+
+    args = parser.parse_args()
+    if args.pq_subvectors <= 0:
+        parser.error("--pq-subvectors doit être strictement positif")
+    if 'pq' in args.backends.split(',') and args.dim % args.pq_subvectors:
+        parser.error(f"--dim {args.dim} doit être un multiple de --pq-subvectors {args.pq_subvectors} pour le backend pq")
+
+    reports = []
+    for size in args.sizes.split(','):
+        reports.extend(run_benchmark(int(size), args.queries, args.dim, args.k, args.backends.split(','),
+                                     args.pq_subvectors, args.rescore_factor))
+    result = {
+        "results": reports,
+        "recommendations": recommend_backends(reports, args.k, args.min_recall)
+    }
+    output = json.dumps(result, indent=2)
+    print(output)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
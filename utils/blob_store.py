@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+from typing import Tuple
+
+from config import UPLOADS_DIR, UPLOAD_STORAGE_MODE
+from utils.extraction_cache import compute_file_hash
+
+# Modes de stockage des fichiers importés
+STORAGE_LINK = "link"            # reflink, sinon lien physique, sinon copie
+STORAGE_COPY = "copy"            # reflink, sinon copie (jamais de lien physique)
+STORAGE_REFERENCE = "reference"  # aucun fichier créé : on référence la source
+
+BLOB_DIR = os.path.join(UPLOADS_DIR, "blobs")
+
+# ioctl Linux FICLONE (copie en écriture différée sur Btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+def _reflink(source_path: str, dest_path: str) -> bool:
+    """Tente un clonage copy-on-write du fichier ; retourne False si non supporté"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    try:
+        with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        return False
+
+def _materialize(source_path: str, dest_path: str, mode: str) -> str:
+    """Crée dest_path à partir de source_path selon le mode, et retourne la méthode utilisée"""
+    if _reflink(source_path, dest_path):
+        return "reflink"
+
+    if mode == STORAGE_LINK:
+        try:
+            os.link(source_path, dest_path)
+            return "hardlink"
+        except OSError:
+            # Systèmes de fichiers différents ou liens non supportés
+            pass
+
+    shutil.copy2(source_path, dest_path)
+    return "copy"
+
+def blob_path(content_hash: str, extension: str) -> str:
+    """Chemin du blob correspondant à une empreinte de contenu"""
+    return os.path.join(BLOB_DIR, content_hash[:2], f"{content_hash}{extension.lower()}")
+
+def is_blob(file_path: str) -> bool:
+    """Indique si le chemin désigne un fichier du stockage adressé par contenu"""
+    blob_root = os.path.abspath(BLOB_DIR) + os.sep
+    return os.path.abspath(file_path).startswith(blob_root)
+
+def store_file(source_path: str, mode: str = UPLOAD_STORAGE_MODE) -> Tuple[str, str]:
+    """
+    Place un fichier dans le stockage des uploads, adressé par son contenu
+
+    Les fichiers identiques ne sont stockés qu'une seule fois. L'extension est
+    conservée car elle détermine le loader utilisé pour l'extraction.
+
+    Note: en mode 'link', un lien physique partage le fichier avec la source ;
+    celle-ci ne doit donc pas être modifiée sur place après l'import.
+
+    Args:
+        source_path: Fichier à importer
+        mode: 'link', 'copy' ou 'reference'
+
+    Returns:
+        Tuple (chemin à utiliser pour le document, empreinte SHA-256 du contenu)
+    """
+    if mode not in (STORAGE_LINK, STORAGE_COPY, STORAGE_REFERENCE):
+        raise ValueError(f"Mode de stockage inconnu: {mode}")
+
+    content_hash = compute_file_hash(source_path)
+
+    if mode == STORAGE_REFERENCE:
+        # Partage en lecture seule : le document pointe directement sur la source
+        return os.path.abspath(source_path), content_hash
+
+    dest_path = blob_path(content_hash, os.path.splitext(source_path)[1])
+    if os.path.exists(dest_path):
+        return dest_path, content_hash
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+    # Écrire sous un nom temporaire puis renommer, pour ne jamais exposer un blob partiel
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(dest_path))
+    tmp_path = os.path.join(tmp_dir, os.path.basename(dest_path))
+    try:
+        _materialize(source_path, tmp_path, mode)
+        os.replace(tmp_path, dest_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return dest_path, content_hash
+
+def release_file(file_path: str, still_referenced: bool):
+    """
+    Supprime un blob qui n'est plus utilisé par aucun document
+
+    Les fichiers référencés (mode 'reference') ne sont jamais supprimés.
+    """
+    if still_referenced or not is_blob(file_path):
+        return
+    if os.path.exists(file_path):
+        os.remove(file_path)
@@ -0,0 +1,685 @@
+import os
+import re
+import csv
+import json
+import html
+import hashlib
+import zipfile
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+CHART_KINDS = ["line", "bar", "pie", "scatter", "area"]
+
+# Mots-clés d'une demande indiquant le type de graphique (comparés sans majuscules)
+KIND_KEYWORDS = [
+    ("pie", ["camembert", "répartition", "proportion", "pourcentage", "part de", "parts de", "pie"]),
+    ("scatter", ["nuage", "corrélation", "dispersion", "scatter"]),
+    ("area", ["aire", "cumul", "empilé"]),
+    ("line", ["évolution", "tendance", "courbe", "série", "temporel", "historique", "au fil", "line"]),
+    ("bar", ["barre", "histogramme", "comparaison", "compar", "classement", "top ", "bar"]),
+]
+
+# Au-delà, un graphique en barres devient une courbe (une barre ne ferait plus un pixel)
+MAX_BARS = 300
+
+PALETTE = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f"]
+
+class DataTable:
+    """Table en colonnes : un tableau NumPy par colonne (float pour les colonnes numériques)"""
+
+    def __init__(self, columns: Dict[str, Any]):
+        if not columns:
+            raise ValueError("Aucune colonne dans les données")
+        self.columns = {name: _to_array(values) for name, values in columns.items()}
+        lengths = {len(values) for values in self.columns.values()}
+        if len(lengths) != 1:
+            raise ValueError("Les colonnes n'ont pas toutes la même longueur")
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values())))
+
+    @property
+    def numeric_columns(self) -> List[str]:
+        return [name for name, values in self.columns.items() if values.dtype.kind in "if"]
+
+    @property
+    def time_columns(self) -> List[str]:
+        return [name for name, values in self.columns.items() if values.dtype.kind == "M"]
+
+    @property
+    def label_columns(self) -> List[str]:
+        return [name for name, values in self.columns.items() if values.dtype.kind not in "ifM"]
+
+    def head(self, n: int) -> "DataTable":
+        return DataTable({name: values[:n] for name, values in self.columns.items()})
+
+def _to_array(values: Any) -> np.ndarray:
+    """
+    Convertit une colonne en float si toutes ses valeurs non vides sont numériques (virgule décimale
+    acceptée), en datetime64 si ce sont des dates ISO 8601, sinon la garde en texte
+    """
+    array = np.asarray(values)
+    if array.dtype.kind in "if":
+        return array.astype(np.float64)
+    if array.dtype.kind == "M":
+        return array.astype("datetime64[s]")
+    try:
+        # Conversion directe (en C) dans le cas courant des nombres au format anglo-saxon
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    text = ["" if v is None else str(v).strip() for v in values]
+    normalized = [v.replace(" ", "").replace("\u00a0", "").replace(",", ".") or "nan" for v in text]
+    try:
+        numbers = np.asarray(normalized, dtype=np.float64)
+        if not np.isnan(numbers).all():
+            return numbers
+    except ValueError:
+        pass
+    try:
+        stamps = np.asarray([v.replace(" ", "T", 1) if v else "NaT" for v in text], dtype="datetime64[s]")
+        if not np.isnat(stamps).all():
+            return stamps
+    except ValueError:
+        pass
+    return np.asarray(text, dtype=object)
+
+# "Janvier: 120, Février: 110" ou "Janvier = 120 ; Février = 110"
+_PAIR_PATTERN = re.compile(r"([^:=,;\n|]+?)\s*[:=]\s*(-?\d[\d\s ]*(?:[.,]\d+)?)(?=\s*(?:[,;\n|]|$))")
+
+def parse_table(data: Any) -> DataTable:
+    """
+    Convertit les données d'une demande de visualisation en table
+
+    Formats acceptés : DataTable, dictionnaire de colonnes, liste d'enregistrements,
+    JSON de l'un de ces formats, CSV/TSV avec en-tête, ou paires « libellé: valeur ».
+
+    Raises:
+        ValueError: si aucune colonne numérique n'est trouvée
+    """
+    if isinstance(data, DataTable):
+        table = data
+    elif isinstance(data, dict):
+        table = DataTable({str(name): list(values) for name, values in data.items()})
+    elif isinstance(data, (list, tuple)) and data and isinstance(data[0], dict):
+        names = list(dict.fromkeys(key for record in data for key in record))
+        table = DataTable({str(name): [record.get(name) for record in data] for name in names})
+    elif isinstance(data, str):
+        table = _parse_text(data.strip())
+    else:
+        raise ValueError(f"Format de données non supporté: {type(data).__name__}")
+
+    if not table.numeric_columns:
+        raise ValueError("Aucune colonne numérique à visualiser dans les données")
+    return table
+
+def parse_delimited(lines: List[str], delimiter: str, header: Optional[List[str]] = None) -> DataTable:
+    """
+    Table à partir de lignes délimitées (CSV, TSV...)
+
+    Args:
+        lines: Lignes de données (la première est l'en-tête si header n'est pas fourni)
+        delimiter: Séparateur de colonnes
+        header: Noms des colonnes, pour les blocs lus après l'en-tête d'un fichier
+    """
+    lines = [line.rstrip("\r\n") for line in lines if line.strip()]
+    if header is None:
+        if not lines:
+            raise ValueError("Aucune donnée fournie")
+        header, lines = next(csv.reader(lines[:1], delimiter=delimiter)), lines[1:]
+    header = [name.strip() or f"colonne_{i + 1}" for i, name in enumerate(header)]
+    width = len(header)
+    if not lines:
+        return DataTable({name: np.array([], dtype=object) for name in header})
+
+    if not any('"' in line for line in lines):
+        # Sans guillemets, un seul découpage de tout le bloc (en C) suffit
+        cells = delimiter.join(lines).split(delimiter)
+        if len(cells) == width * len(lines):
+            grid = np.asarray(cells, dtype=str).reshape(len(lines), width)
+            return DataTable({name: grid[:, i] for i, name in enumerate(header)})
+    rows = list(csv.reader(lines, delimiter=delimiter))
+    if any(len(row) != width for row in rows):
+        raise ValueError(f"Nombre de colonnes incohérent (attendu: {width})")
+    return DataTable(dict(zip(header, zip(*rows))))
+
+def _parse_text(text: str) -> DataTable:
+    if not text:
+        raise ValueError("Aucune donnée fournie")
+    if text[0] in "[{":
+        try:
+            return parse_table(json.loads(text))
+        except ValueError:
+            pass
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) >= 2:
+        try:
+            dialect = csv.Sniffer().sniff("\n".join(lines[:20]), delimiters=",;\t|")
+        except csv.Error:
+            dialect = None
+        if dialect is not None and lines[0].count(dialect.delimiter) >= 1:
+            try:
+                return parse_delimited(lines, dialect.delimiter)
+            except ValueError:
+                pass
+        else:
+            # Une seule colonne : un en-tête suivi de valeurs
+            column = DataTable({lines[0].strip(): lines[1:]})
+            if column.numeric_columns:
+                return column
+
+    pairs = _PAIR_PATTERN.findall(text)
+    if len(pairs) >= 2:
+        labels = [label.strip() for label, _ in pairs]
+        # Le texte qui précède la première paire sert de nom à la série ("Consommation en kWh par mois")
+        prefix = text[:text.find(pairs[0][0])].strip(" :\n")
+        return DataTable({"libellé": labels, prefix or "valeur": [value for _, value in pairs]})
+
+    raise ValueError("Données non reconnues: utiliser un CSV avec en-tête, du JSON ou des paires 'libellé: valeur'")
+
+def describe(table: DataTable) -> Dict[str, Dict[str, float]]:
+    """Statistiques des colonnes numériques (valeurs manquantes ignorées)"""
+    stats = {}
+    for name in table.numeric_columns:
+        values = table.columns[name]
+        valid = values[~np.isnan(values)]
+        stats[name] = {
+            "count": int(valid.size),
+            "missing": int(values.size - valid.size),
+            "min": float(valid.min()) if valid.size else float("nan"),
+            "max": float(valid.max()) if valid.size else float("nan"),
+            "mean": float(valid.mean()) if valid.size else float("nan"),
+            "std": float(valid.std()) if valid.size else float("nan"),
+            "sum": float(valid.sum()),
+        }
+    return stats
+
+class ChartSpec(BaseModel):
+    """Description d'un graphique : type, colonne des abscisses et séries"""
+    kind: str = "bar"
+    title: str = ""
+    x: Optional[str] = None
+    y: List[str] = []
+    x_label: str = ""
+    y_label: str = ""
+
+def _category_count(table: DataTable, x: Optional[str]) -> int:
+    """Nombre de catégories en abscisse après regroupement des libellés identiques"""
+    if x in table.label_columns:
+        return len(np.unique(table.columns[x].astype(str)))
+    return len(table)
+
+def infer_chart_spec(table: DataTable, query: str = "") -> Tuple[ChartSpec, bool]:
+    """
+    Déduit localement le graphique adapté à la demande et aux données
+
+    Returns:
+        La spécification et True si le type a été reconnu dans la demande
+    """
+    lowered = query.lower()
+    # Mots-clés cherchés en début de mot ("aire" ne doit pas reconnaître "horaire")
+    kind = next((kind for kind, keywords in KIND_KEYWORDS
+                 if any(re.search(r"\b" + re.escape(k), lowered) for k in keywords)), None)
+    confident = kind is not None
+
+    numeric = table.numeric_columns
+    labels = table.label_columns
+    times = table.time_columns
+    x = times[0] if times else (labels[0] if labels else None)
+    if x is None and len(numeric) > 1:
+        # Première colonne numérique croissante (temps, index) comme abscisse
+        first = table.columns[numeric[0]]
+        if len(first) > 1 and np.all(np.diff(first[~np.isnan(first)]) > 0):
+            x = numeric[0]
+    y = [name for name in numeric if name != x]
+
+    count = _category_count(table, x)
+    if kind is None:
+        kind = "line" if (x is None or x in numeric or x in times or count > 30) else "bar"
+    if kind == "bar" and count > MAX_BARS:
+        kind = "line"
+    if kind == "pie":
+        y = y[:1]
+    if kind == "scatter" and x is None and len(y) >= 2:
+        x, y = y[0], y[1:2]
+
+    spec = ChartSpec(kind=kind, title=query.strip()[:120], x=x, y=y, x_label=x or "", y_label=", ".join(y))
+    return spec, confident
+
+_COLUMN_TYPES = {"f": "numérique", "i": "numérique", "M": "date"}
+
+def choose_chart_spec(table: DataTable, query: str, llm: Any = None) -> ChartSpec:
+    """
+    Spécification du graphique : déduite localement, ou demandée au LLM si la demande
+    n'indique pas le type (seuls les noms et types de colonnes et 3 lignes lui sont envoyés)
+    """
+    spec, confident = infer_chart_spec(table, query)
+    if confident or llm is None:
+        return spec
+
+    sample = table.head(3)
+    description = ", ".join(
+        f"{name} ({_COLUMN_TYPES.get(values.dtype.kind, 'texte')})" for name, values in table.columns.items()
+    )
+    rows = [dict(zip(sample.columns, [str(v) for v in row])) for row in zip(*sample.columns.values())]
+    prompt = (
+        "Choisis le graphique le plus adapté. Réponds uniquement en JSON "
+        '{"kind": "line|bar|pie|scatter|area", "x": "colonne ou null", "y": ["colonnes numériques"], "title": "..."}\n'
+        f"Demande: {query}\nColonnes ({len(table)} lignes): {description}\nExemple: {json.dumps(rows, ensure_ascii=False)}"
+    )
+    try:
+        content = llm.invoke(prompt).content
+        proposed = json.loads(content[content.index("{"):content.rindex("}") + 1])
+        candidate = ChartSpec(**{**spec.dict(), **{k: v for k, v in proposed.items() if v is not None}})
+        numeric = set(table.numeric_columns)
+        if candidate.kind == "bar" and _category_count(table, candidate.x) > MAX_BARS:
+            candidate.kind = "line"
+        if (candidate.kind in CHART_KINDS and candidate.y and set(candidate.y) <= numeric
+                and (candidate.x is None or candidate.x in table.columns)):
+            candidate.x_label = candidate.x or ""
+            candidate.y_label = ", ".join(candidate.y)
+            return candidate
+    except Exception as e:
+        print(f"Spécification du LLM ignorée: {str(e)}")
+    return spec
+
+def decimate(x: np.ndarray, y: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Réduit une série à au plus 2 × buckets points en gardant le min et le max de chaque intervalle"""
+    if len(y) <= 2 * buckets:
+        return x, y
+    bounds = np.linspace(0, len(y), buckets + 1).astype(int)
+    starts = bounds[:-1]
+    filled = np.where(np.isnan(y), np.nanmean(y), y)
+    minima = np.minimum.reduceat(filled, starts)
+    maxima = np.maximum.reduceat(filled, starts)
+    # Position du min et du max dans chaque intervalle, pour garder l'ordre temporel
+    segment = np.repeat(np.arange(buckets), np.diff(bounds))
+    is_min = filled == minima[segment]
+    is_max = filled == maxima[segment]
+    first_min = starts + np.array([np.argmax(is_min[s:e]) for s, e in zip(starts, bounds[1:])])
+    first_max = starts + np.array([np.argmax(is_max[s:e]) for s, e in zip(starts, bounds[1:])])
+    indices = np.unique(np.concatenate([first_min, first_max]))
+    return x[indices], y[indices]
+
+def group_by_label(table: DataTable, spec: ChartSpec) -> DataTable:
+    """Somme les séries par libellé quand l'abscisse textuelle contient des doublons (barres, camembert)"""
+    if spec.kind not in ("bar", "pie") or not spec.x or spec.x not in table.label_columns:
+        return table
+    labels, inverse = np.unique(table.columns[spec.x].astype(str), return_inverse=True)
+    if len(labels) == len(table):
+        return table
+    # Ordre de première apparition des libellés
+    first = np.full(len(labels), len(table))
+    np.minimum.at(first, inverse, np.arange(len(table)))
+    order = np.argsort(first)
+    columns = {spec.x: labels[order]}
+    for name in spec.y:
+        columns[name] = np.bincount(inverse, weights=np.nan_to_num(table.columns[name]), minlength=len(labels))[order]
+    return DataTable(columns)
+
+def _x_values(table: DataTable, spec: ChartSpec) -> Tuple[np.ndarray, Optional[List[str]]]:
+    """Abscisses numériques et libellés associés (None pour une abscisse numérique ou temporelle, graduée à part)"""
+    if spec.x and table.columns[spec.x].dtype.kind in "if":
+        return table.columns[spec.x], None
+    if spec.x and table.columns[spec.x].dtype.kind == "M":
+        stamps = table.columns[spec.x]
+        return np.where(np.isnat(stamps), np.nan, stamps.astype(np.int64).astype(np.float64)), None
+    labels = [str(v) for v in table.columns[spec.x]] if spec.x else [str(i + 1) for i in range(len(table))]
+    return np.arange(len(table), dtype=np.float64), labels
+
+def _tick_label(table: DataTable, spec: ChartSpec, value: float) -> str:
+    """Libellé d'une graduation de l'abscisse (date pour une colonne temporelle)"""
+    if spec.x and table.columns[spec.x].dtype.kind == "M" and not np.isnan(value):
+        stamp = str(np.datetime64(int(value), "s")).replace("T", " ")
+        return stamp[:10] if stamp.endswith("00:00:00") else stamp[:16]
+    return _format_number(value)
+
+def _format_number(value: float) -> str:
+    if np.isnan(value):
+        return ""
+    if abs(value) >= 1e6 or (abs(value) < 1e-3 and value != 0):
+        return f"{value:.3g}"
+    return f"{value:,.2f}".replace(",", " ").rstrip("0").rstrip(".")
+
+def render_svg(table: DataTable, spec: ChartSpec, width: int = 800, height: int = 450) -> str:
+    """Rend le graphique en SVG autonome, sans dépendance (séries longues décimées à la largeur du tracé)"""
+    table = group_by_label(table, spec)
+    left, right, top, bottom = 70, 20, 40, 70
+    plot_w, plot_h = width - left - right, height - top - bottom
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="12">',
+             f'<rect width="{width}" height="{height}" fill="white"/>',
+             f'<text x="{width / 2}" y="22" text-anchor="middle" font-size="15" font-weight="bold">'
+             f'{html.escape(spec.title)}</text>']
+
+    if spec.kind == "pie":
+        parts.extend(_svg_pie(table, spec, width, height))
+        parts.append("</svg>")
+        return "\n".join(parts)
+
+    x, x_labels = _x_values(table, spec)
+    series = [table.columns[name] for name in spec.y]
+    y_min = min(float(np.nanmin(s)) for s in series)
+    y_max = max(float(np.nanmax(s)) for s in series)
+    if spec.kind in ("bar", "area"):
+        y_min, y_max = min(y_min, 0.0), max(y_max, 0.0)
+    if y_max == y_min:
+        y_max = y_min + 1.0
+    x_min, x_max = float(np.nanmin(x)), float(np.nanmax(x))
+    if x_max == x_min:
+        x_max = x_min + 1.0
+
+    def sx(values):
+        return left + (values - x_min) / (x_max - x_min) * plot_w
+
+    def sy(values):
+        return top + plot_h - (values - y_min) / (y_max - y_min) * plot_h
+
+    # Axes, graduations et grille
+    parts.append(f'<line x1="{left}" y1="{top + plot_h}" x2="{left + plot_w}" y2="{top + plot_h}" stroke="#333"/>')
+    parts.append(f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_h}" stroke="#333"/>')
+    for tick in np.linspace(y_min, y_max, 6):
+        y_pos = float(sy(tick))
+        parts.append(f'<line x1="{left}" y1="{y_pos:.1f}" x2="{left + plot_w}" y2="{y_pos:.1f}" stroke="#eee"/>')
+        parts.append(f'<text x="{left - 6}" y="{y_pos + 4:.1f}" text-anchor="end">{_format_number(tick)}</text>')
+
+    if spec.kind == "bar":
+        if x_labels is None:
+            x_labels = [_tick_label(table, spec, v) for v in x]
+        count = len(x)
+        group_w = plot_w / max(count, 1)
+        bar_w = group_w * 0.8 / len(series)
+        zero = float(sy(0.0))
+        for s_index, values in enumerate(series):
+            offsets = left + np.arange(count) * group_w + group_w * 0.1 + s_index * bar_w
+            tops = sy(np.nan_to_num(values))
+            for offset, y_top in zip(offsets, tops):
+                y_pos, bar_h = min(y_top, zero), abs(zero - y_top)
+                parts.append(f'<rect x="{offset:.1f}" y="{y_pos:.1f}" width="{bar_w:.1f}" height="{bar_h:.1f}" '
+                             f'fill="{PALETTE[s_index % len(PALETTE)]}"/>')
+        label_positions = left + (np.arange(count) + 0.5) * group_w
+    else:
+        for s_index, values in enumerate(series):
+            color = PALETTE[s_index % len(PALETTE)]
+            if spec.kind == "scatter":
+                valid = ~np.isnan(values)
+                xs, ys = x[valid], values[valid]
+                if len(xs) > 5000:
+                    keep = np.random.default_rng(0).choice(len(xs), 5000, replace=False)
+                    xs, ys = xs[keep], ys[keep]
+                for px, py in zip(sx(xs), sy(ys)):
+                    parts.append(f'<circle cx="{px:.1f}" cy="{py:.1f}" r="2.5" fill="{color}" fill-opacity="0.7"/>')
+                continue
+            xs, ys = decimate(x, values, plot_w)
+            valid = ~np.isnan(ys)
+            points = " ".join(f"{px:.1f},{py:.1f}" for px, py in zip(sx(xs[valid]), sy(ys[valid])))
+            if spec.kind == "area" and valid.any():
+                base = float(sy(max(y_min, 0.0)))
+                first, last = float(sx(xs[valid][0])), float(sx(xs[valid][-1]))
+                parts.append(f'<polygon points="{first:.1f},{base:.1f} {points} {last:.1f},{base:.1f}" '
+                             f'fill="{color}" fill-opacity="0.35" stroke="none"/>')
+            parts.append(f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="1.8"/>')
+        if x_labels is None:
+            ticks = np.linspace(x_min, x_max, 7)
+            label_positions, x_labels = sx(ticks), [_tick_label(table, spec, t) for t in ticks]
+        else:
+            label_positions = sx(x)
+
+    # Au plus 12 libellés en abscisse
+    step = max(1, int(np.ceil(len(x_labels) / 12)))
+    for position, label in list(zip(label_positions, x_labels))[::step]:
+        parts.append(f'<text x="{position:.1f}" y="{top + plot_h + 16}" text-anchor="end" '
+                     f'transform="rotate(-30 {position:.1f} {top + plot_h + 16})">{html.escape(label[:20])}</text>')
+    if spec.x_label:
+        parts.append(f'<text x="{left + plot_w / 2}" y="{height - 6}" text-anchor="middle">{html.escape(spec.x_label)}</text>')
+    parts.extend(_svg_legend(spec.y, left + plot_w, top))
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+def _svg_legend(names: List[str], right: float, top: float) -> List[str]:
+    if len(names) < 2:
+        return []
+    items = []
+    for index, name in enumerate(names):
+        y_pos = top + index * 16
+        items.append(f'<rect x="{right - 150}" y="{y_pos}" width="10" height="10" fill="{PALETTE[index % len(PALETTE)]}"/>')
+        items.append(f'<text x="{right - 135}" y="{y_pos + 9}">{html.escape(name[:22])}</text>')
+    return items
+
+def _pie_slices(table: DataTable, spec: ChartSpec, max_slices: int = 8) -> Tuple[List[str], np.ndarray]:
+    """Parts positives du camembert, les plus petites regroupées dans « Autres »"""
+    x, labels = _x_values(table, spec)
+    values = np.nan_to_num(table.columns[spec.y[0]])
+    positive = np.flatnonzero(values > 0)
+    order = positive[np.argsort(values[positive])[::-1]]
+    kept = order[:max_slices - 1] if len(order) > max_slices else order
+
+    def label(index):
+        return _tick_label(table, spec, x[index]) if labels is None else labels[index]
+
+    names = [label(i) for i in kept]
+    if len(kept) < len(order):
+        return names + ["Autres"], np.append(values[kept], values[order[len(kept):]].sum())
+    return names, values[kept]
+
+def _svg_pie(table: DataTable, spec: ChartSpec, width: int, height: int) -> List[str]:
+    labels, values = _pie_slices(table, spec)
+    total = values.sum()
+    if total <= 0:
+        return [f'<text x="{width / 2}" y="{height / 2}" text-anchor="middle">Aucune valeur positive</text>']
+    cx, cy, radius = width * 0.35, height / 2 + 10, min(width, height) * 0.36
+    angles = np.concatenate([[0.0], np.cumsum(values / total) * 2 * np.pi]) - np.pi / 2
+    parts = []
+    for index, (label, value) in enumerate(zip(labels, values)):
+        start, end = angles[index], angles[index + 1]
+        x1, y1 = cx + radius * np.cos(start), cy + radius * np.sin(start)
+        x2, y2 = cx + radius * np.cos(end), cy + radius * np.sin(end)
+        large = 1 if end - start > np.pi else 0
+        color = PALETTE[index % len(PALETTE)]
+        if len(values) == 1:
+            parts.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{radius:.1f}" fill="{color}"/>')
+        else:
+            parts.append(f'<path d="M{cx:.1f},{cy:.1f} L{x1:.1f},{y1:.1f} A{radius:.1f},{radius:.1f} 0 {large} 1 '
+                         f'{x2:.1f},{y2:.1f} Z" fill="{color}" stroke="white"/>')
+        legend_y = 60 + index * 20
+        parts.append(f'<rect x="{width * 0.7}" y="{legend_y}" width="12" height="12" fill="{color}"/>')
+        parts.append(f'<text x="{width * 0.7 + 18}" y="{legend_y + 10}">{html.escape(label[:24])} '
+                     f'({value / total:.1%})</text>')
+    return parts
+
+def render_matplotlib(table: DataTable, spec: ChartSpec, path: str):
+    """Rend le graphique en PNG ou PDF (selon l'extension de path) avec matplotlib"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ValueError("matplotlib est requis pour les formats PNG et PDF (pip install matplotlib)")
+
+    table = group_by_label(table, spec)
+    figure, axis = plt.subplots(figsize=(10, 5.6))
+    try:
+        if spec.kind == "pie":
+            labels, values = _pie_slices(table, spec)
+            axis.pie(values, labels=labels, autopct="%1.1f%%", colors=PALETTE)
+        else:
+            x, x_labels = _x_values(table, spec)
+            for index, name in enumerate(spec.y):
+                values = table.columns[name]
+                color = PALETTE[index % len(PALETTE)]
+                if spec.kind == "bar":
+                    width = 0.8 / len(spec.y)
+                    axis.bar(np.arange(len(x)) + index * width, np.nan_to_num(values), width, label=name, color=color)
+                elif spec.kind == "scatter":
+                    axis.scatter(x, values, s=6, label=name, color=color)
+                else:
+                    xs, ys = decimate(x, values, 2000)
+                    axis.plot(xs, ys, label=name, color=color, linewidth=1.2)
+                    if spec.kind == "area":
+                        axis.fill_between(xs, ys, alpha=0.3, color=color)
+            if spec.kind == "bar":
+                x_labels = x_labels or [_tick_label(table, spec, v) for v in x]
+                step = max(1, int(np.ceil(len(x_labels) / 20)))
+                axis.set_xticks(np.arange(len(x))[::step] + 0.4 - 0.4 / len(spec.y))
+                axis.set_xticklabels(x_labels[::step], rotation=30, ha="right")
+            elif x_labels is not None:
+                step = max(1, int(np.ceil(len(x_labels) / 12)))
+                axis.set_xticks(x[::step])
+                axis.set_xticklabels(x_labels[::step], rotation=30, ha="right")
+            elif spec.x in table.time_columns:
+                ticks = np.linspace(np.nanmin(x), np.nanmax(x), 7)
+                axis.set_xticks(ticks)
+                axis.set_xticklabels([_tick_label(table, spec, t) for t in ticks], rotation=30, ha="right")
+            axis.set_xlabel(spec.x_label)
+            axis.set_ylabel(spec.y_label)
+            if len(spec.y) > 1:
+                axis.legend()
+            axis.grid(alpha=0.3)
+        axis.set_title(spec.title)
+        figure.tight_layout()
+        figure.savefig(path)
+    finally:
+        plt.close(figure)
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def _sheet_xml(header: List[str], columns: List[np.ndarray]) -> str:
+    """Feuille XLSX : en-tête en gras, nombres et textes (chaînes en ligne)"""
+    letters = [_column_letter(i) for i in range(len(header))]
+    rows = ['<row r="1">' + "".join(
+        f'<c r="{letter}1" t="inlineStr" s="1"><is><t>{html.escape(str(name))}</t></is></c>'
+        for letter, name in zip(letters, header)) + "</row>"]
+    # Cellules formatées colonne par colonne (vectorisé pour les colonnes numériques)
+    cells = []
+    for letter, values in zip(letters, columns):
+        if values.dtype.kind in "if":
+            formatted = np.char.mod("%.15g", values)
+            cells.append([f"<v>{text}</v>" if text not in ("nan", "inf", "-inf") else None for text in formatted])
+        else:
+            if values.dtype.kind == "M":
+                values = np.char.replace(np.datetime_as_string(values), "T", " ")
+            cells.append([f'<is><t xml:space="preserve">{html.escape(str(v))}</t></is>' for v in values])
+    for row_index in range(len(columns[0]) if columns else 0):
+        number = row_index + 2
+        row = []
+        for letter, column_cells, values in zip(letters, cells, columns):
+            content = column_cells[row_index]
+            if content is None:
+                continue
+            kind = "" if values.dtype.kind in "if" else ' t="inlineStr"'
+            row.append(f'<c r="{letter}{number}"{kind}>{content}</c>')
+        rows.append(f'<row r="{number}">' + "".join(row) + "</row>")
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/>'
+            '</sheetView></sheetViews><sheetData>' + "".join(rows) + "</sheetData></worksheet>")
+
+def write_xlsx(table: DataTable, path: str, sheet_name: str = "Données"):
+    """Écrit un classeur XLSX (feuille des données et feuille de statistiques) sans dépendance externe"""
+    stats = describe(table)
+    stat_names = ["count", "missing", "min", "max", "mean", "std", "sum"]
+    sheets = [
+        (sheet_name[:31], _sheet_xml(list(table.columns), list(table.columns.values()))),
+        ("Statistiques", _sheet_xml(["colonne"] + stat_names, [
+            np.array(list(stats), dtype=object)
+        ] + [np.array([stats[name][stat] for name in stats], dtype=np.float64) for stat in stat_names]))
+    ]
+    content_types = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                     '<Default Extension="xml" ContentType="application/xml"/>'
+                     '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                     '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                     + "".join(f'<Override PartName="/xl/worksheets/sheet{i + 1}.xml" '
+                               'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                               for i in range(len(sheets)))
+                     + '</Types>')
+    root_rels = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                 '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                 '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+                 '</Relationships>')
+    workbook = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+                + "".join(f'<sheet name="{html.escape(name)}" sheetId="{i + 1}" r:id="rId{i + 1}"/>'
+                          for i, (name, _) in enumerate(sheets))
+                + '</sheets></workbook>')
+    workbook_rels = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                     + "".join(f'<Relationship Id="rId{i + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                               f'Target="worksheets/sheet{i + 1}.xml"/>' for i in range(len(sheets)))
+                     + f'<Relationship Id="rId{len(sheets) + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+                     '</Relationships>')
+    styles = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+              '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+              '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+              '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+              '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+              '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+              '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+              '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+              '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+              '</styleSheet>')
+
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", content_types)
+        archive.writestr("_rels/.rels", root_rels)
+        archive.writestr("xl/workbook.xml", workbook)
+        archive.writestr("xl/_rels/workbook.xml.rels", workbook_rels)
+        archive.writestr("xl/styles.xml", styles)
+        for index, (_, xml) in enumerate(sheets):
+            archive.writestr(f"xl/worksheets/sheet{index + 1}.xml", xml)
+    os.replace(tmp_path, path)
+
+def render_html_report(table: DataTable, spec: ChartSpec, title: str, preview_rows: int = 50) -> str:
+    """Rapport HTML autonome : graphique SVG, statistiques et aperçu des données"""
+    stats = describe(table)
+    stat_rows = "".join(
+        f"<tr><td>{html.escape(name)}</td>" + "".join(f"<td>{_format_number(values[key])}</td>"
+                                                       for key in ("count", "min", "max", "mean", "std", "sum"))
+        + "</tr>" for name, values in stats.items())
+    preview = table.head(preview_rows)
+    data_rows = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(_format_number(v) if isinstance(v, float) else str(v))}</td>" for v in row)
+        + "</tr>" for row in zip(*preview.columns.values()))
+    header = "".join(f"<th>{html.escape(name)}</th>" for name in table.columns)
+    return f"""<!DOCTYPE html>
+<html lang="fr"><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<style>body{{font-family:sans-serif;margin:2em;color:#222}}table{{border-collapse:collapse;margin:1em 0}}
+td,th{{border:1px solid #ccc;padding:4px 8px;text-align:right}}th{{background:#f3f3f3}}</style></head>
+<body><h1>{html.escape(title)}</h1>
+<p>Généré le {datetime.now().strftime('%d/%m/%Y %H:%M')} — {len(table)} lignes, {len(table.columns)} colonnes.</p>
+{render_svg(table, spec)}
+<h2>Statistiques</h2>
+<table><tr><th>Colonne</th><th>Nombre</th><th>Min</th><th>Max</th><th>Moyenne</th><th>Écart-type</th><th>Somme</th></tr>{stat_rows}</table>
+<h2>Données{f' ({preview_rows} premières lignes)' if len(table) > preview_rows else ''}</h2>
+<table><tr>{header}</tr>{data_rows}</table>
+</body></html>"""
+
+def output_path(output_dir: str, title: str, extension: str, *keys: Any) -> str:
+    """Chemin de sortie déterministe : nom lisible tiré du titre et empreinte du contenu"""
+    os.makedirs(output_dir, exist_ok=True)
+    ascii_title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii")
+    slug = re.sub(r"[^a-z0-9]+", "-", ascii_title.lower()).strip("-")[:40] or "visualisation"
+    digest = hashlib.sha256(json.dumps([str(k) for k in keys]).encode("utf-8")).hexdigest()[:10]
+    return os.path.join(output_dir, f"{slug}-{digest}.{extension}")
+
+def table_fingerprint(table: DataTable) -> str:
+    """Empreinte du contenu d'une table (noms de colonnes et valeurs)"""
+    sha256 = hashlib.sha256()
+    for name, values in table.columns.items():
+        sha256.update(name.encode("utf-8"))
+        sha256.update(values.tobytes() if values.dtype.kind in "ifM" else "\0".join(map(str, values)).encode("utf-8"))
+    return sha256.hexdigest()
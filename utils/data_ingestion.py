@@ -0,0 +1,459 @@
+import os
+import csv
+import json
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import (VISUALIZATION_MAX_POINTS, VISUALIZATION_CHUNK_ROWS, VISUALIZATION_DATA_DIRS,
+                    VISUALIZATION_JSON_MAX_BYTES)
+from utils.chart_renderer import DataTable, parse_table, parse_delimited
+
+DELIMITED_EXTENSIONS = {".csv": None, ".tsv": "\t", ".txt": None}
+PARQUET_EXTENSIONS = {".parquet", ".pq"}
+JSON_EXTENSIONS = {".json", ".jsonl", ".ndjson"}
+
+# Au-delà, les libellés d'une colonne textuelle ne sont plus comptés (identifiants, texte libre)
+MAX_CATEGORIES = 10000
+
+def _existing_data_file(data: Any) -> Optional[str]:
+    """Chemin réel du fichier de données existant (CSV, TSV, Parquet, JSON) désigné par data, ou None"""
+    if not isinstance(data, str) or "\n" in data or len(data) > 1024:
+        return None
+    extension = os.path.splitext(data.strip())[1].lower()
+    supported = set(DELIMITED_EXTENSIONS) | PARQUET_EXTENSIONS | JSON_EXTENSIONS
+    if extension not in supported:
+        return None
+    path = os.path.realpath(data.strip())
+    return path if os.path.isfile(path) else None
+
+def resolve_data_file(data: Any) -> Optional[str]:
+    """
+    Chemin réel du fichier de données désigné par data, s'il est situé dans VISUALIZATION_DATA_DIRS
+
+    Le chemin vient de l'utilisateur ou du LLM : un fichier hors des répertoires autorisés
+    (liens symboliques résolus) n'est jamais lu.
+    """
+    path = _existing_data_file(data)
+    if path is None:
+        return None
+    for directory in VISUALIZATION_DATA_DIRS:
+        root = os.path.realpath(directory.strip())
+        if os.path.commonpath([root, path]) == root:
+            return path
+    return None
+
+def is_data_path(data: Any) -> bool:
+    """Indique si data désigne un fichier de données existant, autorisé ou non"""
+    return _existing_data_file(data) is not None
+
+def is_data_file(data: Any) -> bool:
+    """Indique si data désigne un fichier de données existant dans un répertoire autorisé"""
+    return resolve_data_file(data) is not None
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Sous-échantillonnage Largest-Triangle-Three-Buckets
+
+    Garde le premier et le dernier point et, dans chaque intervalle, le point qui forme le plus
+    grand triangle avec le point retenu précédemment et la moyenne de l'intervalle suivant :
+    pics et creux sont conservés, contrairement à un échantillonnage régulier.
+
+    Returns:
+        Les indices (croissants) des points retenus
+    """
+    count = len(y)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    x = np.nan_to_num(np.asarray(x, dtype=np.float64))
+    y = np.asarray(y, dtype=np.float64)
+    if np.isnan(y).any():
+        y = np.where(np.isnan(y), np.nanmean(y) if not np.isnan(y).all() else 0.0, y)
+
+    bounds = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, count - 1
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        next_end = bounds[bucket + 2] if bucket + 2 < len(bounds) else count
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        areas = np.abs((x[selected] - average_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (average_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+def _table_chunks(table: DataTable, chunk_rows: int) -> Iterator[DataTable]:
+    for start in range(0, max(len(table), 1), chunk_rows):
+        yield DataTable({name: values[start:start + chunk_rows] for name, values in table.columns.items()})
+
+def _dataframe_chunks(frame: Any, chunk_rows: int) -> Iterator[DataTable]:
+    """Blocs d'un DataFrame pandas (détecté par ses attributs, pandas n'est pas importé)"""
+    for start in range(0, max(len(frame), 1), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        yield DataTable({str(name): chunk[name].to_numpy() for name in chunk.columns})
+
+def _arrow_chunks(batches: Any) -> Iterator[DataTable]:
+    for batch in batches:
+        yield DataTable({name: batch.column(i).to_numpy(zero_copy_only=False)
+                         for i, name in enumerate(batch.schema.names)})
+
+def _delimited_chunks(path: str, chunk_rows: int) -> Iterator[DataTable]:
+    """Lit un fichier délimité par blocs de chunk_rows lignes (mémoire bornée quelle que soit sa taille)"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        head = list(islice(f, 20))
+        if not head:
+            raise ValueError(f"Fichier vide: {path}")
+        delimiter = DELIMITED_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if delimiter is None:
+            try:
+                delimiter = csv.Sniffer().sniff("".join(head), delimiters=",;\t|").delimiter
+            except csv.Error:
+                # Fichier à une seule colonne
+                delimiter = ","
+        header = next(csv.reader(head[:1], delimiter=delimiter))
+        lines = head[1:]
+        while True:
+            lines.extend(islice(f, chunk_rows - len(lines)))
+            if not lines:
+                break
+            yield parse_delimited(lines, delimiter, header)
+            lines = []
+
+def _json_chunks(path: str, chunk_rows: int) -> Iterator[DataTable]:
+    """JSON Lines par blocs ; un fichier .json (tableau) est lu en une fois, dans la limite de VISUALIZATION_JSON_MAX_BYTES"""
+    with open(path, encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() == ".json":
+            size = os.fstat(f.fileno()).st_size
+            if size > VISUALIZATION_JSON_MAX_BYTES:
+                raise ValueError(f"Fichier JSON trop volumineux ({size} octets, maximum {VISUALIZATION_JSON_MAX_BYTES}) : "
+                                 f"le convertir en JSON Lines, CSV ou Parquet, lus par blocs")
+            yield parse_table(json.load(f))
+            return
+        while True:
+            records = [json.loads(line) for line in islice(f, chunk_rows) if line.strip()]
+            if not records:
+                break
+            yield parse_table(records)
+
+def iter_chunks(data: Any, chunk_rows: Optional[int] = None) -> Iterator[DataTable]:
+    """
+    Parcourt les données par blocs de lignes
+
+    Sources acceptées : chemin d'un fichier CSV/TSV/Parquet/JSON(L), DataFrame pandas, table ou lot
+    pyarrow, DataTable, ou toute donnée acceptée par parse_table (texte, JSON, dictionnaire...).
+    """
+    chunk_rows = chunk_rows or VISUALIZATION_CHUNK_ROWS
+    if isinstance(data, DataTable):
+        yield from _table_chunks(data, chunk_rows)
+    elif hasattr(data, "iloc") and hasattr(data, "columns"):
+        yield from _dataframe_chunks(data, chunk_rows)
+    elif hasattr(data, "to_batches"):
+        yield from _arrow_chunks(data.to_batches(max_chunksize=chunk_rows))
+    elif resolve_data_file(data) is not None:
+        path = resolve_data_file(data)
+        extension = os.path.splitext(path)[1].lower()
+        if extension in PARQUET_EXTENSIONS:
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ValueError("pyarrow est requis pour lire les fichiers Parquet (pip install pyarrow)")
+            yield from _arrow_chunks(pq.ParquetFile(path).iter_batches(batch_size=chunk_rows))
+        elif extension in JSON_EXTENSIONS:
+            yield from _json_chunks(path, chunk_rows)
+        else:
+            yield from _delimited_chunks(path, chunk_rows)
+    else:
+        yield from _table_chunks(parse_table(data), chunk_rows)
+
+def _as_kind(values: np.ndarray, kind: str) -> np.ndarray:
+    """Aligne le type d'une colonne sur celui du premier bloc (valeurs non convertibles : NaN/NaT)"""
+    if kind in "if":
+        if values.dtype.kind in "if":
+            return values.astype(np.float64)
+        converted = np.full(len(values), np.nan)
+        for index, value in enumerate(values):
+            try:
+                converted[index] = float(str(value).replace(",", "."))
+            except ValueError:
+                pass
+        return converted
+    if kind == "M":
+        if values.dtype.kind == "M":
+            return values.astype("datetime64[s]")
+        return np.array([np.datetime64(str(v).replace(" ", "T", 1)) if v else np.datetime64("NaT")
+                         for v in values], dtype="datetime64[s]")
+    return values.astype(str).astype(object) if values.dtype.kind != "O" else values
+
+class _ColumnStats:
+    """Statistiques d'une colonne numérique fusionnées bloc par bloc (moyenne et variance de Chan)"""
+
+    def __init__(self):
+        self.count = 0
+        self.missing = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.total = 0.0
+
+    def add(self, values: np.ndarray):
+        valid = values[~np.isnan(values)]
+        self.missing += len(values) - len(valid)
+        if not len(valid):
+            return
+        count, mean = len(valid), float(valid.mean())
+        m2 = float(((valid - mean) ** 2).sum())
+        delta = mean - self.mean
+        combined = self.count + count
+        self.mean += delta * count / combined
+        self.m2 += m2 + delta ** 2 * self.count * count / combined
+        self.count = combined
+        self.minimum = min(self.minimum, float(valid.min()))
+        self.maximum = max(self.maximum, float(valid.max()))
+        self.total += float(valid.sum())
+
+    def as_dict(self) -> Dict[str, float]:
+        empty = self.count == 0
+        return {
+            "count": self.count,
+            "missing": self.missing,
+            "min": float("nan") if empty else self.minimum,
+            "max": float("nan") if empty else self.maximum,
+            "mean": float("nan") if empty else self.mean,
+            "std": float("nan") if empty else (self.m2 / self.count) ** 0.5,
+            "sum": self.total,
+        }
+
+class IngestedData:
+    """Données prêtes à visualiser : table réduite, statistiques sur l'ensemble des lignes et origine"""
+
+    def __init__(self, table: DataTable, summary: Dict[str, Any], source: str):
+        self.table = table
+        self.summary = summary
+        self.source = source
+
+    @property
+    def rows(self) -> int:
+        return self.summary["rows"]
+
+    @property
+    def reduced(self) -> bool:
+        return len(self.table) < self.summary["rows"]
+
+    def describe_for_llm(self, preview_points: int = 12) -> str:
+        """Résumé compact pour le LLM : sa taille ne dépend pas du volume des données"""
+        summary = self.summary
+        lines = [f"Jeu de données: {summary['rows']} lignes, {len(summary['columns'])} colonnes "
+                 f"({self.source})."]
+        for name, column in summary["columns"].items():
+            if column["type"] == "numérique":
+                stats = column["stats"]
+                lines.append(f"- {name} (numérique): min {stats['min']:.4g}, max {stats['max']:.4g}, "
+                             f"moyenne {stats['mean']:.4g}, écart-type {stats['std']:.4g}, "
+                             f"somme {stats['sum']:.4g}, manquantes {stats['missing']}")
+            elif column["type"] == "date":
+                lines.append(f"- {name} (date): du {column['start']} au {column['end']}"
+                             + (f", pas médian {column['step']}" if column.get("step") else ""))
+            else:
+                top = ", ".join(f"{label} ({count})" for label, count in column["top"])
+                distinct = f"{column['distinct']}+" if column["truncated"] else column["distinct"]
+                lines.append(f"- {name} (texte): {distinct} valeurs distinctes; les plus fréquentes: {top}")
+
+        preview = self.table
+        numeric = preview.numeric_columns
+        if numeric and len(preview) > preview_points:
+            x = np.arange(len(preview), dtype=np.float64)
+            keep = lttb(x, preview.columns[numeric[0]], preview_points)
+            preview = DataTable({name: values[keep] for name, values in preview.columns.items()})
+        lines.append(f"Points représentatifs ({len(preview)}):")
+        lines.append(" | ".join(preview.columns))
+        for row in zip(*preview.columns.values()):
+            lines.append(" | ".join(f"{v:.6g}" if isinstance(v, float) else str(v) for v in row))
+        return "\n".join(lines)
+
+class StreamingReducer:
+    """
+    Agrège les données bloc par bloc en mémoire bornée
+
+    Les statistiques portent sur toutes les lignes. La table conservée pour le rendu compte au plus
+    max_points lignes : série sous-échantillonnée par LTTB, ou sommes par libellé quand les
+    données sont catégorielles (sans colonne de dates).
+    """
+
+    def __init__(self, max_points: Optional[int] = None):
+        self.max_points = max_points or VISUALIZATION_MAX_POINTS
+        self.rows = 0
+        self.kinds: Dict[str, str] = {}
+        self.stats: Dict[str, _ColumnStats] = {}
+        self.time_range: Dict[str, Tuple[Any, Any]] = {}
+        self.time_step: Dict[str, Any] = {}
+        self.categories: Dict[str, Dict[str, int]] = {}
+        self.truncated: Dict[str, bool] = {}
+        self.group_column: Optional[str] = None
+        self.groups: Optional[Dict[str, np.ndarray]] = None
+        self.series: List[DataTable] = []
+        self.series_rows = 0
+
+    def add(self, chunk: DataTable):
+        if not self.kinds:
+            self._start(chunk)
+        elif list(chunk.columns) != list(self.kinds):
+            raise ValueError("Les blocs de données n'ont pas les mêmes colonnes")
+        if not len(chunk):
+            return
+
+        columns = {name: _as_kind(chunk.columns[name], kind) for name, kind in self.kinds.items()}
+        offset = self.rows
+        self.rows += len(chunk)
+
+        for name, kind in self.kinds.items():
+            values = columns[name]
+            if kind == "f":
+                self.stats[name].add(values)
+            elif kind == "M":
+                valid = values[~np.isnat(values)]
+                if len(valid):
+                    start, end = self.time_range.get(name, (valid.min(), valid.max()))
+                    self.time_range[name] = (min(start, valid.min()), max(end, valid.max()))
+                    if name not in self.time_step and len(valid) > 1:
+                        self.time_step[name] = np.median(np.diff(valid))
+            elif not self.truncated[name]:
+                labels, counts = np.unique(values.astype(str), return_counts=True)
+                merged = self.categories[name]
+                for label, count in zip(labels.tolist(), counts.tolist()):
+                    merged[label] = merged.get(label, 0) + count
+                if len(merged) > MAX_CATEGORIES:
+                    self.truncated[name] = True
+                    self.categories[name] = dict(sorted(merged.items(), key=lambda item: -item[1])[:10])
+
+        self._add_groups(columns)
+        self._add_series(columns, offset)
+
+    def _start(self, chunk: DataTable):
+        for name, values in chunk.columns.items():
+            kind = "f" if values.dtype.kind in "if" else ("M" if values.dtype.kind == "M" else "O")
+            self.kinds[name] = kind
+            if kind == "f":
+                self.stats[name] = _ColumnStats()
+            elif kind == "O":
+                self.categories[name] = {}
+                self.truncated[name] = False
+        if not self.stats:
+            raise ValueError("Aucune colonne numérique à visualiser dans les données")
+        labels = [name for name, kind in self.kinds.items() if kind == "O"]
+        if labels and "M" not in self.kinds.values():
+            self.group_column = labels[0]
+            self.groups = {}
+
+    def _add_groups(self, columns: Dict[str, np.ndarray]):
+        """Sommes des colonnes numériques par libellé de la première colonne textuelle"""
+        if self.groups is None:
+            return
+        numeric = list(self.stats)
+        labels, first, inverse = np.unique(columns[self.group_column].astype(str), return_index=True,
+                                           return_inverse=True)
+        sums = np.stack([np.bincount(inverse, weights=np.nan_to_num(columns[name]), minlength=len(labels))
+                         for name in numeric], axis=1)
+        # Libellés dans leur ordre d'apparition
+        order = np.argsort(first)
+        for label, row in zip(labels[order].tolist(), sums[order]):
+            if label in self.groups:
+                self.groups[label] += row
+            else:
+                self.groups[label] = row.copy()
+        if len(self.groups) > self.max_points:
+            # Trop de catégories pour un graphique : on revient à la série
+            self.groups = None
+
+    def _add_series(self, columns: Dict[str, np.ndarray], offset: int):
+        """Conserve la série, réduite par LTTB dès qu'elle dépasse max_points lignes"""
+        columns = dict(columns)
+        columns["ligne"] = np.arange(offset, offset + len(next(iter(columns.values()))), dtype=np.float64)
+        if len(columns["ligne"]) > self.max_points:
+            columns = self._reduce(columns)
+        self.series.append(DataTable(columns))
+        self.series_rows += len(columns["ligne"])
+        if self.series_rows > 4 * self.max_points:
+            merged = self._reduce(_concat(self.series))
+            self.series = [DataTable(merged)]
+            self.series_rows = len(merged["ligne"])
+
+    def _reduce(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        times = [name for name, kind in self.kinds.items() if kind == "M"]
+        if times:
+            stamps = columns[times[0]]
+            x = np.where(np.isnat(stamps), np.nan, stamps.astype(np.int64).astype(np.float64))
+        else:
+            x = columns["ligne"]
+        keep = lttb(x, columns[next(iter(self.stats))], self.max_points)
+        return {name: values[keep] for name, values in columns.items()}
+
+    def result(self, source: str) -> IngestedData:
+        if not self.rows:
+            raise ValueError("Aucune donnée fournie")
+
+        if self.groups is not None and self.rows > self.max_points:
+            numeric = list(self.stats)
+            labels = list(self.groups)
+            sums = np.array([self.groups[label] for label in labels]).reshape(len(labels), len(numeric))
+            columns = {self.group_column: np.array(labels, dtype=object)}
+            columns.update({name: sums[:, i] for i, name in enumerate(numeric)})
+            table = DataTable(columns)
+        else:
+            series = _concat(self.series) if self.series else {}
+            numbers = series.pop("ligne", None)
+            if self.rows > len(numbers) and "M" not in self.kinds.values() and self.group_column is None:
+                # Série réduite sans dates : le numéro de ligne d'origine sert d'abscisse
+                series = {"ligne": numbers, **series}
+            table = DataTable(series)
+
+        summary_columns = {}
+        for name, kind in self.kinds.items():
+            if kind == "f":
+                summary_columns[name] = {"type": "numérique", "stats": self.stats[name].as_dict()}
+            elif kind == "M":
+                start, end = self.time_range.get(name, (None, None))
+                step = self.time_step.get(name)
+                summary_columns[name] = {"type": "date", "start": str(start), "end": str(end),
+                                         "step": str(step.astype("timedelta64[s]")) if step is not None else None}
+            else:
+                counts = self.categories[name]
+                top = sorted(counts.items(), key=lambda item: -item[1])[:10]
+                summary_columns[name] = {"type": "texte", "distinct": len(counts), "top": top,
+                                         "truncated": self.truncated[name]}
+        return IngestedData(table, {"rows": self.rows, "columns": summary_columns}, source)
+
+def _concat(tables: List[DataTable]) -> Dict[str, np.ndarray]:
+    names = list(tables[0].columns)
+    return {name: np.concatenate([table.columns[name] for table in tables]) for name in names}
+
+def load_data(data: Any, max_points: Optional[int] = None, chunk_rows: Optional[int] = None) -> IngestedData:
+    """
+    Charge des données à visualiser par blocs et les réduit localement
+
+    Args:
+        data: Chemin de fichier, DataFrame, table pyarrow, DataTable ou données textuelles
+        max_points: Nombre maximal de lignes conservées pour le rendu
+        chunk_rows: Nombre de lignes lues par bloc
+
+    Raises:
+        ValueError: si les données sont illisibles, sans colonne numérique, ou désignent un fichier
+            hors de VISUALIZATION_DATA_DIRS
+    """
+    if is_data_file(data):
+        source = f"fichier {os.path.basename(data.strip())}"
+    elif is_data_path(data):
+        raise ValueError(f"Fichier de données hors des répertoires autorisés (VISUALIZATION_DATA_DIRS): {data.strip()}")
+    elif isinstance(data, str):
+        source = "texte"
+    else:
+        source = type(data).__name__
+
+    reducer = StreamingReducer(max_points)
+    for chunk in iter_chunks(data, chunk_rows):
+        reducer.add(chunk)
+    return reducer.result(source)
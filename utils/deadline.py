@@ -0,0 +1,124 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+class DeadlineExceeded(Exception):
+    """Le budget de temps de la requête est épuisé"""
+
+    def __init__(self, stage: str = ""):
+        self.stage = stage
+        super().__init__(f"Délai dépassé{f' ({stage})' if stage else ''}")
+
+class Cancelled(DeadlineExceeded):
+    """Le résultat n'est plus attendu (réponse spéculative écartée) : le travail s'arrête au prochain point d'annulation"""
+
+    def __init__(self, stage: str = ""):
+        self.stage = stage
+        Exception.__init__(self, f"Travail annulé{f' ({stage})' if stage else ''}")
+
+# Échéance de la requête en cours (time.monotonic), propagée aux threads lancés par call_with_deadline
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+# Signal d'annulation du travail en cours, propagé comme l'échéance
+_CANCEL: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("request_cancel", default=None)
+# Intervalle de vérification du signal d'annulation par un appelant qui attend un thread
+_CANCEL_POLL_SECONDS = 0.05
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """
+    Fixe l'échéance des appels effectués dans ce bloc
+
+    Une échéance déjà active et plus proche est conservée : un sous-appel ne peut
+    pas obtenir plus de temps que la requête qui l'englobe.
+    """
+    deadline = None if seconds is None else time.monotonic() + max(seconds, 0)
+    current = _DEADLINE.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _DEADLINE.set(deadline)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+@contextmanager
+def cancel_scope(event: threading.Event):
+    """
+    Rattache un signal d'annulation aux appels effectués dans ce bloc
+
+    Une fois event positionné, check_deadline (et donc les appels LLM, la recherche et
+    call_with_deadline) lève Cancelled : le travail dont le résultat ne sera pas utilisé
+    s'arrête au prochain point d'annulation au lieu de consommer du quota.
+    """
+    token = _CANCEL.set(event)
+    try:
+        yield event
+    finally:
+        _CANCEL.reset(token)
+
+def is_cancelled() -> bool:
+    event = _CANCEL.get()
+    return event is not None and event.is_set()
+
+def remaining_time() -> Optional[float]:
+    """Temps restant (secondes) avant l'échéance, None si aucune échéance n'est fixée"""
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+def check_deadline(stage: str = ""):
+    """Lève DeadlineExceeded si l'échéance est passée, Cancelled si le travail a été annulé (point d'annulation coopératif)"""
+    if is_cancelled():
+        raise Cancelled(stage)
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(stage)
+
+def call_with_deadline(function: Callable, *args: Any, stage: str = "", timeout: Optional[float] = None,
+                       **kwargs: Any) -> Any:
+    """
+    Exécute function en lui accordant au plus le temps restant (et au plus timeout secondes)
+
+    L'appel tourne dans un thread dédié qui hérite de l'échéance : s'il dépasse son budget,
+    l'appelant reçoit DeadlineExceeded immédiatement et le thread abandonné s'arrête au
+    prochain check_deadline ou au délai réseau de son client.
+
+    Raises:
+        DeadlineExceeded: si le budget est épuisé avant ou pendant l'appel
+        Cancelled: si le travail est annulé (cancel_scope) avant ou pendant l'appel
+    """
+    check_deadline(stage)
+    remaining = remaining_time()
+    if timeout is not None:
+        remaining = timeout if remaining is None else min(remaining, timeout)
+    if remaining is None:
+        return function(*args, **kwargs)
+    if remaining <= 0:
+        raise DeadlineExceeded(stage)
+
+    outcome = {}
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            with deadline_scope(remaining):
+                outcome["result"] = function(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    # Un thread par appel plutôt qu'un pool : les appels imbriqués ne peuvent pas s'interbloquer
+    worker = threading.Thread(target=context.run, args=(run,), name=f"deadline-{stage or 'call'}", daemon=True)
+    worker.start()
+    end = time.monotonic() + remaining
+    while worker.is_alive() and time.monotonic() < end:
+        if is_cancelled():
+            raise Cancelled(stage)
+        worker.join(min(_CANCEL_POLL_SECONDS, max(end - time.monotonic(), 0)))
+    if worker.is_alive():
+        raise DeadlineExceeded(stage)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
@@ -1,38 +1,44 @@
 import os
 import uuid
-import shutil
 import json
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import List, Dict, Optional
-
-# Mise à jour des imports pour supporter plus de formats
-from langchain_community.document_loaders import (
-    PyPDFLoader, 
-    TextLoader, 
-    Docx2txtLoader,
-    UnstructuredPowerPointLoader,
-    UnstructuredWordDocumentLoader
-)
-
-# Ajouter l'import du convertisseur PPT personnalisé
-from utils.ppt_converter import PPTXTextLoader
+from typing import List, Dict, Optional, Set, Tuple, Union, TYPE_CHECKING
 
-# Reste des imports
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_openai import AzureOpenAIEmbeddings
-from langchain.vectorstores.base import VectorStore
-from langchain.schema import Document
+# Les loaders LangChain, le découpage, les embeddings Azure et les bases vectorielles sont
+# importés dans les fonctions qui les utilisent : lire l'index des documents (--list, API)
+# ne charge ni Chroma, ni langchain_community, ni unstructured.
+from utils.extraction_cache import CachedLoader
+from utils.blob_store import store_file, release_file
+from utils.indexing_queue import (
+    INDEX_PENDING, INDEX_DONE, INDEX_FAILED, PRIORITY_INTERACTIVE, get_indexing_queue, normalize_index_status
+)
 from pydantic import BaseModel
-from config import VECTOR_DB_PATH, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_API_VERSION
+from utils.deadline import call_with_deadline, check_deadline
+from utils.tracing import trace_span
+from config import (UPLOAD_STORAGE_MODE, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_API_VERSION,
+                    NEAR_DUPLICATE_DETECTION, VECTORSTORE_LOCK_PATH)
+
+if TYPE_CHECKING:
+    from langchain_core.vectorstores import VectorStore
 
-# Définir le chemin de stockage des documents
+# Définir le chemin de stockage des documents (les répertoires sont créés à la première écriture)
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
 DOCUMENT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "document_index.json")
 
-# Créer les répertoires s'ils n'existent pas
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+# Protège les lectures/écritures de l'index JSON et de la base vectorielle
+# (workers d'indexation concurrents, activation d'une génération d'index)
+_DOCUMENT_INDEX_LOCK = threading.RLock()
+_VECTORSTORE_WRITE_LOCK = threading.RLock()
+# Profondeur de vectorstore_write_lock() dans ce processus (le verrou fcntl n'est pris qu'une fois)
+_VECTORSTORE_LOCK_DEPTH = 0
+_VECTORSTORE_LOCK_FILE = None
+
+# Documents renvoyés par les recherches de la requête en cours (provenance des réponses).
+# Le contexte est copié dans les threads des agents : l'ensemble collecté est partagé.
+_RETRIEVED_DOCUMENTS: ContextVar[Optional[Set[str]]] = ContextVar("retrieved_documents", default=None)
 
 class DocumentMetadata(BaseModel):
     id: str
@@ -42,41 +48,83 @@ class DocumentMetadata(BaseModel):
     description: str
     upload_date: str
     file_path: str
-    vector_index: Optional[bool] = False
+    # Empreinte SHA-256 du contenu (stockage dédupliqué des uploads)
+    content_hash: Optional[str] = None
+    # État d'indexation : pending, indexing, done ou failed (booléen dans les anciens index)
+    vector_index: Optional[Union[bool, str]] = INDEX_PENDING
+
+# Version de chaque loader : à incrémenter lorsque l'extraction change,
+# afin d'invalider le cache de texte extrait
+LOADER_VERSIONS = {
+    '.pdf': 'PyPDFLoader-1',
+    '.txt': 'TextLoader-1',
+    '.docx': 'Docx2txtLoader-1',
+    '.doc': 'UnstructuredWordDocumentLoader-1',
+    '.pptx': 'PPTXTextLoader-2',
+    '.ppt': 'PPTXTextLoader-2',
+}
 
-def get_document_loader(file_path: str):
-    """Retourne le loader approprié en fonction du type de fichier"""
+def get_document_loader(file_path: str, use_cache: bool = True):
+    """Retourne le loader approprié en fonction du type de fichier
+    
+    Par défaut, le loader est enveloppé par le cache de texte extrait : un fichier
+    déjà extrait par la même version de loader n'est pas analysé à nouveau.
+    """
     extension = os.path.splitext(file_path)[1].lower()
     
     try:
+        from langchain_community.document_loaders import (
+            PyPDFLoader,
+            TextLoader,
+            Docx2txtLoader,
+            UnstructuredWordDocumentLoader
+        )
+        # Loader personnalisé pour PowerPoint (au lieu de UnstructuredPowerPointLoader)
+        from utils.ppt_converter import PPTXTextLoader
+        
         if extension == '.pdf':
-            return PyPDFLoader(file_path)
+            loader = PyPDFLoader(file_path)
         elif extension == '.txt':
-            return TextLoader(file_path)
+            loader = TextLoader(file_path)
         elif extension == '.docx':
-            return Docx2txtLoader(file_path)
+            loader = Docx2txtLoader(file_path)
         elif extension == '.doc':
             # Nécessite unstructured[doc]
-            return UnstructuredWordDocumentLoader(file_path)
+            loader = UnstructuredWordDocumentLoader(file_path)
         elif extension in ['.pptx', '.ppt']:
             # Utiliser notre loader personnalisé au lieu de UnstructuredPowerPointLoader
-            return PPTXTextLoader(file_path)
+            loader = PPTXTextLoader(file_path)
         else:
             raise ValueError(f"Format de fichier non supporté: {extension}")
     except Exception as e:
         raise ValueError(f"Erreur lors du chargement du fichier {extension}: {str(e)}")
+    
+    if not use_cache:
+        return loader
+    return CachedLoader(loader, file_path, LOADER_VERSIONS[extension])
 
-def process_document(file_path: str, title: str, document_type: str, description: str) -> DocumentMetadata:
-    """Traite un document pour l'extraction et l'indexation"""
+def process_document(file_path: str, title: str, document_type: str, description: str,
+                     priority: int = PRIORITY_INTERACTIVE, asynchronous: bool = True,
+                     storage_mode: Optional[str] = None) -> DocumentMetadata:
+    """Traite un document pour l'extraction et l'indexation
+    
+    Par défaut, l'indexation est confiée à la file d'indexation en arrière-plan et la
+    fonction retourne immédiatement ; l'avancement est visible dans vector_index.
+    
+    Args:
+        priority: Priorité du travail d'indexation (PRIORITY_INTERACTIVE ou PRIORITY_BULK)
+        asynchronous: False pour indexer directement dans l'appel
+        storage_mode: Mode de stockage du fichier ('link', 'copy' ou 'reference'),
+            UPLOAD_STORAGE_MODE par défaut
+    """
     # Générer un ID unique
     doc_id = str(uuid.uuid4())
     
     # Créer les métadonnées du document
     filename = os.path.basename(file_path)
-    dest_path = os.path.join(UPLOAD_DIR, f"{doc_id}_{filename}")
     
-    # Copier le fichier vers le répertoire des uploads
-    shutil.copy2(file_path, dest_path)
+    # Stocker le fichier dans les uploads (dédupliqué par contenu, sans copie si possible)
+    dest_path, content_hash = store_file(file_path, mode=storage_mode or UPLOAD_STORAGE_MODE)
     
     # Créer l'objet de métadonnées
     doc_meta = DocumentMetadata(
@@ -87,107 +135,130 @@ def process_document(file_path: str, title: str, document_type: str, description
         description=description,
         upload_date=datetime.now().isoformat(),
         file_path=dest_path,
-        vector_index=False
+        content_hash=content_hash,
+        vector_index=INDEX_PENDING
     )
     
     # Enregistrer dans l'index
     save_document_metadata(doc_meta)
     
-    # Indexer le document (en mode asynchrone dans un cas réel)
-    try:
-        index_document(doc_meta)
-    except Exception as e:
-        print(f"Erreur lors de l'indexation du document {doc_id}: {str(e)}")
+    if asynchronous:
+        get_indexing_queue().enqueue(doc_id, priority=priority)
+    elif not index_document(doc_meta):
+        doc_meta.vector_index = INDEX_FAILED
+        save_document_metadata(doc_meta)
     
     return doc_meta
 
-def index_document(doc_meta: DocumentMetadata) -> bool:
-    """Indexe le document dans la base vectorielle"""
+def index_document(doc_meta: DocumentMetadata, raise_errors: bool = False) -> bool:
+    """Indexe le document dans la base vectorielle
+    
+    Args:
+        raise_errors: Propager les exceptions au lieu de retourner False
+            (utilisé par la file d'indexation pour gérer les nouvelles tentatives)
+    """
     try:
-        # Charger le document
-        loader = get_document_loader(doc_meta.file_path)
-        documents = loader.load()
-        
-        # Découper le document en chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        chunked_documents = text_splitter.split_documents(documents)
-        
-        # Ajouter des métadonnées aux chunks
-        for chunk in chunked_documents:
-            chunk.metadata.update({
-                "doc_id": doc_meta.id,
-                "title": doc_meta.title,
-                "document_type": doc_meta.document_type,
-                "description": doc_meta.description
-            })
-        
-        # Créer ou mettre à jour l'index vectoriel
-        embeddings = AzureOpenAIEmbeddings(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            azure_deployment="text-embedding-ada-002",
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_API_VERSION
-        )
-        
-        # Vérifier si l'index vectoriel existe déjà
-        if os.path.exists(os.path.join(VECTOR_DB_PATH, "chroma.sqlite3")):
-            # Ajouter à l'index existant
-            vectordb = Chroma(persist_directory=VECTOR_DB_PATH, embedding_function=embeddings)
-            vectordb.add_documents(chunked_documents)
-        else:
-            # Créer un nouvel index
-            vectordb = Chroma.from_documents(
-                documents=chunked_documents, 
-                embedding=embeddings,
-                persist_directory=VECTOR_DB_PATH
-            )
+        with trace_span("index_document", doc_id=doc_meta.id, document_type=doc_meta.document_type) as span:
+            documents, chunked_documents = split_document(doc_meta)
+            if span is not None:
+                span.set_attribute("chunks", len(chunked_documents))
+            
+            # Créer ou mettre à jour l'index vectoriel
+            embeddings = create_embeddings()
+            
+            from utils.vectorstores import create_vectorstore
+            with trace_span("index_document.store"), vectorstore_write_lock():
+                vectordb = create_vectorstore(embeddings)
+                store_chunks(vectordb, doc_meta, chunked_documents, span)
+            
+            # Résumé du document pour la recherche hiérarchique (non bloquant : le document
+            # reste candidat tant qu'il n'a pas de résumé)
+            with trace_span("index_document.summary"):
+                try:
+                    from utils.hierarchical_search import index_document_summary
+                    index_document_summary(doc_meta, documents)
+                except Exception as e:
+                    print(f"Erreur lors du résumé du document: {str(e)}")
         
         # REMARQUE : La méthode persist() n'est plus nécessaire dans les versions récentes
         # de langchain_chroma. Les modifications sont automatiquement sauvegardées.
         # Ne pas utiliser vectordb.persist() qui provoque l'erreur
         
         # Mettre à jour le statut d'indexation dans les métadonnées
-        doc_meta.vector_index = True
+        doc_meta.vector_index = INDEX_DONE
         save_document_metadata(doc_meta)
         
         return True
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Erreur d'indexation: {str(e)}")
         return False
 
-def save_document_metadata(doc_meta: DocumentMetadata):
-    """Sauvegarde ou met à jour les métadonnées du document dans l'index"""
-    documents = []
+def split_document(doc_meta: DocumentMetadata) -> Tuple[List, List]:
+    """Charge le document et le découpe en chunks portant ses métadonnées
     
-    # Charger l'index existant s'il existe
-    if os.path.exists(DOCUMENT_INDEX_PATH):
-        with open(DOCUMENT_INDEX_PATH, 'r', encoding='utf-8') as f:
-            try:
-                documents = json.load(f)
-            except json.JSONDecodeError:
-                documents = []
-    
-    # Vérifier si le document existe déjà dans l'index
-    updated = False
-    for i, doc in enumerate(documents):
-        if doc.get('id') == doc_meta.id:
-            documents[i] = doc_meta.dict()
-            updated = True
-            break
-    
-    # Sinon, ajouter le nouveau document
-    if not updated:
-        documents.append(doc_meta.dict())
-    
-    # Sauvegarder l'index
-    with open(DOCUMENT_INDEX_PATH, 'w', encoding='utf-8') as f:
-        json.dump(documents, f, ensure_ascii=False, indent=2)
+    Returns:
+        (pages, chunks)
+    """
+    # Charger le document (cache de texte extrait)
+    with trace_span("index_document.load"):
+        loader = get_document_loader(doc_meta.file_path)
+        documents = loader.load()
+    
+    # Découper le document en chunks
+    with trace_span("index_document.split"):
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+        chunked_documents = text_splitter.split_documents(documents)
+    
+    # Ajouter des métadonnées aux chunks
+    for chunk in chunked_documents:
+        chunk.metadata.update({
+            "doc_id": doc_meta.id,
+            "title": doc_meta.title,
+            "document_type": doc_meta.document_type,
+            "description": doc_meta.description
+        })
+    return documents, chunked_documents
 
-def get_all_documents() -> List[Dict]:
-    """Récupère tous les documents de l'index"""
+def store_chunks(vectordb: "VectorStore", doc_meta: DocumentMetadata, chunks: List, span=None):
+    """Ajoute les chunks d'un document à la base vectorielle (sans les quasi-doublons si activé)"""
+    if NEAR_DUPLICATE_DETECTION:
+        _add_deduplicated_chunks(vectordb, doc_meta, chunks, span)
+    else:
+        for chunk in chunks:
+            chunk.metadata["chunk_id"] = f"{doc_meta.id}:{uuid.uuid4().hex[:12]}"
+        vectordb.add_documents(chunks, ids=[chunk.metadata["chunk_id"] for chunk in chunks])
+
+def _add_deduplicated_chunks(vectordb: "VectorStore", doc_meta: DocumentMetadata, chunks: List, span=None):
+    """
+    Ajoute à la base vectorielle les seuls chunks qui ne sont pas des quasi-doublons d'un chunk déjà indexé
+
+    Les doublons ne sont pas vectorisés : ils sont enregistrés comme sources supplémentaires du chunk
+    existant (voir utils/near_duplicates.py). Appelé sous vectorstore_write_lock().
+    """
+    from utils.near_duplicates import get_near_duplicate_index
+    
+    duplicates = get_near_duplicate_index()
+    plan = duplicates.plan(doc_meta.id, [chunk.page_content for chunk in chunks])
+    new_chunks = []
+    for position in plan.new:
+        chunks[position].metadata["chunk_id"] = plan.chunk_ids[position]
+        new_chunks.append(chunks[position])
+    if new_chunks:
+        vectordb.add_documents(new_chunks, ids=[chunk.metadata["chunk_id"] for chunk in new_chunks])
+    duplicates.commit(plan, doc_meta.title, [chunk.metadata.get("page") for chunk in chunks])
+    
+    if span is not None:
+        span.set_attribute("embedded_chunks", len(new_chunks))
+        span.set_attribute("embeddings_avoided", plan.embeddings_avoided)
+
+def _read_document_index() -> List[Dict]:
+    """Lit l'index JSON des documents"""
     if not os.path.exists(DOCUMENT_INDEX_PATH):
         return []
     
@@ -197,6 +268,44 @@ def get_all_documents() -> List[Dict]:
         except json.JSONDecodeError:
             return []
 
+def _write_document_index(documents: List[Dict]):
+    """Écrit l'index JSON des documents (remplacement atomique du fichier)"""
+    tmp_path = f"{DOCUMENT_INDEX_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(documents, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, DOCUMENT_INDEX_PATH)
+
+def save_document_metadata(doc_meta: DocumentMetadata):
+    """Sauvegarde ou met à jour les métadonnées du document dans l'index"""
+    with _DOCUMENT_INDEX_LOCK:
+        # Charger l'index existant s'il existe
+        documents = _read_document_index()
+        
+        # Vérifier si le document existe déjà dans l'index
+        updated = False
+        for i, doc in enumerate(documents):
+            if doc.get('id') == doc_meta.id:
+                documents[i] = doc_meta.dict()
+                updated = True
+                break
+        
+        # Sinon, ajouter le nouveau document
+        if not updated:
+            documents.append(doc_meta.dict())
+        
+        # Sauvegarder l'index
+        _write_document_index(documents)
+
+def get_all_documents() -> List[Dict]:
+    """Récupère tous les documents de l'index"""
+    with _DOCUMENT_INDEX_LOCK:
+        documents = _read_document_index()
+    
+    # Les anciens index stockent un booléen au lieu de l'état d'indexation
+    for doc in documents:
+        doc['vector_index'] = normalize_index_status(doc.get('vector_index'))
+    return documents
+
 def get_document_by_id(doc_id: str) -> Optional[Dict]:
     """Récupère un document par son ID"""
     documents = get_all_documents()
@@ -205,69 +314,286 @@ def get_document_by_id(doc_id: str) -> Optional[Dict]:
             return doc
     return None
 
+def remove_document_vectors(doc_id: str):
+    """
+    Retire un document de l'index hiérarchique et ses chunks de la base vectorielle
+
+    Les chunks dédupliqués encore présents dans d'autres documents restent indexés ; les chunks
+    indexés sans détection des quasi-doublons sont retrouvés par leur doc_id.
+    """
+    from utils.hierarchical_search import remove_document_summary
+    from utils.near_duplicates import near_duplicate_path
+    from utils.vectorstores import create_vectorstore
+    
+    remove_document_summary(doc_id)
+    with vectorstore_write_lock():
+        vectordb = create_vectorstore(create_embeddings())
+        shared: Set[str] = set()
+        if os.path.exists(near_duplicate_path()):
+            # Retirer les chunks qui n'appartiennent plus à aucun document
+            from utils.near_duplicates import get_near_duplicate_index
+            duplicates = get_near_duplicate_index()
+            orphans = duplicates.remove_document(doc_id)
+            if orphans:
+                vectordb.delete(ids=orphans)
+            shared = duplicates.owned_chunks(doc_id)
+        stale = [vector_id for vector_id in vectordb.get(where={"doc_id": doc_id})["ids"] if vector_id not in shared]
+        if stale:
+            vectordb.delete(ids=stale)
+
+@contextmanager
+def vectorstore_write_lock():
+    """
+    Verrou des écritures dans la base vectorielle servie, entre threads et entre processus
+
+    Réentrant dans un même thread. Le verrou fcntl sur VECTORSTORE_LOCK_PATH exclut les écritures
+    des autres processus (file d'indexation, surveillance de dossiers) pendant l'activation d'une
+    génération d'index ; sans fcntl (Windows), seul le verrou de thread est pris.
+    """
+    global _VECTORSTORE_LOCK_DEPTH, _VECTORSTORE_LOCK_FILE
+    with _VECTORSTORE_WRITE_LOCK:
+        if _VECTORSTORE_LOCK_DEPTH == 0:
+            try:
+                import fcntl
+            except ImportError:
+                fcntl = None
+            if fcntl is not None:
+                os.makedirs(os.path.dirname(VECTORSTORE_LOCK_PATH) or ".", exist_ok=True)
+                lock_file = open(VECTORSTORE_LOCK_PATH, "a")
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                except OSError:
+                    lock_file.close()
+                    raise
+                _VECTORSTORE_LOCK_FILE = lock_file
+        _VECTORSTORE_LOCK_DEPTH += 1
+        try:
+            yield
+        finally:
+            _VECTORSTORE_LOCK_DEPTH -= 1
+            if _VECTORSTORE_LOCK_DEPTH == 0 and _VECTORSTORE_LOCK_FILE is not None:
+                # Fermer le fichier libère le verrou fcntl
+                _VECTORSTORE_LOCK_FILE.close()
+                _VECTORSTORE_LOCK_FILE = None
+
 def delete_document(doc_id: str) -> bool:
     """Supprime un document de l'index et du système de fichiers"""
     doc = get_document_by_id(doc_id)
     if not doc:
         return False
     
-    # Supprimer le fichier
     file_path = doc.get('file_path')
-    if file_path and os.path.exists(file_path):
-        os.remove(file_path)
-    
-    # Supprimer de l'index
-    documents = get_all_documents()
-    documents = [d for d in documents if d.get('id') != doc_id]
     
-    with open(DOCUMENT_INDEX_PATH, 'w', encoding='utf-8') as f:
-        json.dump(documents, f, ensure_ascii=False, indent=2)
+    with _DOCUMENT_INDEX_LOCK:
+        # Supprimer de l'index
+        documents = _read_document_index()
+        documents = [d for d in documents if d.get('id') != doc_id]
+        _write_document_index(documents)
+        
+        # Supprimer le fichier, sauf s'il est partagé avec un autre document
+        if file_path:
+            still_referenced = any(d.get('file_path') == file_path for d in documents)
+            if doc.get('content_hash'):
+                release_file(file_path, still_referenced)
+            elif not still_referenced and os.path.exists(file_path):
+                # Ancien upload copié sous un nom préfixé par l'ID
+                os.remove(file_path)
     
-    # Note: Pour une application complète, il faudrait également supprimer les chunks 
-    # correspondants de la base vectorielle, ce qui est plus complexe
+    remove_document_vectors(doc_id)
     
     return True
 
-def get_vectorstore() -> VectorStore:
-    """Récupère la base vectorielle pour la recherche"""
+_FINGERPRINT_CACHE: Dict[str, object] = {"mtime": None, "fingerprints": {}}
+
+def document_fingerprints() -> Dict[str, str]:
+    """
+    Empreinte de chaque document indexé (hash du contenu, ou date d'upload pour les anciens index)
+
+    Relue uniquement lorsque l'index JSON a changé sur le disque.
+    """
     try:
-        # Configurer correctement les embeddings Azure OpenAI avec les bonnes signatures de méthode
-        embeddings = AzureOpenAIEmbeddings(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            azure_deployment="text-embedding-ada-002",  # Nom du déploiement dans Azure
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_API_VERSION
-        )
-        
-        # Vérifier si la base vectorielle existe
-        if os.path.exists(os.path.join(VECTOR_DB_PATH, "chroma.sqlite3")):
-            return Chroma(persist_directory=VECTOR_DB_PATH, embedding_function=embeddings)
-        else:
-            # Retourne une base vide si elle n'existe pas encore
-            return Chroma(embedding_function=embeddings, persist_directory=VECTOR_DB_PATH)
-    except Exception as e:
-        print(f"Erreur lors de l'initialisation du vectorstore: {str(e)}")
-        # Créer une fonction simulant un vectorstore vide
-        class DummyVectorstore:
-            def similarity_search_with_score(self, *args, **kwargs):
-                return []
-        return DummyVectorstore()
+        stat = os.stat(DOCUMENT_INDEX_PATH)
+    except OSError:
+        return {}
+    mtime = (stat.st_mtime_ns, stat.st_size)
+    with _DOCUMENT_INDEX_LOCK:
+        if _FINGERPRINT_CACHE["mtime"] != mtime:
+            _FINGERPRINT_CACHE["fingerprints"] = {
+                doc["id"]: doc.get("content_hash") or doc.get("upload_date", "")
+                for doc in _read_document_index() if doc.get("id")
+            }
+            _FINGERPRINT_CACHE["mtime"] = mtime
+        return dict(_FINGERPRINT_CACHE["fingerprints"])
+
+@contextmanager
+def retrieval_scope():
+    """
+    Collecte les identifiants des documents renvoyés par les recherches effectuées dans le bloc,
+    y compris depuis les threads des agents
+
+    Exemple:
+        with retrieval_scope() as retrieved:
+            answer = run_agent_workflow(query)
+        # retrieved contient les doc_id utilisés pour répondre
+    """
+    token = _RETRIEVED_DOCUMENTS.set(set())
+    try:
+        yield _RETRIEVED_DOCUMENTS.get()
+    finally:
+        _RETRIEVED_DOCUMENTS.reset(token)
+
+def record_retrieval(results: List[Dict]):
+    """Note les documents des résultats mis en forme (format_search_results) dans le retrieval_scope en cours"""
+    retrieved = _RETRIEVED_DOCUMENTS.get()
+    if retrieved is not None:
+        retrieved.update(result["metadata"]["doc_id"] for result in results if result["metadata"].get("doc_id"))
+
+def _live_owner_metadata(metadata: Dict, chunk_sources: List[Dict]) -> Dict:
+    """
+    Métadonnées d'un chunk dédupliqué dont le document propriétaire a été supprimé
+
+    Le vecteur garde l'identifiant et le titre du premier document où le chunk a été vu :
+    ils sont remplacés par ceux d'un document source encore indexé.
+    """
+    live = chunk_sources[0]
+    document = get_document_by_id(live["doc_id"]) or {}
+    return {
+        **metadata,
+        "doc_id": live["doc_id"],
+        "title": live["title"],
+        "page": live["page"],
+        "document_type": document.get("document_type", metadata.get("document_type")),
+        "description": document.get("description", metadata.get("description"))
+    }
+
+def format_search_results(results: List) -> List[Dict]:
+    """
+    Met en forme les paires (document, score) d'une recherche
+
+    Un chunk présent (quasi à l'identique) dans plusieurs documents n'est indexé qu'une fois :
+    la liste de ses documents sources est ajoutée sous la clé "sources", et le résultat est
+    attribué à un document source encore indexé.
+    """
+    formatted_results = [
+        {
+            "content": doc.page_content,
+            "metadata": doc.metadata,
+            "score": float(score)
+        }
+        for doc, score in results
+    ]
+    chunk_ids = [result["metadata"]["chunk_id"] for result in formatted_results if "chunk_id" in result["metadata"]]
+    from utils.near_duplicates import near_duplicate_path
+    if chunk_ids and os.path.exists(near_duplicate_path()):
+        from utils.near_duplicates import get_near_duplicate_index
+        sources = get_near_duplicate_index().sources(chunk_ids)
+        for result in formatted_results:
+            chunk_sources = sources.get(result["metadata"].get("chunk_id"), [])
+            if chunk_sources and not any(source["doc_id"] == result["metadata"].get("doc_id")
+                                         for source in chunk_sources):
+                result["metadata"] = _live_owner_metadata(result["metadata"], chunk_sources)
+            if len(chunk_sources) > 1:
+                result["sources"] = chunk_sources
+    return formatted_results
+
+def create_embeddings():
+    """Embeddings Azure soumis au limiteur de quota partagé du déploiement d'embeddings"""
+    from langchain_openai import AzureOpenAIEmbeddings
+    from utils.rate_limiter import RateLimitedEmbeddings
+    
+    deployment = "text-embedding-ada-002"  # Nom du déploiement dans Azure
+    embeddings = AzureOpenAIEmbeddings(
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        azure_deployment=deployment,
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version=AZURE_API_VERSION
+    )
+    return RateLimitedEmbeddings(embeddings, f"{AZURE_OPENAI_ENDPOINT}#{deployment}", deployment,
+                                 chunk_size=embeddings.chunk_size)
+
+def get_vectorstore() -> "VectorStore":
+    """Récupère la base vectorielle pour la recherche (backend choisi par VECTOR_BACKEND)"""
+    from utils.vectorstores import create_vectorstore
+    
+    # Configurer correctement les embeddings Azure OpenAI avec les bonnes signatures de méthode
+    embeddings = create_embeddings()
+    
+    return create_vectorstore(embeddings)
 
 def search_documents(query: str, limit: int = 5) -> List[Dict]:
     """Recherche des documents pertinents pour une requête"""
     try:
-        vectorstore = get_vectorstore()
-        results = vectorstore.similarity_search_with_score(query, k=limit)
-        
-        formatted_results = []
-        for doc, score in results:
-            formatted_results.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "score": float(score)
-            })
+        # Respecter l'échéance de la requête en cours : sans contexte documentaire plutôt qu'en retard
+        check_deadline("recherche documentaire")
+        with trace_span("search_documents", limit=limit) as span:
+            vectorstore = get_vectorstore()
+            results = call_with_deadline(vectorstore.similarity_search_with_score, query, k=limit,
+                                         stage="recherche documentaire")
+            if span is not None:
+                span.set_attribute("results", len(results))
+        formatted_results = format_search_results(results)
+        record_retrieval(formatted_results)
         
         return formatted_results
     except Exception as e:
         print(f"Erreur lors de la recherche de documents: {str(e)}")
-        return []
\ No newline at end of file
+        return []
+
+def _search_by_vectors(vectorstore: "VectorStore", query_embeddings: List[List[float]], limit: int) -> List[List]:
+    """Recherche groupée par vecteurs, avec la méthode la plus efficace offerte par le backend"""
+    if hasattr(vectorstore, "similarity_search_with_score_by_vectors"):
+        return vectorstore.similarity_search_with_score_by_vectors(query_embeddings, k=limit)
+    
+    if hasattr(vectorstore, "_collection"):
+        from langchain_core.documents import Document
+        
+        # Chroma : une seule requête pour tous les vecteurs
+        response = vectorstore._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=limit,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [(Document(page_content=text, metadata=metadata or {}), distance)
+             for text, metadata, distance in zip(texts, metadatas, distances)]
+            for texts, metadatas, distances in zip(
+                response["documents"], response["metadatas"], response["distances"]
+            )
+        ]
+    
+    return [vectorstore.similarity_search_with_score_by_vector(e, k=limit) for e in query_embeddings]
+
+def search_documents_batch(queries: List[str], limit: int = 5, batch_size: int = 256) -> List[List[Dict]]:
+    """Recherche des documents pertinents pour plusieurs requêtes
+    
+    Les requêtes sont vectorisées par lots (une requête d'embeddings par lot au lieu
+    d'une par question) puis recherchées ensemble dans la base vectorielle.
+    
+    Returns:
+        Une liste de résultats par requête, dans l'ordre des requêtes et au même
+        format que search_documents
+    """
+    if not queries:
+        return []
+    
+    try:
+        vectorstore = get_vectorstore()
+        
+        all_results = []
+        with trace_span("search_documents_batch", queries=len(queries), limit=limit):
+            for start in range(0, len(queries), batch_size):
+                batch = queries[start:start + batch_size]
+                query_embeddings = call_with_deadline(vectorstore.embeddings.embed_documents, batch,
+                                                      stage="recherche documentaire")
+                with trace_span("vector_search", queries=len(batch)):
+                    batch_results = call_with_deadline(_search_by_vectors, vectorstore, query_embeddings, limit,
+                                                       stage="recherche documentaire")
+                for results in batch_results:
+                    formatted_results = format_search_results(results)
+                    record_retrieval(formatted_results)
+                    all_results.append(formatted_results)
+        
+        return all_results
+    except Exception as e:
+        print(f"Erreur lors de la recherche groupée de documents: {str(e)}")
+        return [[] for _ in queries]
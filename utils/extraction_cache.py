@@ -0,0 +1,100 @@
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+from typing import List, Optional
+
+from utils.tracing import record_cache
+from config import EXTRACTION_CACHE_DIR
+
+def compute_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Calcule l'empreinte SHA-256 du contenu d'un fichier"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+class ExtractionCache:
+    """
+    Cache persistant du texte extrait des documents
+
+    Chaque entrée est un fichier JSON compressé (gzip) dont le nom dépend du hash
+    du contenu du fichier source et de la version du loader utilisé. Un changement
+    de loader invalide donc automatiquement les entrées correspondantes.
+    """
+
+    def __init__(self, cache_dir: str = EXTRACTION_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _entry_path(self, file_hash: str, loader_version: str) -> str:
+        key = hashlib.sha256(f"{file_hash}:{loader_version}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def get(self, file_hash: str, loader_version: str) -> Optional[List[dict]]:
+        """Retourne les pages extraites en cache, ou None si absentes"""
+        entry_path = self._entry_path(file_hash, loader_version)
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with gzip.open(entry_path, 'rt', encoding='utf-8') as f:
+                return json.load(f)["pages"]
+        except (OSError, ValueError, KeyError):
+            # Entrée corrompue : on l'ignore, elle sera réécrite
+            return None
+
+    def put(self, file_hash: str, loader_version: str, pages: List[dict]):
+        """Enregistre les pages extraites (écriture atomique)"""
+        entry_path = self._entry_path(file_hash, loader_version)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump({"loader_version": loader_version, "pages": pages}, f, ensure_ascii=False)
+            os.replace(tmp_path, entry_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+class CachedLoader:
+    """Enveloppe un loader LangChain et met en cache le résultat de load()"""
+
+    def __init__(self, loader, file_path: str, loader_version: str, cache: Optional[ExtractionCache] = None):
+        self.loader = loader
+        self.file_path = file_path
+        self.loader_version = loader_version
+        self.cache = cache or ExtractionCache()
+
+    def load(self):
+        from langchain.schema import Document
+
+        file_hash = compute_file_hash(self.file_path)
+        pages = self.cache.get(file_hash, self.loader_version)
+        record_cache(pages is not None)
+
+        if pages is not None:
+            documents = []
+            for page in pages:
+                metadata = dict(page["metadata"])
+                # Le même contenu peut provenir d'un autre chemin
+                metadata["source"] = self.file_path
+                documents.append(Document(page_content=page["page_content"], metadata=metadata))
+            return documents
+
+        documents = self.loader.load()
+        if not any(doc.page_content.strip() for doc in documents):
+            # Extraction vide (échec silencieux du loader, outil de conversion absent...) : ne pas la
+            # figer dans le cache, une nouvelle tentative doit relancer l'extraction
+            return documents
+        try:
+            self.cache.put(file_hash, self.loader_version, [
+                {"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents
+            ])
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Impossible de mettre en cache l'extraction de {self.file_path}: {str(e)}")
+
+        return documents
@@ -0,0 +1,165 @@
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+# Routes de l'API Azure OpenAI : /openai/deployments/<déploiement>/<chat/completions|embeddings>
+_ROUTE = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/(?P<operation>chat/completions|embeddings)")
+
+class FakeOpenAIServer:
+    """
+    Serveur local compatible avec l'API Azure OpenAI, pour les tests hors ligne
+
+    Chaque déploiement répond par défaut avec succès (après default_delay secondes).
+    script(déploiement, ...) programme des réponses successives : code HTTP, en-têtes, délai.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, default_delay: float = 0.0):
+        self.default_delay = default_delay
+        self.requests = Counter()
+        self._scripts = defaultdict(deque)
+        self._failing = {}
+        # Logprob renvoyé pour chaque token quand la requête demande les logprobs, par déploiement
+        self.logprobs = defaultdict(lambda: -0.05)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def script(self, deployment: str, status: int = 200, headers: Optional[Dict[str, str]] = None,
+               delay: float = 0.0, times: int = 1):
+        """Programme les times prochaines réponses du déploiement"""
+        with self._lock:
+            for _ in range(times):
+                self._scripts[deployment].append((status, headers or {}, delay))
+
+    def fail(self, deployment: str, status: Optional[int] = 500, delay: float = 0.0):
+        """Fait échouer (ou ralentir, avec status=200) toutes les réponses du déploiement ; None pour rétablir"""
+        with self._lock:
+            if status is None:
+                self._failing.pop(deployment, None)
+            else:
+                self._failing[deployment] = (status, {}, delay)
+
+    def _next_response(self, deployment: str):
+        with self._lock:
+            self.requests[deployment] += 1
+            if self._scripts[deployment]:
+                return self._scripts[deployment].popleft()
+            if deployment in self._failing:
+                return self._failing[deployment]
+            return 200, {}, self.default_delay
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, payload: Dict, headers: Dict[str, str]):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                match = _ROUTE.match(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not match:
+                    self._send(404, {"error": {"code": "NotFound", "message": self.path}}, {})
+                    return
+
+                deployment = match.group("deployment")
+                status, headers, delay = server._next_response(deployment)
+                if delay:
+                    time.sleep(delay)
+                if status != 200:
+                    self._send(status, {"error": {"code": str(status), "message": f"erreur simulée {status}"}}, headers)
+                elif match.group("operation") == "embeddings":
+                    self._send(200, server.embeddings_response(deployment, request), headers)
+                else:
+                    self._send(200, server.chat_response(deployment, request), headers)
+
+        return Handler
+
+    def chat_response(self, deployment: str, request: Dict) -> Dict:
+        """Réponse de chat déterministe : le déploiement et le début du dernier message"""
+        messages = request.get("messages") or [{"content": ""}]
+        prompt = str(messages[-1].get("content", ""))
+        content = f"[{deployment}] {prompt[-200:]}"
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in messages)
+        completion_tokens = len(content) // 4
+        choice = {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        if request.get("logprobs"):
+            choice["logprobs"] = {"content": [
+                {"token": token, "logprob": self.logprobs[deployment], "bytes": None, "top_logprobs": []}
+                for token in content.split()
+            ]}
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [choice],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        }
+
+    def embeddings_response(self, deployment: str, request: Dict, dim: int = 1536) -> Dict:
+        """Embeddings déterministes (dérivés du SHA-256 de chaque texte)"""
+        texts = request.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        data = []
+        for index, text in enumerate(texts):
+            digest = hashlib.sha256(str(text).encode("utf-8")).digest()
+            vector = [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(dim)]
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        return {"object": "list", "data": data, "model": deployment,
+                "usage": {"prompt_tokens": len(texts), "total_tokens": len(texts)}}
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serveur local compatible Azure OpenAI (tests hors ligne)')
+    parser.add_argument('--port', type=int, default=8089, help="Port d'écoute")
+    parser.add_argument('--delay', type=float, default=0.0, help='Latence simulée par réponse (secondes)')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(port=args.port, default_delay=args.delay)
+    print(f"Serveur factice à l'écoute sur {server.endpoint} (AZURE_OPENAI_ENDPOINT)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+        sys.exit(0)
@@ -0,0 +1,348 @@
+import os
+import sys
+import time
+import select
+import struct
+import sqlite3
+import argparse
+import threading
+import ctypes
+import ctypes.util
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Ajouter le répertoire parent au path pour l'exécution en ligne de commande
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.import_rice_documents import SUPPORTED_EXTENSIONS, get_document_type
+from config import (WATCH_FOLDERS, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL, WATCH_STATE_PATH,
+                    WATCH_STORAGE_MODE)
+
+# Événements inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+               | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Changements détectés
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+def is_watched_file(path: str) -> bool:
+    """Fichier à indexer (extension prise en charge, hors fichiers cachés et verrous Office '~$')"""
+    name = os.path.basename(path)
+    return not name.startswith((".", "~$")) and Path(name).suffix.lower() in SUPPORTED_EXTENSIONS
+
+def scan_files(root: str) -> Dict[str, Tuple[int, int]]:
+    """Fichiers à indexer sous root, avec (mtime_ns, taille)"""
+    files = {}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if not is_watched_file(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+class _Inotify:
+    """Surveillance inotify d'arborescences (appels directs à la libc, Linux uniquement)"""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify n'est disponible que sous Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 a échoué")
+        self._directories: Dict[int, str] = {}
+
+    def add_tree(self, root: str):
+        """Surveille root et ses sous-dossiers (inotify n'est pas récursif)"""
+        for directory, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                # ENOSPC : limite fs.inotify.max_user_watches atteinte
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch a échoué pour {directory}")
+            self._directories[wd] = directory
+
+    def read(self, timeout: float) -> List[Tuple[str, int]]:
+        """Événements (chemin, masque) reçus dans le délai ; chemin vide pour un débordement de file"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append(("", mask))
+                continue
+            directory = self._directories.get(wd)
+            if mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+            if directory is not None:
+                events.append((os.path.join(directory, os.fsdecode(name)) if name else directory, mask))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+class FolderWatcher:
+    """
+    Ingestion incrémentale des dossiers surveillés
+
+    Les chemins signalés par inotify (ou par le sondage) sont regroupés pendant debounce secondes
+    sans nouvelle modification, puis comparés à l'état persistant (SQLite) des fichiers déjà importés :
+    seuls les fichiers créés, modifiés ou supprimés sont (ré)importés ou retirés de l'index.
+    """
+
+    def __init__(self, folders: List[str], debounce: float = WATCH_DEBOUNCE_SECONDS,
+                 poll_interval: float = WATCH_POLL_INTERVAL, state_path: str = WATCH_STATE_PATH,
+                 storage_mode: str = WATCH_STORAGE_MODE, use_inotify: bool = True):
+        if not folders:
+            raise ValueError("Aucun dossier à surveiller (WATCH_FOLDERS ou --dir)")
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        missing = [folder for folder in self.folders if not os.path.isdir(folder)]
+        if missing:
+            raise ValueError(f"Dossiers introuvables: {', '.join(missing)}")
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.state_path = state_path
+        self.storage_mode = storage_mode
+        self.use_inotify = use_inotify
+        self._stop_event = threading.Event()
+
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.state_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _known(self, conn, path: str) -> Dict[str, sqlite3.Row]:
+        """Fichiers importés au chemin donné ou sous ce chemin"""
+        prefix = path.rstrip(os.sep) + os.sep
+        rows = conn.execute(
+            "SELECT * FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+            (path, prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+        ).fetchall()
+        return {row["path"]: row for row in rows}
+
+    def changes(self, paths: Iterable[str], settle: float = 0.0) -> List[Tuple[str, str]]:
+        """
+        Compare les chemins (fichiers ou dossiers) à l'état des fichiers importés
+
+        Args:
+            settle: Ignorer (pour l'instant) les fichiers modifiés il y a moins de settle secondes
+
+        Returns:
+            Liste de (changement, chemin)
+        """
+        current: Dict[str, Tuple[int, int]] = {}
+        known: Dict[str, sqlite3.Row] = {}
+        with closing(self._connect()) as conn:
+            for path in set(paths):
+                if os.path.isdir(path):
+                    current.update(scan_files(path))
+                elif os.path.isfile(path) and is_watched_file(path):
+                    stat = os.stat(path)
+                    current[path] = (stat.st_mtime_ns, stat.st_size)
+                known.update(self._known(conn, path))
+
+        recent = time.time_ns() - int(settle * 1e9)
+        result = []
+        for path, (mtime_ns, size) in sorted(current.items()):
+            if settle and mtime_ns > recent:
+                continue
+            row = known.get(path)
+            if row is None:
+                result.append((CREATED, path))
+            elif (row["mtime_ns"], row["size"]) != (mtime_ns, size):
+                result.append((MODIFIED, path))
+        result.extend((DELETED, path) for path in sorted(known) if path not in current)
+        return result
+
+    def _folder_of(self, path: str) -> str:
+        return next((folder for folder in self.folders if path.startswith(folder + os.sep)), os.path.dirname(path))
+
+    def apply(self, change: str, path: str) -> bool:
+        """Importe, réimporte ou retire un fichier ; l'indexation est confiée à la file d'indexation"""
+        from utils.document_processor import delete_document, process_document
+        from utils.indexing_queue import PRIORITY_BULK
+
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT doc_id FROM files WHERE path = ?", (path,)).fetchone()
+                if row is not None:
+                    delete_document(row["doc_id"])
+                    conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                if change == DELETED:
+                    return True
+
+                # Relever la date avant la copie : une modification pendant l'import sera redétectée
+                stat = os.stat(path)
+                doc_meta = process_document(
+                    file_path=path,
+                    title=Path(path).stem,
+                    document_type=get_document_type(path),
+                    description=f"Document du dossier surveillé - Chemin: {os.path.relpath(path, self._folder_of(path))}",
+                    priority=PRIORITY_BULK,
+                    storage_mode=self.storage_mode
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO files (path, doc_id, mtime_ns, size, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (path, doc_meta.id, stat.st_mtime_ns, stat.st_size, datetime.now().isoformat())
+                )
+            return True
+        except Exception as e:
+            print(f"❌ Erreur lors de la prise en compte de {path} ({change}): {str(e)}")
+            return False
+
+    def sync(self, paths: Optional[Iterable[str]] = None, settle: float = 0.0) -> Dict[str, int]:
+        """Applique les changements des chemins donnés (tous les dossiers surveillés par défaut)"""
+        counts = {CREATED: 0, MODIFIED: 0, DELETED: 0}
+        for change, path in self.changes(self.folders if paths is None else paths, settle=settle):
+            if self.apply(change, path):
+                counts[change] += 1
+                print(f"🔄 {change}: {path}")
+        return counts
+
+    def _run_inotify(self, inotify: _Inotify):
+        """Boucle inotify : regroupe les événements puis synchronise les chemins stables"""
+        pending: Dict[str, float] = {}
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            timeout = min((self.debounce - (now - seen) for seen in pending.values()), default=1.0)
+            rescan = False
+            for path, mask in inotify.read(max(timeout, 0.0)):
+                if not path or mask & (IN_DELETE_SELF | IN_MOVE_SELF) or (mask & IN_ISDIR and mask & IN_MOVED_FROM):
+                    # File débordée ou dossier déplacé : les chemins surveillés ne sont plus fiables
+                    rescan = True
+                elif mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        inotify.add_tree(path)
+                    pending[path] = time.monotonic()
+                elif is_watched_file(path):
+                    pending[path] = time.monotonic()
+
+            if rescan:
+                inotify.close()
+                inotify = _Inotify()
+                for folder in self.folders:
+                    inotify.add_tree(folder)
+                pending.clear()
+                self.sync()
+                continue
+
+            now = time.monotonic()
+            ready = [path for path, seen in pending.items() if now - seen >= self.debounce]
+            if ready:
+                for path in ready:
+                    del pending[path]
+                self.sync(ready)
+        inotify.close()
+
+    def _run_polling(self):
+        """Boucle de sondage : compare les dossiers à l'état à chaque intervalle"""
+        while not self._stop_event.wait(self.poll_interval):
+            self.sync(settle=self.debounce)
+
+    def run(self):
+        """Synchronise les dossiers (changements survenus à l'arrêt), puis surveille jusqu'à stop()"""
+        self._stop_event.clear()
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _Inotify()
+                for folder in self.folders:
+                    inotify.add_tree(folder)
+            except OSError as e:
+                print(f"⚠️ inotify indisponible ({str(e)}), surveillance par sondage toutes les {self.poll_interval}s")
+                if inotify is not None:
+                    inotify.close()
+                inotify = None
+
+        self.sync()
+        if inotify is None:
+            self._run_polling()
+            return
+        try:
+            self._run_inotify(inotify)
+        except OSError as e:
+            # Limite de surveillances atteinte en cours de route (nouveaux sous-dossiers)
+            print(f"⚠️ inotify interrompu ({str(e)}), surveillance par sondage toutes les {self.poll_interval}s")
+            self.sync()
+            self._run_polling()
+
+    def stop(self):
+        self._stop_event.set()
+
+def watch_folders(folders: Optional[List[str]] = None, use_inotify: bool = True, once: bool = False,
+                  storage_mode: str = WATCH_STORAGE_MODE):
+    """Surveille les dossiers (WATCH_FOLDERS par défaut) jusqu'à l'interruption"""
+    if not folders:
+        folders = [folder.strip() for folder in WATCH_FOLDERS.split(",") if folder.strip()]
+    watcher = FolderWatcher(folders, use_inotify=use_inotify, storage_mode=storage_mode)
+    if once:
+        counts = watcher.sync()
+        print(f"✅ {counts[CREATED]} créés, {counts[MODIFIED]} modifiés, {counts[DELETED]} supprimés")
+        return
+
+    print(f"👀 Surveillance de {', '.join(watcher.folders)}")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+        print("\nArrêt de la surveillance")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexation incrémentale des dossiers surveillés")
+    parser.add_argument('--dir', action='append', help='Dossier à surveiller (répétable, WATCH_FOLDERS par défaut)')
+    parser.add_argument('--poll', action='store_true', help='Sonder les dossiers au lieu d\'utiliser inotify')
+    parser.add_argument('--once', action='store_true', help='Synchroniser une seule fois puis quitter')
+    parser.add_argument('--storage', choices=['link', 'copy', 'reference'], default=WATCH_STORAGE_MODE,
+                        help="Mode de stockage des fichiers (par défaut: WATCH_STORAGE_MODE)")
+    args = parser.parse_args()
+
+    try:
+        watch_folders(args.dir, use_inotify=not args.poll, once=args.once, storage_mode=args.storage)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,175 @@
+import os
+import sys
+import argparse
+from typing import Dict, List, Optional, Set
+
+# Ajouter le répertoire parent au path pour l'exécution en ligne de commande
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.document_processor import (
+    document_fingerprints, get_all_documents, get_document_loader, get_vectorstore,
+    format_search_results, record_retrieval, search_documents, search_documents_batch, DocumentMetadata, INDEX_DONE
+)
+from utils.deadline import call_with_deadline, check_deadline
+from utils.tracing import trace_span
+from config import DOCUMENT_SUMMARY_DB_PATH, HIERARCHICAL_SEARCH_DOCUMENTS, DOCUMENT_SUMMARY_CHARS
+
+def build_document_summary(doc_meta: DocumentMetadata, pages: List, max_chars: int = DOCUMENT_SUMMARY_CHARS) -> str:
+    """
+    Résumé extractif d'un document pour l'index de premier niveau
+
+    Titre, type et description, puis le début du texte et des extraits répartis sur toute sa
+    longueur : le résumé couvre l'ensemble du document sans appel au LLM.
+    """
+    header = f"{doc_meta.title}\n{doc_meta.document_type}\n{doc_meta.description}".strip()
+    text = " ".join(" ".join(page.page_content.split()) for page in pages)
+    budget = max(max_chars - len(header), 0)
+    if len(text) <= budget:
+        return f"{header}\n{text}"
+
+    lead = text[:budget // 2]
+    excerpt_chars = 200
+    excerpts = max(1, (budget - len(lead)) // (excerpt_chars + 5))
+    rest = text[len(lead):]
+    step = max(len(rest) // excerpts, 1)
+    samples = [rest[i * step:i * step + excerpt_chars] for i in range(excerpts)]
+    return "\n".join([header, lead] + [f"… {sample}" for sample in samples if sample])
+
+def summary_db_path() -> str:
+    """Index des résumés de l'index servi (ou de la génération d'index en construction)"""
+    from utils.index_generations import generation_paths
+    paths = generation_paths()
+    return paths["summaries"] if paths else DOCUMENT_SUMMARY_DB_PATH
+
+def get_summary_store():
+    """Index des résumés de documents (un vecteur par document, recherche exacte en mémoire)"""
+    # Import au moment de l'appel : suit un éventuel remplacement de create_embeddings (benchmark)
+    from utils.document_processor import create_embeddings
+    from utils.vectorstores import create_vectorstore
+    return create_vectorstore(create_embeddings(), backend="numpy", persist_directory=summary_db_path())
+
+def index_document_summary(doc_meta: DocumentMetadata, pages: List):
+    """Ajoute (ou remplace) le résumé d'un document dans l'index de premier niveau"""
+    store = get_summary_store()
+    store.delete(ids=[doc_meta.id])
+    store.add_texts(
+        [build_document_summary(doc_meta, pages)],
+        metadatas=[{"doc_id": doc_meta.id, "title": doc_meta.title, "document_type": doc_meta.document_type}],
+        ids=[doc_meta.id]
+    )
+
+def remove_document_summary(doc_id: str):
+    """Retire le résumé d'un document supprimé"""
+    if os.path.exists(summary_db_path()):
+        get_summary_store().delete(ids=[doc_id])
+
+def _candidate_filters(query_embeddings: List[List[float]], documents: int) -> List[Optional[Dict]]:
+    """
+    Filtre de chunks de chaque requête : les documents dont le résumé est le plus proche
+
+    Les documents connus sans résumé (indexés avant l'index hiérarchique) restent toujours candidats.
+    None signifie qu'aucune réduction n'est possible (trop peu de documents) : recherche à plat.
+    """
+    known = set(document_fingerprints())
+    if len(known) <= documents:
+        return [None] * len(query_embeddings)
+
+    store = get_summary_store()
+    unsummarized: Set[str] = known - set(store.ids)
+    with trace_span("summary_search", queries=len(query_embeddings), documents=documents):
+        results = store.similarity_search_with_score_by_vectors(query_embeddings, k=documents)
+    filters = []
+    for matches in results:
+        candidates = {doc.metadata["doc_id"] for doc, _ in matches if doc.metadata["doc_id"] in known}
+        candidates |= unsummarized
+        from utils.near_duplicates import get_near_duplicate_index, near_duplicate_path
+        if os.path.exists(near_duplicate_path()):
+            # Chunks dédupliqués : le vecteur porte l'identifiant du document où le chunk a été vu en premier
+            candidates |= get_near_duplicate_index().canonical_documents(sorted(candidates))
+        filters.append(None if len(candidates) >= len(known) else {"doc_id": {"$in": sorted(candidates)}})
+    return filters
+
+def _search_by_vector(vectorstore, embedding: List[float], k: int, filter: Optional[Dict]):
+    """Recherche par vecteur filtrée, quel que soit le backend (distances, plus petit = plus proche)"""
+    if hasattr(vectorstore, "similarity_search_with_score_by_vector"):
+        return vectorstore.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)
+    # Chroma : le filtre est appliqué par la base avant la recherche
+    return vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)
+
+def search_documents_hierarchical_batch(queries: List[str], limit: int = 5,
+                                        documents: int = HIERARCHICAL_SEARCH_DOCUMENTS) -> List[List[Dict]]:
+    """
+    Recherche en deux niveaux : documents candidats par leur résumé, puis chunks de ces seuls documents
+
+    Les requêtes sont vectorisées une seule fois pour les deux niveaux. Sans index de résumés
+    exploitable, la recherche à plat (search_documents_batch) est utilisée.
+
+    Returns:
+        Une liste de résultats par requête, au même format que search_documents
+    """
+    if not queries:
+        return []
+    if not os.path.exists(summary_db_path()):
+        return search_documents_batch(queries, limit=limit)
+
+    try:
+        check_deadline("recherche documentaire")
+        with trace_span("search_documents_hierarchical", queries=len(queries), limit=limit) as span:
+            vectorstore = get_vectorstore()
+            query_embeddings = call_with_deadline(vectorstore.embeddings.embed_documents, queries,
+                                                  stage="recherche documentaire")
+            filters = _candidate_filters(query_embeddings, documents)
+            if span is not None:
+                span.set_attribute("pruned", sum(f is not None for f in filters))
+
+            all_results = []
+            for embedding, filter in zip(query_embeddings, filters):
+                with trace_span("vector_search", filtered=filter is not None):
+                    results = call_with_deadline(_search_by_vector, vectorstore, embedding, limit, filter,
+                                                 stage="recherche documentaire")
+                formatted_results = format_search_results(results)
+                record_retrieval(formatted_results)
+                all_results.append(formatted_results)
+        return all_results
+    except Exception as e:
+        print(f"Erreur lors de la recherche hiérarchique de documents: {str(e)}")
+        return [[] for _ in queries]
+
+def search_documents_hierarchical(query: str, limit: int = 5,
+                                  documents: int = HIERARCHICAL_SEARCH_DOCUMENTS) -> List[Dict]:
+    """Recherche en deux niveaux pour une requête (voir search_documents_hierarchical_batch)"""
+    if not os.path.exists(summary_db_path()):
+        return search_documents(query, limit=limit)
+    return search_documents_hierarchical_batch([query], limit=limit, documents=documents)[0]
+
+def rebuild_summary_index() -> int:
+    """Calcule le résumé de tous les documents indexés (documents indexés avant la recherche hiérarchique)"""
+    count = 0
+    for doc in get_all_documents():
+        if doc.get("vector_index") != INDEX_DONE:
+            continue
+        doc_meta = DocumentMetadata(**doc)
+        try:
+            pages = get_document_loader(doc_meta.file_path).load()
+            index_document_summary(doc_meta, pages)
+            count += 1
+        except Exception as e:
+            print(f"Erreur lors du résumé de {doc_meta.title}: {str(e)}")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index des résumés de documents (recherche hiérarchique)")
+    parser.add_argument('--rebuild', action='store_true', help='Recalculer le résumé de tous les documents indexés')
+    parser.add_argument('--query', type=str, help='Requête de recherche en deux niveaux')
+    parser.add_argument('--limit', type=int, default=5, help='Nombre maximum de résultats')
+    parser.add_argument('--documents', type=int, default=HIERARCHICAL_SEARCH_DOCUMENTS,
+                        help='Nombre de documents candidats sélectionnés par leur résumé')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"{rebuild_summary_index()} résumés indexés")
+    if args.query:
+        for i, result in enumerate(search_documents_hierarchical(args.query, args.limit, args.documents), start=1):
+            metadata = result["metadata"]
+            print(f"{i}. {metadata.get('title', 'Sans titre')} (distance {result['score']:.4f})")
+            print(f"   {result['content'][:200]}")
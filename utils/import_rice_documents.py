@@ -1,6 +1,5 @@
 import os
 import sys
-import time
 from pathlib import Path
 from typing import List, Tuple
 
@@ -9,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from dotenv import load_dotenv
 from utils.document_processor import process_document
+from utils.indexing_queue import PRIORITY_BULK, get_indexing_queue
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -55,13 +55,15 @@ def find_documents(base_dir: str) -> List[Tuple[str, str]]:
     
     return documents
 
-def import_documents(base_dir: str, max_docs: int = None):
+def import_documents(base_dir: str, max_docs: int = None, storage_mode: str = None):
     """
     Importe tous les documents du dossier et ses sous-dossiers
     
     Args:
         base_dir: Chemin du dossier racine contenant les documents
         max_docs: Nombre maximum de documents à importer (None pour tous)
+        storage_mode: Mode de stockage des fichiers ('link', 'copy' ou 'reference'),
+            'reference' évitant toute copie pour les partages en lecture seule
     """
     documents = find_documents(base_dir)
     
@@ -79,6 +81,8 @@ def import_documents(base_dir: str, max_docs: int = None):
     error_count = 0
     skipped_count = 0
     document_types = {}
+    # Documents mis en file par cet import (la file peut contenir des travaux d'autres imports)
+    queued_doc_ids = []
     
     # Traiter chaque document
     for i, (file_path, doc_type) in enumerate(documents, 1):
@@ -97,23 +101,31 @@ def import_documents(base_dir: str, max_docs: int = None):
             document_types[ext] += 1
             
             # Traiter le document - aucune extension n'est ignorée grâce à notre PPTXTextLoader personnalisé
+            # L'indexation est placée dans la file en priorité basse, pour ne pas
+            # retarder les documents ajoutés de manière interactive
             doc_meta = process_document(
                 file_path=file_path,
                 title=title,
                 document_type=doc_type,
-                description=description
+                description=description,
+                priority=PRIORITY_BULK,
+                storage_mode=storage_mode
             )
             
-            print(f"✅ Document traité avec succès! ID: {doc_meta.id}")
+            print(f"✅ Document ajouté à la file d'indexation! ID: {doc_meta.id}")
+            queued_doc_ids.append(doc_meta.id)
             success_count += 1
             
-            # Petit délai pour éviter de surcharger le système
-            time.sleep(0.5)
-            
         except Exception as e:
             print(f"❌ Erreur lors du traitement de {filename}: {str(e)}")
             error_count += 1
     
+    # Attendre la fin de l'indexation en arrière-plan
+    print("\n⏳ Indexation des documents en cours...")
+    indexing_queue = get_indexing_queue()
+    indexing_queue.wait_until_idle()
+    indexing_stats = indexing_queue.stats(doc_ids=queued_doc_ids)
+    
     # Afficher un résumé
     print("\n" + "="*50)
     print("RÉSUMÉ DE L'IMPORTATION")
@@ -121,6 +133,8 @@ def import_documents(base_dir: str, max_docs: int = None):
     print(f"Documents traités avec succès: {success_count}")
     print(f"Documents ignorés: {skipped_count}")
     print(f"Erreurs: {error_count}")
+    print(f"Documents de cet import indexés: {indexing_stats['done']}")
+    print(f"Documents de cet import en échec d'indexation: {indexing_stats['failed']}")
     print("\nTypes de documents:")
     for ext, count in document_types.items():
         print(f"  - {ext}: {count}")
@@ -133,8 +147,18 @@ if __name__ == "__main__":
     parser.add_argument('--dir', type=str, help='Chemin du dossier documents_rice', 
                        default='/Users/salimkhazem/workspace/AgenticAI/GRDF/documents_rice')
     parser.add_argument('--max', type=int, help='Nombre maximum de documents à importer', default=None)
+    parser.add_argument('--storage', choices=['link', 'copy', 'reference'], default=None,
+                       help="Mode de stockage des fichiers (par défaut: UPLOAD_STORAGE_MODE)")
+    parser.add_argument('--watch', action='store_true',
+                       help="Surveiller le dossier et n'indexer que les fichiers créés, modifiés ou supprimés")
     
     args = parser.parse_args()
     
-    # Importer les documents
-    import_documents(args.dir, args.max)
+    if args.watch:
+        # Mode surveillance : synchronisation initiale puis mises à jour incrémentales
+        from utils.folder_watcher import watch_folders
+        from config import WATCH_STORAGE_MODE
+        watch_folders([args.dir], storage_mode=args.storage or WATCH_STORAGE_MODE)
+    else:
+        # Importer les documents
+        import_documents(args.dir, args.max, args.storage)
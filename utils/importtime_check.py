@@ -0,0 +1,116 @@
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+from typing import List, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bibliothèques lourdes qu'un import léger ne doit pas charger
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_community", "langchain_openai", "langchain_chroma",
+                 "langgraph", "chromadb", "unstructured", "openai", "tiktoken"]
+
+# Modules légers : (module, budget d'import en millisecondes, modules interdits)
+MODULE_CHECKS: List[Tuple[str, float, List[str]]] = [
+    ("config", 300, HEAVY_MODULES),
+    ("utils", 300, HEAVY_MODULES),
+    ("agents", 300, HEAVY_MODULES),
+    ("utils.document_processor", 500, HEAVY_MODULES),
+    ("utils.advanced_search", 500, HEAVY_MODULES),
+    ("utils.indexing_queue", 300, HEAVY_MODULES),
+    ("utils.extraction_cache", 300, HEAVY_MODULES),
+    ("utils.tracing", 300, HEAVY_MODULES),
+]
+
+# Commandes légères : (arguments, budget de démarrage en secondes)
+COMMAND_CHECKS: List[Tuple[List[str], float]] = [
+    (["utils/advanced_search.py", "--list"], 1.0),
+    (["test_system.py", "--help"], 1.0),
+    (["run_app.py", "--help"], 1.0),
+]
+
+_IMPORTTIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+def measure_import(module: str) -> Tuple[float, List[str]]:
+    """
+    Importe module dans un processus neuf avec python -X importtime
+
+    Returns:
+        Le temps d'import cumulé du module (ms) et la liste des modules chargés
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=BASE_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"import {module} a échoué: {process.stderr.strip().splitlines()[-1]}")
+
+    cumulative_ms = 0.0
+    loaded = []
+    for line in process.stderr.splitlines():
+        match = _IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        loaded.append(match.group(4))
+        if match.group(4) == module and not match.group(3):
+            cumulative_ms = int(match.group(2)) / 1000
+    return cumulative_ms, loaded
+
+def measure_command(arguments: List[str]) -> float:
+    """Durée totale (s) d'une commande Python exécutée dans un processus neuf"""
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable] + arguments, cwd=BASE_DIR, capture_output=True, text=True)
+    return time.perf_counter() - start_time
+
+def run_checks(budget_scale: float = 1.0, commands: bool = True) -> List[Tuple[str, bool, str]]:
+    """Vérifie les budgets d'import et l'absence des bibliothèques lourdes dans les imports légers"""
+    results = []
+    for module, budget_ms, forbidden in MODULE_CHECKS:
+        try:
+            cumulative_ms, loaded = measure_import(module)
+        except RuntimeError as e:
+            results.append((f"import {module}", False, str(e)))
+            continue
+        heavy = sorted({name for name in loaded if name.split(".")[0] in forbidden})
+        heavy_roots = sorted({name.split(".")[0] for name in heavy})
+        problems = []
+        if heavy_roots:
+            problems.append(f"charge {', '.join(heavy_roots)}")
+        if cumulative_ms > budget_ms * budget_scale:
+            problems.append(f"{cumulative_ms:.0f} ms > budget {budget_ms * budget_scale:.0f} ms")
+        results.append((f"import {module}", not problems, "; ".join(problems) or f"{cumulative_ms:.0f} ms"))
+
+    if commands:
+        for arguments, budget in COMMAND_CHECKS:
+            seconds = measure_command(arguments)
+            passed = seconds <= budget * budget_scale
+            detail = f"{seconds:.2f} s" + ("" if passed else f" > budget {budget * budget_scale:.2f} s")
+            results.append((" ".join(arguments), passed, detail))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vérifie le temps d'import et le démarrage des commandes légères (python -X importtime)")
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='Multiplicateur des budgets (machines lentes, CI partagée)')
+    parser.add_argument('--no-commands', action='store_true', help='Ne pas chronométrer les commandes')
+    parser.add_argument('--module', type=str, help="Afficher les 15 imports les plus lents d'un module")
+    args = parser.parse_args()
+
+    if args.module:
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+                                 cwd=BASE_DIR, capture_output=True, text=True)
+        timings = [(int(m.group(2)), m.group(3) + m.group(4)) for m in map(_IMPORTTIME_PATTERN.match,
+                                                                           process.stderr.splitlines()) if m]
+        for cumulative, name in sorted(timings, reverse=True)[:15]:
+            print(f"{cumulative / 1000:>10.1f} ms  {name.strip()}")
+        sys.exit(0)
+
+    results = run_checks(args.budget_scale, not args.no_commands)
+    failures = 0
+    for name, passed, detail in results:
+        status = "✅" if passed else "❌"
+        print(f"{status} {name}: {detail}")
+        failures += not passed
+
+    print(f"\n{len(results) - failures}/{len(results)} vérifications réussies")
+    sys.exit(1 if failures else 0)
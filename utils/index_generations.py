@@ -0,0 +1,394 @@
+import os
+import sys
+import json
+import uuid
+import random
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+# Ajouter le répertoire parent au path pour l'exécution en ligne de commande
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (VECTOR_BACKEND, INDEX_GENERATIONS_DIR, INDEX_GENERATIONS_KEEP, INDEX_VALIDATION_SAMPLE,
+                    INDEX_VALIDATION_MIN_RECALL, INDEXING_WORKERS)
+
+# États d'une génération (manifest.json)
+STATUS_BUILDING = "building"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+POINTER_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+# Une génération encore "building" au-delà de ce délai est considérée comme abandonnée
+STALE_BUILD = timedelta(hours=24)
+
+# Génération en construction pour le contexte courant : les écritures du constructeur y sont dirigées,
+# les requêtes (autres contextes) continuent de lire la génération active
+_BUILD_TARGET: ContextVar[Optional[Dict[str, str]]] = ContextVar("index_build_target", default=None)
+# Pointeur lu par backend : (identité du fichier, chemins), relu lorsque le fichier est remplacé
+_ACTIVE_CACHE: Dict[str, tuple] = {}
+# Sérialise les écritures dans la génération en construction (détection des quasi-doublons comprise)
+_BUILD_WRITE_LOCK = threading.Lock()
+
+def _backend_dir(backend: str) -> str:
+    return os.path.join(INDEX_GENERATIONS_DIR, backend)
+
+def generation_layout(backend: str, generation: str) -> Dict[str, str]:
+    """Chemins des index d'une génération : base vectorielle, résumés et quasi-doublons"""
+    directory = os.path.join(_backend_dir(backend), generation)
+    return {
+        "backend": backend,
+        "generation": generation,
+        "directory": directory,
+        "vectors": os.path.join(directory, "vectors"),
+        "summaries": os.path.join(directory, "summaries"),
+        "near_duplicates": os.path.join(directory, "near_duplicates.sqlite3"),
+    }
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json_atomic(path: str, data: Dict):
+    """Écrit un fichier JSON par remplacement atomique : un lecteur voit l'ancien ou le nouveau contenu"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def read_pointer(backend: str = VECTOR_BACKEND) -> Optional[Dict]:
+    """Génération active et générations précédentes (None : index historique hors générations)"""
+    return _read_json(os.path.join(_backend_dir(backend), POINTER_FILE))
+
+def generation_paths(backend: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """
+    Chemins des index à utiliser : génération en construction dans ce contexte, sinon génération active
+
+    Returns:
+        None si aucune génération n'est active (chemins historiques de config.py)
+    """
+    target = _BUILD_TARGET.get()
+    if target is not None and (backend is None or backend == target["backend"]):
+        return target
+
+    backend = backend or VECTOR_BACKEND
+    pointer_path = os.path.join(_backend_dir(backend), POINTER_FILE)
+    try:
+        stat = os.stat(pointer_path)
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        identity = None
+    cached = _ACTIVE_CACHE.get(pointer_path)
+    if cached is None or cached[0] != identity:
+        pointer = (_read_json(pointer_path) or {}) if identity else {}
+        paths = generation_layout(backend, pointer["generation"]) if pointer.get("generation") else None
+        if cached is not None and cached[1] != paths:
+            # Activation ou retour arrière (éventuellement par un autre processus) : les instances
+            # ouvertes sur l'index précédemment servi ne doivent plus être réutilisées
+            _release_served_index(backend, cached[1])
+        cached = (identity, paths)
+        _ACTIVE_CACHE[pointer_path] = cached
+    return cached[1]
+
+def _release_served_index(backend: str, paths: Optional[Dict[str, str]]):
+    """Oublie les bases vectorielles partagées d'un index qui n'est plus servi"""
+    from utils.vectorstores import release_vectorstores
+    if paths is not None:
+        release_vectorstores(paths["directory"])
+        return
+    from utils import hierarchical_search
+    release_vectorstores(None, backend)
+    release_vectorstores(hierarchical_search.DOCUMENT_SUMMARY_DB_PATH)
+
+@contextmanager
+def build_scope(layout: Dict[str, str]):
+    """Dirige les écritures et lectures d'index du contexte courant vers une génération"""
+    token = _BUILD_TARGET.set(layout)
+    try:
+        yield layout
+    finally:
+        _BUILD_TARGET.reset(token)
+
+def read_manifest(backend: str, generation: str) -> Optional[Dict]:
+    return _read_json(os.path.join(generation_layout(backend, generation)["directory"], MANIFEST_FILE))
+
+def list_generations(backend: str = VECTOR_BACKEND) -> List[Dict]:
+    """Manifestes des générations existantes, de la plus ancienne à la plus récente"""
+    directory = _backend_dir(backend)
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(directory)):
+        manifest = read_manifest(backend, name) if os.path.isdir(os.path.join(directory, name)) else None
+        if manifest:
+            manifests.append(manifest)
+    return manifests
+
+def _index_into_generation(doc_meta) -> Optional[str]:
+    """
+    Indexe un document dans la génération du contexte courant
+
+    Returns:
+        Le texte d'un chunk du document, utilisé pour la validation (vide si le document n'a pas de texte)
+    """
+    from utils.document_processor import create_embeddings, split_document, store_chunks
+    from utils.hierarchical_search import index_document_summary
+    from utils.vectorstores import create_vectorstore
+
+    pages, chunks = split_document(doc_meta)
+    with _BUILD_WRITE_LOCK:
+        store_chunks(create_vectorstore(create_embeddings()), doc_meta, chunks)
+    try:
+        index_document_summary(doc_meta, pages)
+    except Exception as e:
+        print(f"Erreur lors du résumé de {doc_meta.title}: {str(e)}")
+    return chunks[len(chunks) // 2].page_content if chunks else ""
+
+def _indexed_documents(statuses: Set[str]) -> Dict:
+    from utils.document_processor import DocumentMetadata, get_all_documents
+    return {doc["id"]: DocumentMetadata(**doc) for doc in get_all_documents() if doc.get("vector_index") in statuses}
+
+def validate_generation(layout: Dict[str, str], probes: Dict[str, Optional[str]],
+                        sample: int = INDEX_VALIDATION_SAMPLE, k: int = 5) -> Dict:
+    """
+    Vérifie qu'un échantillon de documents est retrouvé dans la génération par un de ses propres chunks
+
+    Un document dont l'indexation a échoué (sonde None) compte comme manqué ; un document
+    sans texte (sonde vide) n'est pas échantillonné.
+    """
+    from utils.document_processor import create_embeddings, format_search_results
+    from utils.vectorstores import create_vectorstore
+
+    doc_ids = sorted(doc_id for doc_id, probe in probes.items() if probe != "")
+    if len(doc_ids) > sample:
+        doc_ids = sorted(random.Random(0).sample(doc_ids, sample))
+    if not doc_ids:
+        return {"sampled": 0, "found": 0, "recall": 1.0, "passed": True}
+
+    found = 0
+    with build_scope(layout):
+        vectordb = create_vectorstore(create_embeddings())
+        for doc_id in doc_ids:
+            if probes[doc_id] is None:
+                continue
+            results = format_search_results(vectordb.similarity_search_with_score(probes[doc_id], k=k))
+            if any(result["metadata"].get("doc_id") == doc_id
+                   or any(source["doc_id"] == doc_id for source in result.get("sources", []))
+                   for result in results):
+                found += 1
+    recall = found / len(doc_ids)
+    return {"sampled": len(doc_ids), "found": found, "recall": round(recall, 4),
+            "passed": recall >= INDEX_VALIDATION_MIN_RECALL}
+
+def _catch_up(layout: Dict[str, str], built: Dict[str, Optional[str]]):
+    """Reporte dans la génération les documents indexés ou supprimés depuis le début de sa construction"""
+    from utils.document_processor import get_all_documents, remove_document_vectors
+    from utils.indexing_queue import INDEX_DONE, INDEX_INDEXING
+
+    current = _indexed_documents({INDEX_DONE, INDEX_INDEXING})
+    with build_scope(layout):
+        for doc_id, doc_meta in current.items():
+            if doc_id not in built:
+                try:
+                    built[doc_id] = _index_into_generation(doc_meta)
+                except Exception as e:
+                    print(f"Erreur lors de l'indexation de {doc_meta.title}: {str(e)}")
+        existing = {doc["id"] for doc in get_all_documents()}
+        for doc_id in [doc_id for doc_id in built if doc_id not in existing]:
+            remove_document_vectors(doc_id)
+            del built[doc_id]
+
+def _write_pointer(backend: str, generation: Optional[str], previous: List[Optional[str]]):
+    """Active une génération (None : index historique) par remplacement atomique du pointeur"""
+    pointer_path = os.path.join(_backend_dir(backend), POINTER_FILE)
+    if generation is None:
+        if os.path.exists(pointer_path):
+            os.remove(pointer_path)
+        return
+    _write_json_atomic(pointer_path, {
+        "generation": generation,
+        "previous": previous,
+        "activated_at": datetime.now().isoformat(),
+    })
+
+def activate_generation(generation: str, backend: str = VECTOR_BACKEND):
+    """
+    Sert une génération prête (sans rattrapage : les documents indexés depuis sa construction
+    n'y figurent pas)
+
+    Raises:
+        ValueError: si la génération n'existe pas ou n'a pas été validée
+    """
+    manifest = read_manifest(backend, generation)
+    if not manifest or manifest.get("status") != STATUS_READY:
+        raise ValueError(f"Génération {generation} introuvable ou non validée")
+    pointer = read_pointer(backend) or {}
+    active = pointer.get("generation")
+    if active == generation:
+        return
+    previous = [active] + [g for g in pointer.get("previous", []) if g != generation]
+    _write_pointer(backend, generation, previous[:INDEX_GENERATIONS_KEEP + 1])
+
+def build_generation(backend: str = VECTOR_BACKEND, workers: int = INDEXING_WORKERS, swap: bool = True) -> Dict:
+    """
+    Construit une nouvelle génération à côté de l'index servi, la valide puis l'active
+
+    Les documents sont ré-indexés dans la génération (répertoires distincts, aucune écriture dans
+    l'index servi). Les documents ajoutés ou supprimés pendant la construction sont reportés avant
+    l'activation, sous le verrou d'écriture de la base vectorielle.
+
+    Returns:
+        Le manifeste de la génération (status "ready" ou "failed", résultat de la validation)
+    """
+    from utils.document_processor import vectorstore_write_lock
+    from utils.indexing_queue import INDEX_DONE
+    from utils.rate_limiter import priority_scope, PRIORITY_BATCH
+
+    generation = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    layout = generation_layout(backend, generation)
+    os.makedirs(layout["directory"], exist_ok=True)
+    manifest_path = os.path.join(layout["directory"], MANIFEST_FILE)
+    manifest = {"generation": generation, "backend": backend, "status": STATUS_BUILDING,
+                "created_at": datetime.now().isoformat(), "pid": os.getpid()}
+    _write_json_atomic(manifest_path, manifest)
+
+    documents = _indexed_documents({INDEX_DONE})
+    built: Dict[str, Optional[str]] = {}
+    failed: List[str] = []
+
+    def build(doc_meta):
+        # Chaque tâche fixe sa génération cible : le contexte n'est pas hérité par les threads du pool
+        with build_scope(layout), priority_scope(PRIORITY_BATCH):
+            try:
+                built[doc_meta.id] = _index_into_generation(doc_meta)
+            except Exception as e:
+                print(f"Erreur lors de l'indexation de {doc_meta.title}: {str(e)}")
+                built[doc_meta.id] = None
+                failed.append(doc_meta.id)
+
+    print(f"🏗️ Construction de la génération {generation} ({len(documents)} documents)...")
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        list(executor.map(build, documents.values()))
+    _catch_up(layout, built)
+
+    validation = validate_generation(layout, built)
+    manifest.update({
+        "status": STATUS_READY if validation["passed"] else STATUS_FAILED,
+        "completed_at": datetime.now().isoformat(),
+        "documents": len(built),
+        "failed": failed,
+        "validation": validation,
+    })
+    _write_json_atomic(manifest_path, manifest)
+    if not validation["passed"]:
+        print(f"❌ Validation échouée (rappel {validation['recall']:.2f} < {INDEX_VALIDATION_MIN_RECALL}), "
+              f"la génération {generation} n'est pas activée")
+        return manifest
+
+    if swap:
+        # Dernier rattrapage et activation sans écriture concurrente dans l'index servi
+        with vectorstore_write_lock():
+            _catch_up(layout, built)
+            manifest["documents"] = len(built)
+            _write_json_atomic(manifest_path, manifest)
+            activate_generation(generation, backend)
+        print(f"✅ Génération {generation} active ({len(built)} documents)")
+    return manifest
+
+def rollback(backend: str = VECTOR_BACKEND) -> Optional[str]:
+    """
+    Revient à la génération précédente (ou à l'index historique)
+
+    Les documents indexés depuis l'activation de la génération courante n'y figurent pas :
+    ils sont à ré-indexer, ou à reporter par une nouvelle construction.
+
+    Raises:
+        ValueError: s'il n'y a pas de génération précédente
+    """
+    pointer = read_pointer(backend)
+    if not pointer or not pointer.get("previous"):
+        raise ValueError("Aucune génération précédente")
+    target, rest = pointer["previous"][0], pointer["previous"][1:]
+    if target is not None:
+        manifest = read_manifest(backend, target)
+        if not manifest or manifest.get("status") != STATUS_READY:
+            raise ValueError(f"Génération précédente {target} introuvable")
+    _write_pointer(backend, target, [pointer["generation"]] + rest)
+    return target
+
+def collect_garbage(backend: str = VECTOR_BACKEND, keep: int = INDEX_GENERATIONS_KEEP) -> List[str]:
+    """
+    Supprime les générations inutiles : ni active, ni parmi les keep précédentes, ni en construction
+
+    Returns:
+        Les générations supprimées
+    """
+    from utils.vectorstores import release_vectorstores
+
+    pointer = read_pointer(backend) or {}
+    protected = {pointer.get("generation")} | set(pointer.get("previous", [])[:keep])
+    stale_before = (datetime.now() - STALE_BUILD).isoformat()
+    removed = []
+    for manifest in list_generations(backend):
+        generation = manifest["generation"]
+        if generation in protected:
+            continue
+        if manifest.get("status") == STATUS_BUILDING and manifest.get("created_at", "") > stale_before:
+            continue
+        directory = generation_layout(backend, generation)["directory"]
+        release_vectorstores(directory)
+        shutil.rmtree(directory, ignore_errors=True)
+        removed.append(generation)
+
+    if pointer.get("generation") and len(pointer.get("previous", [])) > keep:
+        _write_pointer(backend, pointer["generation"], pointer["previous"][:keep])
+    return removed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Générations de l'index vectoriel (ré-indexation sans interruption)")
+    parser.add_argument('--backend', type=str, default=VECTOR_BACKEND, help='Backend vectoriel')
+    parser.add_argument('--build', action='store_true', help='Construire, valider et activer une nouvelle génération')
+    parser.add_argument('--no-swap', action='store_true', help='Construire et valider sans activer')
+    parser.add_argument('--workers', type=int, default=INDEXING_WORKERS, help='Documents indexés en parallèle')
+    parser.add_argument('--activate', type=str, help='Activer une génération prête')
+    parser.add_argument('--rollback', action='store_true', help='Revenir à la génération précédente')
+    parser.add_argument('--gc', action='store_true', help='Supprimer les générations inutiles')
+    parser.add_argument('--list', action='store_true', help='Lister les générations')
+    args = parser.parse_args()
+
+    try:
+        if args.build:
+            build_generation(args.backend, args.workers, swap=not args.no_swap)
+        if args.activate:
+            activate_generation(args.activate, args.backend)
+            print(f"✅ Génération {args.activate} active")
+        if args.rollback:
+            target = rollback(args.backend)
+            print(f"↩️ Index servi : {target or 'index historique'}")
+        if args.gc:
+            removed = collect_garbage(args.backend)
+            print(f"🗑️ {len(removed)} générations supprimées")
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+
+    if args.list or not (args.build or args.activate or args.rollback or args.gc):
+        active = (read_pointer(args.backend) or {}).get("generation")
+        for manifest in list_generations(args.backend):
+            marker = "*" if manifest["generation"] == active else " "
+            recall = manifest.get("validation", {}).get("recall")
+            print(f"{marker} {manifest['generation']}  {manifest['status']:<8}  "
+                  f"{manifest.get('documents', '-')} documents  rappel {recall if recall is not None else '-'}")
+        if not active:
+            print("  (index historique servi)")
@@ -0,0 +1,401 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+import argparse
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Ajouter le répertoire parent au path pour l'exécution en ligne de commande
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (INDEXING_QUEUE_PATH, INDEXING_WORKERS, INDEXING_MAX_ATTEMPTS, INDEXING_BACKOFF_BASE,
+                    INDEXING_LEASE_SECONDS)
+
+# États d'indexation, partagés avec DocumentMetadata.vector_index
+INDEX_PENDING = "pending"
+INDEX_INDEXING = "indexing"
+INDEX_DONE = "done"
+INDEX_FAILED = "failed"
+
+# Priorités : la plus petite valeur est traitée en premier
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+def normalize_index_status(value) -> str:
+    """Convertit un statut d'indexation (y compris les anciens booléens) en état"""
+    if value is True:
+        return INDEX_DONE
+    if value is False or value is None:
+        return INDEX_PENDING
+    return value
+
+def _pid_alive(pid: int) -> bool:
+    """Le processus pid existe-t-il encore sur cette machine ?"""
+    if os.name == "nt":
+        # os.kill(pid, 0) termine le processus sous Windows : seul le bail s'applique
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class IndexingQueue:
+    """
+    File persistante (SQLite) des travaux d'indexation
+
+    Les travaux sont traités par des threads workers, par ordre de priorité puis
+    d'arrivée. Un travail en échec est réessayé avec un délai exponentiel jusqu'à
+    max_attempts tentatives avant d'être marqué comme échoué. Un travail réservé enregistre
+    le pid de son worker et l'heure de réservation (bail de lease_seconds).
+    """
+
+    def __init__(self, db_path: str = INDEXING_QUEUE_PATH, max_attempts: int = INDEXING_MAX_ATTEMPTS,
+                 backoff_base: float = INDEXING_BACKOFF_BASE, poll_interval: float = 0.5,
+                 lease_seconds: float = INDEXING_LEASE_SECONDS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._workers: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    owner_pid INTEGER,
+                    claimed_at REAL
+                )
+            """)
+            # Files créées avant l'enregistrement du bail
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("owner_pid", "INTEGER"), ("claimed_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, available_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, doc_id: str, priority: int = PRIORITY_INTERACTIVE) -> int:
+        """
+        Ajoute un document à indexer
+
+        Si un travail est déjà en attente pour ce document, sa priorité est
+        éventuellement relevée au lieu d'en créer un second.
+
+        Returns:
+            Identifiant du travail
+        """
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, priority FROM jobs WHERE doc_id = ? AND status = ?", (doc_id, INDEX_PENDING)
+            ).fetchone()
+            if row:
+                job_id = row["id"]
+                conn.execute(
+                    "UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ?",
+                    (min(row["priority"], priority), now, job_id)
+                )
+            else:
+                cursor = conn.execute(
+                    "INSERT INTO jobs (doc_id, priority, status, available_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (doc_id, priority, INDEX_PENDING, time.time(), now, now)
+                )
+                job_id = cursor.lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        self._wakeup.set()
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Réserve le prochain travail prêt, ou None si la file est vide"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND available_at <= ? "
+                "ORDER BY priority, id LIMIT 1",
+                (INDEX_PENDING, time.time())
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, owner_pid = ?, claimed_at = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (INDEX_INDEXING, os.getpid(), time.time(), datetime.now().isoformat(), row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def complete(self, job_id: int):
+        """Marque un travail comme terminé"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (INDEX_DONE, datetime.now().isoformat(), job_id)
+            )
+
+    def fail(self, job: Dict, error: str) -> str:
+        """
+        Enregistre l'échec d'un travail et planifie une nouvelle tentative si possible
+
+        Returns:
+            Nouvel état du travail (pending ou failed)
+        """
+        if job["attempts"] >= self.max_attempts:
+            status, available_at = INDEX_FAILED, time.time()
+        else:
+            status = INDEX_PENDING
+            available_at = time.time() + self.backoff_base * (2 ** (job["attempts"] - 1))
+
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (status, available_at, error, datetime.now().isoformat(), job["id"])
+            )
+        return status
+
+    def recover_stale(self) -> int:
+        """
+        Remet en attente les travaux interrompus (arrêt brutal d'un worker)
+
+        Seuls les travaux dont le bail a expiré ou dont le processus propriétaire n'existe plus
+        sont repris : ceux des workers d'un autre processus encore actif ne sont pas dupliqués.
+
+        Returns:
+            Le nombre de travaux remis en attente
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, owner_pid, claimed_at FROM jobs WHERE status = ?", (INDEX_INDEXING,)
+            ).fetchall()
+            stale = [
+                row["id"] for row in rows
+                if row["owner_pid"] is None or row["claimed_at"] is None
+                or now - row["claimed_at"] > self.lease_seconds
+                or (row["owner_pid"] != os.getpid() and not _pid_alive(row["owner_pid"]))
+            ]
+            for job_id in stale:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, available_at = ?, owner_pid = NULL, claimed_at = NULL, "
+                    "updated_at = ? WHERE id = ? AND status = ?",
+                    (INDEX_PENDING, now, datetime.now().isoformat(), job_id, INDEX_INDEXING)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return len(stale)
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def stats(self, doc_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Nombre de travaux par état
+
+        Args:
+            doc_ids: Limiter le décompte au dernier travail de chacun de ces documents
+                (ex: ceux d'un import), au lieu de tous les travaux de la file
+        """
+        counts = {INDEX_PENDING: 0, INDEX_INDEXING: 0, INDEX_DONE: 0, INDEX_FAILED: 0}
+        with closing(self._connect()) as conn:
+            if doc_ids is None:
+                rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+            else:
+                rows = []
+                unique_ids = list(dict.fromkeys(doc_ids))
+                # Par lots, sous la limite de paramètres de SQLite
+                for start in range(0, len(unique_ids), 500):
+                    batch = unique_ids[start:start + 500]
+                    rows.extend(conn.execute(
+                        "SELECT status, COUNT(*) AS n FROM jobs WHERE id IN "
+                        f"(SELECT MAX(id) FROM jobs WHERE doc_id IN ({','.join('?' * len(batch))}) GROUP BY doc_id) "
+                        "GROUP BY status", batch
+                    ).fetchall())
+        for row in rows:
+            counts[row["status"]] = counts.get(row["status"], 0) + row["n"]
+        return counts
+
+    def _process_job(self, job: Dict):
+        """Indexe le document associé à un travail et met à jour son statut (le travail est toujours clos)"""
+        doc_meta = None
+        try:
+            from utils.document_processor import (
+                DocumentMetadata, get_document_by_id, index_document, save_document_metadata
+            )
+            from utils.rate_limiter import priority_scope, PRIORITY_BATCH as LLM_PRIORITY_BATCH, \
+                PRIORITY_INTERACTIVE as LLM_PRIORITY_INTERACTIVE
+
+            doc = get_document_by_id(job["doc_id"])
+            if not doc:
+                self.fail(dict(job, attempts=self.max_attempts), "Document introuvable dans l'index")
+                return
+
+            doc_meta = DocumentMetadata(**doc)
+            doc_meta.vector_index = INDEX_INDEXING
+            save_document_metadata(doc_meta)
+
+            # L'indexation en masse cède le quota Azure aux requêtes interactives
+            llm_priority = LLM_PRIORITY_BATCH if job["priority"] >= PRIORITY_BULK else LLM_PRIORITY_INTERACTIVE
+            with priority_scope(llm_priority):
+                index_document(doc_meta, raise_errors=True)
+        except Exception as e:
+            status = self.fail(job, str(e))
+            print(f"Erreur lors de l'indexation du document {job['doc_id']} "
+                  f"(tentative {job['attempts']}/{self.max_attempts}): {str(e)}")
+            if doc_meta is not None:
+                try:
+                    doc_meta.vector_index = status
+                    save_document_metadata(doc_meta)
+                except Exception as save_error:
+                    print(f"Erreur lors de la mise à jour du statut de {job['doc_id']}: {str(save_error)}")
+            return
+
+        self.complete(job["id"])
+
+    def _worker_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                job = self.claim()
+                if job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self._process_job(job)
+            except Exception as e:
+                # Base de la file indisponible : le worker continue, un travail resté réservé
+                # sera repris à l'expiration de son bail
+                print(f"Erreur du worker d'indexation: {str(e)}")
+                self._stop_event.wait(self.poll_interval)
+
+    def start(self, workers: int = INDEXING_WORKERS):
+        """Démarre les threads workers (sans effet s'ils tournent déjà)"""
+        with self._lock:
+            if self._workers:
+                return
+            self._stop_event.clear()
+            self.recover_stale()
+            for i in range(max(1, workers)):
+                thread = threading.Thread(target=self._worker_loop, name=f"indexing-worker-{i}", daemon=True)
+                thread.start()
+                self._workers.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Arrête les workers après le travail en cours"""
+        with self._lock:
+            self._stop_event.set()
+            self._wakeup.set()
+            for thread in self._workers:
+                thread.join(timeout)
+            self._workers = []
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Attend qu'il n'y ait plus de travail en attente ni en cours"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            counts = self.stats()
+            if counts[INDEX_PENDING] == 0 and counts[INDEX_INDEXING] == 0:
+                return True
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(self.poll_interval)
+
+    def wait_for_job(self, job_id: int, timeout: Optional[float] = None) -> Optional[str]:
+        """Attend la fin d'un travail et retourne son état final"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            job = self.get_job(job_id)
+            if job is None or job["status"] in (INDEX_DONE, INDEX_FAILED):
+                return job["status"] if job else None
+            if deadline is not None and time.time() > deadline:
+                return job["status"]
+            time.sleep(self.poll_interval)
+
+_INDEXING_QUEUE = None
+_INDEXING_QUEUE_LOCK = threading.Lock()
+
+def get_indexing_queue(start_workers: bool = True) -> IndexingQueue:
+    """Retourne la file d'indexation partagée, en démarrant ses workers si demandé"""
+    global _INDEXING_QUEUE
+
+    with _INDEXING_QUEUE_LOCK:
+        if _INDEXING_QUEUE is None:
+            _INDEXING_QUEUE = IndexingQueue()
+    if start_workers:
+        _INDEXING_QUEUE.start()
+    return _INDEXING_QUEUE
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="File d'indexation des documents")
+    parser.add_argument('--status', action='store_true', help="Afficher l'état de la file")
+    parser.add_argument('--workers', type=int, default=INDEXING_WORKERS, help='Nombre de workers')
+    parser.add_argument('--drain', action='store_true', help="Traiter la file puis s'arrêter")
+
+    args = parser.parse_args()
+    indexing_queue = IndexingQueue()
+
+    if args.status:
+        for status, count in indexing_queue.stats().items():
+            print(f"{status}: {count}")
+    else:
+        indexing_queue.start(args.workers)
+        print(f"🚀 {args.workers} worker(s) d'indexation démarré(s).")
+        try:
+            if args.drain:
+                indexing_queue.wait_until_idle()
+            else:
+                while True:
+                    time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n👋 Arrêt des workers...")
+        indexing_queue.stop()
@@ -0,0 +1,295 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import traceback
+from typing import Callable, List, Tuple
+
+import openai
+from langchain_core.messages import HumanMessage
+
+# Ajouter le répertoire parent au path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.fake_openai_server import FakeOpenAIServer
+from utils.resilient_llm import (ResilientChatModel, LLMUnavailableError, BREAKER_CLOSED, BREAKER_HALF_OPEN,
+                                BREAKER_OPEN, create_backends)
+from utils.deadline import deadline_scope, DeadlineExceeded
+from utils.model_tiering import TieredChatModel, estimate_complexity, get_tiering_stats
+from utils.rate_limiter import DeploymentRateLimiter, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+def _model(server: FakeOpenAIServer, deployments: List[str], **kwargs) -> ResilientChatModel:
+    targets = [{"endpoint": server.endpoint, "deployment": name, "api_key": "test", "api_version": "2024-02-01"}
+               for name in deployments]
+    kwargs.setdefault("backoff_base", 0.01)
+    return ResilientChatModel(backends=create_backends("test", timeout=5, targets=targets), **kwargs)
+
+def _ask(model: ResilientChatModel, text: str = "Quelle est la pression du réseau?") -> str:
+    return model.invoke([HumanMessage(content=text)]).content
+
+def check_success(server: FakeOpenAIServer):
+    """Un déploiement sain répond du premier coup"""
+    model = _model(server, ["a"])
+    assert _ask(model).startswith("[a]")
+    assert server.requests["a"] == 1
+
+def check_backoff_on_429(server: FakeOpenAIServer):
+    """Un 429 est réessayé après le délai retry-after du serveur"""
+    server.script("a", status=429, headers={"retry-after-ms": "100"}, times=2)
+    model = _model(server, ["a"])
+    start_time = time.perf_counter()
+    assert _ask(model).startswith("[a]")
+    elapsed = time.perf_counter() - start_time
+    assert server.requests["a"] == 3, f"{server.requests['a']} requêtes au lieu de 3"
+    assert elapsed >= 0.2, f"retry-after non respecté ({elapsed:.2f}s)"
+
+def check_failover_on_5xx(server: FakeOpenAIServer):
+    """Un déploiement en erreur 5xx est contourné par le suivant"""
+    server.fail("a", 500)
+    model = _model(server, ["a", "b"])
+    for _ in range(4):
+        assert _ask(model).startswith("[b]")
+
+def check_circuit_breaker(server: FakeOpenAIServer):
+    """Le disjoncteur écarte un déploiement défaillant puis le réessaie après le délai"""
+    server.fail("a", 503)
+    model = _model(server, ["a", "b"])
+    for backend in model.backends:
+        backend.breaker.failure_threshold = 2
+        backend.breaker.reset_timeout = 0.3
+    for _ in range(8):
+        assert _ask(model).startswith("[b]")
+    assert server.requests["a"] == 2, f"{server.requests['a']} requêtes au déploiement écarté au lieu de 2"
+
+    server.fail("a", None)
+    time.sleep(0.35)
+    answers = [_ask(model) for _ in range(4)]
+    assert any(answer.startswith("[a]") for answer in answers), "déploiement rétabli jamais réessayé"
+    assert model.backends[0].breaker.state == BREAKER_CLOSED
+
+def check_half_open_probe_not_wasted(server: FakeOpenAIServer):
+    """Un déploiement rétabli est réessayé même si un autre répond avant son tour"""
+    server.fail("b", 503)
+    model = _model(server, ["a", "b"], max_attempts=1)
+    breaker = model.backends[1].breaker
+    breaker.failure_threshold = 1
+    breaker.reset_timeout = 0.2
+    for _ in range(2):
+        _ask(model)
+    assert breaker.state != BREAKER_CLOSED, "disjoncteur non ouvert"
+
+    server.fail("b", None)
+    time.sleep(0.25)
+    answers = [_ask(model) for _ in range(4)]
+    assert any(answer.startswith("[b]") for answer in answers), "essai du demi-ouvert consommé sans appel"
+    assert breaker.state == BREAKER_CLOSED
+
+    # Essai réservé mais jamais abouti : le disjoncteur se rouvre avec un nouveau délai
+    breaker.record_failure()
+    time.sleep(0.25)
+    assert breaker.allow() and breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.available()
+    time.sleep(0.25)
+    assert not breaker.available() and breaker.state == BREAKER_OPEN
+    time.sleep(0.25)
+    assert breaker.available()
+
+def check_all_breakers_open(server: FakeOpenAIServer):
+    """Sans déploiement disponible, l'appel échoue immédiatement"""
+    server.fail("a", 500)
+    model = _model(server, ["a"], max_attempts=1)
+    model.backends[0].breaker.failure_threshold = 1
+    try:
+        _ask(model)
+    except openai.InternalServerError:
+        pass
+    try:
+        _ask(model)
+        raise AssertionError("appel réussi malgré un disjoncteur ouvert")
+    except LLMUnavailableError:
+        pass
+    assert server.requests["a"] == 1
+
+def check_non_retryable(server: FakeOpenAIServer):
+    """Une erreur de requête (400) n'est ni réessayée ni basculée"""
+    server.script("a", status=400)
+    server.script("b", status=400)
+    model = _model(server, ["a", "b"])
+    try:
+        _ask(model)
+        raise AssertionError("erreur 400 non levée")
+    except openai.BadRequestError:
+        pass
+    assert server.requests["a"] + server.requests["b"] == 1
+
+def check_hedging(server: FakeOpenAIServer):
+    """Une réponse lente est doublée vers un autre déploiement"""
+    server.fail("a", status=200, delay=1.5)
+    model = _model(server, ["a", "b"], hedge_after=0.1)
+    for _ in range(4):
+        start_time = time.perf_counter()
+        assert _ask(model).startswith("[b]")
+        elapsed = time.perf_counter() - start_time
+        assert elapsed < 0.8, f"réponse doublée trop lente ({elapsed:.2f}s)"
+
+def check_deadline(server: FakeOpenAIServer):
+    """Les attentes entre tentatives ne dépassent pas l'échéance de la requête"""
+    server.fail("a", 429)
+    model = _model(server, ["a"], backoff_base=5)
+    start_time = time.perf_counter()
+    try:
+        with deadline_scope(0.5):
+            _ask(model)
+        raise AssertionError("appel réussi malgré un quota épuisé")
+    except (openai.RateLimitError, DeadlineExceeded):
+        pass
+    elapsed = time.perf_counter() - start_time
+    assert elapsed < 1.0, f"échéance dépassée ({elapsed:.2f}s)"
+
+def check_rate_limit_rpm(server: FakeOpenAIServer):
+    """Le limiteur espace les requêtes au-delà du quota par minute"""
+    limiter = DeploymentRateLimiter("rpm", rpm=600)
+    limiter.requests.level = 0
+    start_time = time.perf_counter()
+    for _ in range(3):
+        limiter.acquire(1)
+    elapsed = time.perf_counter() - start_time
+    assert 0.25 <= elapsed < 0.6, f"3 requêtes à 600/min en {elapsed:.2f}s"
+    assert limiter.snapshot()["waited"] == 3
+
+def check_rate_limit_tpm(server: FakeOpenAIServer):
+    """Le quota de tokens est réservé à l'estimation puis corrigé avec l'usage réel"""
+    limiter = DeploymentRateLimiter("tpm", tpm=6000)
+    limiter.acquire(5000)
+    limiter.settle(5000, 100)
+    start_time = time.perf_counter()
+    limiter.acquire(5000)
+    assert time.perf_counter() - start_time < 0.05, "réservation non corrigée par l'usage réel"
+    start_time = time.perf_counter()
+    limiter.acquire(1000)
+    elapsed = time.perf_counter() - start_time
+    assert elapsed >= 0.9, f"quota de tokens dépassé sans attente ({elapsed:.2f}s)"
+
+def check_priority_order(server: FakeOpenAIServer):
+    """Une demande interactive passe devant l'indexation en masse déjà en attente"""
+    limiter = DeploymentRateLimiter("priority", rpm=600)
+    limiter.requests.level = 0
+    order = []
+
+    def acquire(priority, label):
+        limiter.acquire(1, priority=priority)
+        order.append(label)
+
+    threads = [threading.Thread(target=acquire, args=(PRIORITY_BATCH, f"batch-{i}")) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.02)
+    assert limiter.snapshot()["queue_depth_by_priority"] == {PRIORITY_BATCH: 3}
+    interactive = threading.Thread(target=acquire, args=(PRIORITY_INTERACTIVE, "interactive"))
+    interactive.start()
+    for thread in threads + [interactive]:
+        thread.join()
+    assert order[0] == "interactive", f"ordre de service: {order}"
+
+def check_throttle_pauses_callers(server: FakeOpenAIServer):
+    """Après un 429, les autres appels au déploiement attendent au lieu de provoquer une rafale de 429"""
+    server.script("a", status=429, headers={"retry-after-ms": "400"})
+    model = _model(server, ["a"])
+    answers = []
+    first = threading.Thread(target=lambda: answers.append(_ask(model)))
+    first.start()
+    time.sleep(0.1)
+    second = threading.Thread(target=lambda: answers.append(_ask(model)))
+    second.start()
+    time.sleep(0.15)
+    assert server.requests["a"] == 1, f"{server.requests['a']} requêtes pendant la pause"
+    first.join()
+    second.join()
+    assert len(answers) == 2 and server.requests["a"] == 3
+    assert model.backends[0].limiter.snapshot()["throttled"] == 1
+
+def check_adapts_to_headers(server: FakeOpenAIServer):
+    """Le limiteur s'aligne sur le quota restant annoncé par Azure"""
+    server.script("a", headers={"x-ratelimit-remaining-requests": "0", "x-ratelimit-remaining-tokens": "10"})
+    model = _model(server, ["a"])
+    limiter = model.backends[0].limiter
+    limiter.requests = type(limiter.requests)(600)
+    _ask(model)
+    assert limiter.requests.level <= 0, f"niveau {limiter.requests.level} malgré 0 requête restante"
+    start_time = time.perf_counter()
+    _ask(model)
+    assert time.perf_counter() - start_time >= 0.05, "appel suivant non retardé"
+
+def _tiered(server: FakeOpenAIServer, agent: str) -> TieredChatModel:
+    return TieredChatModel(agent=agent, small=_model(server, ["small"]), large=_model(server, ["large"]),
+                           small_deployment="small", large_deployment="large", threshold=0.35)
+
+def check_tiering_routes_by_complexity(server: FakeOpenAIServer):
+    """Une question factuelle va au petit modèle, une demande d'analyse au grand"""
+    simple = "Quelle est la pression du réseau?"
+    complex_query = "Analyse et compare l'impact des stratégies de biométhane sur l'évolution du réseau et recommande un plan d'action"
+    assert estimate_complexity(simple) < 0.35 <= estimate_complexity(complex_query)
+    model = _tiered(server, "routing")
+    assert _ask(model, simple).startswith("[small]")
+    assert _ask(model, complex_query).startswith("[large]")
+    stats = get_tiering_stats()["routing"]
+    assert stats["small"]["calls"] == 1 and stats["large"]["calls"] == 1 and stats["small"]["escalations"] == 0
+
+def check_tiering_escalation(server: FakeOpenAIServer):
+    """Le grand modèle reprend une réponse peu sûre ou un échec du petit modèle"""
+    model = _tiered(server, "escalation")
+    server.logprobs["small"] = -2.0
+    assert _ask(model).startswith("[large]")
+    server.logprobs["small"] = -0.05
+    server.fail("small", 500)
+    model.small.max_attempts = 1
+    assert _ask(model).startswith("[large]")
+    stats = get_tiering_stats()["escalation"]
+    assert stats["small"]["escalations"] == 2 and stats["small"]["failures"] == 1
+
+CHECKS: List[Callable] = [
+    check_success,
+    check_backoff_on_429,
+    check_failover_on_5xx,
+    check_circuit_breaker,
+    check_half_open_probe_not_wasted,
+    check_all_breakers_open,
+    check_non_retryable,
+    check_hedging,
+    check_deadline,
+    check_rate_limit_rpm,
+    check_rate_limit_tpm,
+    check_priority_order,
+    check_throttle_pauses_callers,
+    check_adapts_to_headers,
+    check_tiering_routes_by_complexity,
+    check_tiering_escalation,
+]
+
+def run_checks() -> List[Tuple[str, bool, str]]:
+    """Exécute chaque vérification contre un serveur factice neuf"""
+    results = []
+    for check in CHECKS:
+        with FakeOpenAIServer() as server:
+            try:
+                check(server)
+                results.append((check.__name__, True, ""))
+            except Exception as e:
+                detail = str(e) or traceback.format_exc(limit=1)
+                results.append((check.__name__, False, detail))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Vérifie la résilience et la limitation de débit du client LLM contre un serveur OpenAI factice')
+    parser.parse_args()
+
+    results = run_checks()
+    failures = 0
+    for name, passed, detail in results:
+        status = "✅" if passed else "❌"
+        print(f"{status} {name}" + (f": {detail}" if detail else ""))
+        failures += not passed
+
+    print(f"\n{len(results) - failures}/{len(results)} vérifications réussies")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,218 @@
+import re
+import json
+import math
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.outputs import ChatResult
+
+from utils.deadline import DeadlineExceeded
+from utils.tracing import trace_span
+from config import MODEL_COSTS, TIER_MIN_CONFIDENCE
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+# Requête utilisateur en cours : la complexité est estimée sur elle plutôt que sur le prompt complet
+_QUERY: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("tiering_query", default=None)
+
+@contextmanager
+def tiering_query_scope(query: str):
+    """Indique la requête utilisateur à partir de laquelle estimer la complexité des appels du bloc"""
+    token = _QUERY.set(query)
+    try:
+        yield
+    finally:
+        _QUERY.reset(token)
+
+# Indices d'une demande d'analyse (comparés sans majuscules)
+_ANALYSIS_MARKERS = [
+    "analys", "compar", "stratég", "impact", "évolution", "pourquoi", "recommand", "synthès",
+    "avantages", "inconvénients", "prévision", "scénario", "tendance", "explique", "détaill",
+    "évalue", "risques", "enjeux", "plan d'action", "rapport"
+]
+_FACTUAL_MARKERS = ["qu'est-ce", "quel est", "quelle est", "définition", "combien", "que signifie", "c'est quoi"]
+
+def estimate_complexity(text: str) -> float:
+    """
+    Estime localement la complexité d'une requête, entre 0 (factuelle) et 1 (analyse)
+
+    Combine la longueur, les marqueurs d'analyse et le nombre de sous-questions.
+    """
+    lowered = text.lower()
+    words = len(lowered.split())
+    score = min(words / 60, 0.4)
+    score += min(0.15 * sum(marker in lowered for marker in _ANALYSIS_MARKERS), 0.45)
+    parts = max(lowered.count("?") - 1, 0) + len(re.findall(r"\bet\b|;|\n", lowered))
+    score += min(0.1 * parts, 0.3)
+    if any(marker in lowered for marker in _FACTUAL_MARKERS):
+        score -= 0.1
+    return round(min(max(score, 0.0), 1.0), 3)
+
+_HEDGES = ["je ne sais pas", "je ne suis pas sûr", "je ne suis pas certain", "impossible de répondre",
+           "je n'ai pas assez d'informations", "i don't know", "not sure"]
+
+def response_confidence(result: ChatResult) -> Optional[float]:
+    """
+    Confiance dans une réponse : probabilité moyenne de ses tokens si l'API renvoie les logprobs,
+    sinon faible si la réponse exprime un doute, None si rien ne permet d'en juger
+    """
+    if not result.generations:
+        return None
+    generation = result.generations[0]
+    logprobs = ((generation.generation_info or {}).get("logprobs") or {}).get("content") or []
+    values = [item["logprob"] for item in logprobs if item.get("logprob") is not None]
+    if values:
+        return math.exp(sum(values) / len(values))
+    if any(hedge in generation.text.lower() for hedge in _HEDGES):
+        return 0.3
+    return None
+
+def _costs() -> Dict[str, List[float]]:
+    try:
+        return json.loads(MODEL_COSTS) if MODEL_COSTS else {}
+    except ValueError:
+        raise ValueError("MODEL_COSTS doit être un objet JSON {déploiement: [coût entrée, coût sortie] / 1000 tokens}")
+
+_COSTS = _costs()
+
+def call_cost(deployment: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Coût d'un appel en dollars (0 si le déploiement n'a pas de tarif dans MODEL_COSTS)"""
+    input_cost, output_cost = _COSTS.get(deployment, (0.0, 0.0))
+    return (prompt_tokens * input_cost + completion_tokens * output_cost) / 1000
+
+# Statistiques par (agent, niveau)
+_STATS: Dict[tuple, Dict[str, float]] = {}
+_STATS_LOCK = threading.Lock()
+
+def _record(agent: str, tier: str, deployment: str, seconds: float, result: Optional[ChatResult] = None,
+            escalated: bool = False, failed: bool = False):
+    usage = ((result.llm_output or {}).get("token_usage") or {}) if result is not None else {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    with _STATS_LOCK:
+        stats = _STATS.setdefault((agent, tier), {
+            "deployment": deployment, "calls": 0, "escalations": 0, "failures": 0, "seconds": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0
+        })
+        stats["calls"] += 1
+        stats["escalations"] += escalated
+        stats["failures"] += failed
+        stats["seconds"] += seconds
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["cost"] += call_cost(deployment, prompt_tokens, completion_tokens)
+
+def get_tiering_stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Appels, escalades, latence moyenne, tokens et coût par agent et par niveau"""
+    with _STATS_LOCK:
+        report = {}
+        for (agent, tier), stats in _STATS.items():
+            report.setdefault(agent, {})[tier] = {
+                "deployment": stats["deployment"],
+                "calls": int(stats["calls"]),
+                "escalations": int(stats["escalations"]),
+                "failures": int(stats["failures"]),
+                "avg_seconds": round(stats["seconds"] / stats["calls"], 3) if stats["calls"] else 0.0,
+                "prompt_tokens": int(stats["prompt_tokens"]),
+                "completion_tokens": int(stats["completion_tokens"]),
+                "cost": round(stats["cost"], 6)
+            }
+        return report
+
+# Déploiements qui refusent le paramètre logprobs (anciennes versions d'API)
+_NO_LOGPROBS = set()
+
+def _logprobs_unsupported(error: Exception) -> bool:
+    """Erreur 400 due au paramètre logprobs (et non au contenu de la requête : filtre, contexte trop long...)"""
+    if getattr(error, "status_code", None) != 400:
+        return False
+    body = getattr(error, "body", None)
+    if isinstance(body, dict) and body.get("param") == "logprobs":
+        return True
+    return "logprobs" in str(error).lower()
+
+class TieredChatModel(BaseChatModel):
+    """
+    Modèle de chat à deux niveaux pour un agent
+
+    Les requêtes dont la complexité estimée est sous le seuil vont au petit modèle ;
+    elles sont escaladées vers le grand modèle si le petit échoue ou répond avec une
+    confiance inférieure à min_confidence. Les autres vont directement au grand modèle.
+    """
+
+    agent: str
+    small: Any
+    large: Any
+    small_deployment: str
+    large_deployment: str
+    threshold: float = 0.35
+    min_confidence: float = TIER_MIN_CONFIDENCE
+
+    @property
+    def _llm_type(self) -> str:
+        return "tiered-azure-openai"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"agent": self.agent, "small": self.small_deployment, "large": self.large_deployment}
+
+    def _query_text(self, messages: List[BaseMessage]) -> str:
+        query = _QUERY.get()
+        if query:
+            return query
+        human = [message for message in messages if isinstance(message, HumanMessage)]
+        return str((human or messages)[-1].content) if messages else ""
+
+    def _call_small(self, messages, stop, kwargs) -> ChatResult:
+        if self.small_deployment in _NO_LOGPROBS:
+            return self.small._generate(messages, stop=stop, **kwargs)
+        try:
+            return self.small._generate(messages, stop=stop, **{**kwargs, "logprobs": True})
+        except Exception as e:
+            if not _logprobs_unsupported(e):
+                raise
+            # Paramètre refusé par le déploiement : continuer sans les logprobs
+            _NO_LOGPROBS.add(self.small_deployment)
+            return self.small._generate(messages, stop=stop, **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        complexity = estimate_complexity(self._query_text(messages))
+
+        with trace_span("llm.tier", agent=self.agent, complexity=complexity) as span:
+            if complexity < self.threshold:
+                start_time = time.perf_counter()
+                try:
+                    result = self._call_small(messages, stop, kwargs)
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    _record(self.agent, TIER_SMALL, self.small_deployment, time.perf_counter() - start_time,
+                            escalated=True, failed=True)
+                    print(f"Petit modèle de l'agent {self.agent} en échec, escalade: {str(e)}")
+                else:
+                    confidence = response_confidence(result)
+                    confident = confidence is None or confidence >= self.min_confidence
+                    _record(self.agent, TIER_SMALL, self.small_deployment, time.perf_counter() - start_time,
+                            result, escalated=not confident)
+                    if confident:
+                        if span is not None:
+                            span.set_attribute("tier", TIER_SMALL)
+                        result.llm_output = {**(result.llm_output or {}), "tier": TIER_SMALL, "complexity": complexity}
+                        return result
+                if span is not None:
+                    span.set_attribute("escalated", True)
+
+            start_time = time.perf_counter()
+            result = self.large._generate(messages, stop=stop, **kwargs)
+            _record(self.agent, TIER_LARGE, self.large_deployment, time.perf_counter() - start_time, result)
+            if span is not None:
+                span.set_attribute("tier", TIER_LARGE)
+            result.llm_output = {**(result.llm_output or {}), "tier": TIER_LARGE, "complexity": complexity}
+            return result
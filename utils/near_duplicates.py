@@ -0,0 +1,355 @@
+import os
+import re
+import sys
+import zlib
+import uuid
+import sqlite3
+import hashlib
+import argparse
+import threading
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+# Ajouter le répertoire parent au path pour l'exécution en ligne de commande
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import NEAR_DUPLICATE_PATH, NEAR_DUPLICATE_THRESHOLD
+
+# Shingles de SHINGLE_WORDS mots, signature MinHash de NUM_PERMUTATIONS valeurs découpée en BANDS
+# bandes pour le LSH : deux chunks de similarité 0.9 partagent une bande avec une probabilité > 0.999,
+# à 0.5 avec une probabilité ~ 0.06 (les candidats sont ensuite vérifiés sur la signature complète)
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 128
+BANDS = 16
+_PRIME = (1 << 31) - 1
+# Graine fixe : les signatures sont persistées et doivent rester comparables d'une exécution à l'autre
+_rng = np.random.default_rng(20240613)
+_PERM_A = _rng.integers(1, _PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+# Nombre maximal de paramètres par requête SQLite
+_SQL_BATCH = 500
+
+def shingles(text: str) -> Set[str]:
+    """Shingles de mots du texte normalisé (casse, ponctuation et espacement ignorés)"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Signature MinHash (uint32) : la proportion de valeurs égales estime la similarité de Jaccard"""
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text)), dtype=np.uint64) % _PRIME
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+def band_buckets(signature: np.ndarray) -> List[int]:
+    """Clé LSH de chaque bande de la signature"""
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "little", signed=True)
+        for band in signature.reshape(BANDS, -1)
+    ]
+
+def _batches(values: List, size: int = _SQL_BATCH) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+class DeduplicationPlan:
+    """
+    Résultat de la détection pour les chunks d'un document
+
+    canonical[i] est l'identifiant du chunk déjà indexé dont le chunk i est un quasi-doublon,
+    ou None si le chunk doit être vectorisé (new contient leurs positions).
+    """
+
+    def __init__(self, doc_id: str, chunk_ids: List[str], signatures: np.ndarray, canonical: List[Optional[str]]):
+        self.doc_id = doc_id
+        self.chunk_ids = chunk_ids
+        self.signatures = signatures
+        self.canonical = canonical
+
+    @property
+    def new(self) -> List[int]:
+        return [i for i, target in enumerate(self.canonical) if target is None]
+
+    @property
+    def embeddings_avoided(self) -> int:
+        return len(self.chunk_ids) - len(self.new)
+
+class NearDuplicateIndex:
+    """
+    Index persistant (SQLite) des chunks vectorisés, pour détecter les quasi-doublons à l'indexation
+
+    Seuls les chunks canoniques (vectorisés) ont une signature et des bandes LSH ; chaque occurrence
+    d'un chunk, y compris dans d'autres documents, est enregistrée comme source du chunk canonique.
+    """
+
+    def __init__(self, db_path: str = NEAR_DUPLICATE_PATH, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.db_path = db_path
+        self.threshold = threshold
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    signature BLOB NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bands (
+                    bucket INTEGER NOT NULL,
+                    band INTEGER NOT NULL,
+                    chunk_id TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (bucket)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    chunk_id TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    title TEXT,
+                    page INTEGER,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (doc_id, position)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS sources_chunk ON sources (chunk_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    chunks INTEGER NOT NULL,
+                    duplicates INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _candidates(self, conn, buckets: List[List[int]]) -> Dict[int, Set[str]]:
+        """Chunks indexés partageant au moins une bande avec chaque signature (position -> chunk_ids)"""
+        wanted: Dict[tuple, List[int]] = {}
+        for position, keys in enumerate(buckets):
+            for band, bucket in enumerate(keys):
+                wanted.setdefault((band, bucket), []).append(position)
+
+        candidates: Dict[int, Set[str]] = {}
+        for batch in _batches(sorted({bucket for _, bucket in wanted})):
+            rows = conn.execute(
+                f"SELECT bucket, band, chunk_id FROM bands WHERE bucket IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for row in rows:
+                for position in wanted.get((row["band"], row["bucket"]), ()):
+                    candidates.setdefault(position, set()).add(row["chunk_id"])
+        return candidates
+
+    def _signatures(self, conn, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        signatures = {}
+        for batch in _batches(chunk_ids):
+            rows = conn.execute(
+                f"SELECT chunk_id, signature FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for row in rows:
+                signatures[row["chunk_id"]] = np.frombuffer(row["signature"], dtype=np.uint32)
+        return signatures
+
+    def plan(self, doc_id: str, texts: List[str]) -> DeduplicationPlan:
+        """
+        Détecte les quasi-doublons parmi les chunks d'un document
+
+        Un chunk est comparé aux chunks déjà indexés et aux chunks précédents du même document ;
+        il est rattaché au plus similaire si la similarité estimée atteint le seuil.
+        """
+        # Identifiants uniques : une ré-indexation ne réutilise jamais l'identifiant d'un ancien vecteur
+        chunk_ids = [f"{doc_id}:{uuid.uuid4().hex[:12]}" for _ in texts]
+        signatures = np.stack([minhash_signature(text) for text in texts]) if texts else \
+            np.empty((0, NUM_PERMUTATIONS), dtype=np.uint32)
+        buckets = [band_buckets(signature) for signature in signatures]
+
+        with closing(self._connect()) as conn:
+            stored = self._candidates(conn, buckets)
+            known = self._signatures(conn, sorted(set().union(*stored.values()))) if stored else {}
+
+        canonical: List[Optional[str]] = []
+        # Bandes des chunks de ce document retenus comme canoniques
+        local: Dict[tuple, List[int]] = {}
+        for position, signature in enumerate(signatures):
+            options = {chunk_id: known[chunk_id] for chunk_id in stored.get(position, ()) if chunk_id in known}
+            for band, bucket in enumerate(buckets[position]):
+                for other in local.get((band, bucket), ()):
+                    options[chunk_ids[other]] = signatures[other]
+
+            target, best = None, self.threshold
+            for chunk_id, other in options.items():
+                similarity = float(np.mean(other == signature))
+                if similarity >= best:
+                    target, best = chunk_id, similarity
+            canonical.append(target)
+            if target is None:
+                for band, bucket in enumerate(buckets[position]):
+                    local.setdefault((band, bucket), []).append(position)
+
+        return DeduplicationPlan(doc_id, chunk_ids, signatures, canonical)
+
+    def commit(self, plan: DeduplicationPlan, title: str = "", pages: Optional[List] = None):
+        """Enregistre les chunks vectorisés et les sources du document (après l'ajout à la base vectorielle)"""
+        pages = pages or [None] * len(plan.chunk_ids)
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Ré-indexation : remplacer les sources précédentes du document
+            conn.execute("DELETE FROM sources WHERE doc_id = ?", (plan.doc_id,))
+            for position in plan.new:
+                chunk_id = plan.chunk_ids[position]
+                signature = plan.signatures[position]
+                conn.execute("INSERT OR REPLACE INTO chunks (chunk_id, doc_id, signature) VALUES (?, ?, ?)",
+                             (chunk_id, plan.doc_id, signature.tobytes()))
+                conn.execute("DELETE FROM bands WHERE chunk_id = ?", (chunk_id,))
+                conn.executemany("INSERT INTO bands (bucket, band, chunk_id) VALUES (?, ?, ?)",
+                                 [(bucket, band, chunk_id) for band, bucket in enumerate(band_buckets(signature))])
+            conn.executemany(
+                "INSERT INTO sources (chunk_id, doc_id, title, page, position) VALUES (?, ?, ?, ?, ?)",
+                [(target or chunk_id, plan.doc_id, title, page, position)
+                 for position, (chunk_id, target, page) in enumerate(zip(plan.chunk_ids, plan.canonical, pages))]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, chunks, duplicates, updated_at) VALUES (?, ?, ?, ?)",
+                (plan.doc_id, len(plan.chunk_ids), plan.embeddings_avoided, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def remove_document(self, doc_id: str) -> List[str]:
+        """
+        Retire les sources d'un document supprimé
+
+        Les chunks canoniques encore présents dans d'autres documents restent indexés.
+
+        Returns:
+            Identifiants des chunks qui n'ont plus aucune source (à retirer de la base vectorielle)
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM sources WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            orphans = [row["chunk_id"] for row in conn.execute(
+                "SELECT chunk_id FROM chunks WHERE chunk_id NOT IN (SELECT chunk_id FROM sources)"
+            )]
+            for batch in _batches(orphans):
+                placeholders = ",".join("?" * len(batch))
+                conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", batch)
+                conn.execute(f"DELETE FROM bands WHERE chunk_id IN ({placeholders})", batch)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return orphans
+
+    def owned_chunks(self, doc_id: str) -> Set[str]:
+        """Chunks canoniques encore indexés dont le vecteur porte l'identifiant du document"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT chunk_id FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall()
+        return {row["chunk_id"] for row in rows}
+
+    def sources(self, chunk_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Documents contenant chaque chunk canonique (un chunk sans doublon a une seule source)"""
+        result: Dict[str, List[Dict]] = {}
+        with closing(self._connect()) as conn:
+            for batch in _batches(sorted(set(chunk_ids))):
+                rows = conn.execute(
+                    f"SELECT chunk_id, doc_id, title, page FROM sources "
+                    f"WHERE chunk_id IN ({','.join('?' * len(batch))}) ORDER BY doc_id, position", batch
+                ).fetchall()
+                for row in rows:
+                    sources = result.setdefault(row["chunk_id"], [])
+                    if not any(source["doc_id"] == row["doc_id"] for source in sources):
+                        sources.append({"doc_id": row["doc_id"], "title": row["title"], "page": row["page"]})
+        return result
+
+    def canonical_documents(self, doc_ids: List[str]) -> Set[str]:
+        """Documents propriétaires des vecteurs qui portent les chunks des documents donnés"""
+        owners: Set[str] = set()
+        with closing(self._connect()) as conn:
+            for batch in _batches(sorted(set(doc_ids))):
+                rows = conn.execute(
+                    f"SELECT DISTINCT c.doc_id FROM sources s JOIN chunks c ON c.chunk_id = s.chunk_id "
+                    f"WHERE s.doc_id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                owners.update(row["doc_id"] for row in rows)
+        return owners
+
+    def stats(self) -> Dict:
+        """Chunks vectorisés et embeddings évités (total et documents les plus dupliqués)"""
+        with closing(self._connect()) as conn:
+            totals = conn.execute(
+                "SELECT COUNT(*) AS documents, COALESCE(SUM(chunks), 0) AS chunks, "
+                "COALESCE(SUM(duplicates), 0) AS duplicates FROM documents"
+            ).fetchone()
+            top = conn.execute(
+                "SELECT doc_id, chunks, duplicates FROM documents WHERE duplicates > 0 "
+                "ORDER BY duplicates DESC LIMIT 10"
+            ).fetchall()
+            vectors = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {
+            "documents": totals["documents"],
+            "chunks": totals["chunks"],
+            "vectors": vectors,
+            "embeddings_avoided": totals["duplicates"],
+            "top_documents": [dict(row) for row in top],
+        }
+
+    def reset(self):
+        """Vide l'index (à faire si la base vectorielle est reconstruite)"""
+        with closing(self._connect()) as conn:
+            for table in ("chunks", "bands", "sources", "documents"):
+                conn.execute(f"DELETE FROM {table}")
+
+_INDEXES: Dict[str, NearDuplicateIndex] = {}
+_INDEX_LOCK = threading.Lock()
+
+def near_duplicate_path() -> str:
+    """Base des quasi-doublons de l'index servi (ou de la génération d'index en construction)"""
+    from utils.index_generations import generation_paths
+    paths = generation_paths()
+    return paths["near_duplicates"] if paths else NEAR_DUPLICATE_PATH
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """Instance partagée de l'index des quasi-doublons (une par génération d'index)"""
+    path = near_duplicate_path()
+    if path not in _INDEXES:
+        with _INDEX_LOCK:
+            if path not in _INDEXES:
+                _INDEXES[path] = NearDuplicateIndex(path)
+    return _INDEXES[path]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index des chunks quasi dupliqués")
+    parser.add_argument('--stats', action='store_true', help='Afficher les embeddings évités')
+    parser.add_argument('--reset', action='store_true', help="Vider l'index (après reconstruction de la base vectorielle)")
+    args = parser.parse_args()
+
+    index = get_near_duplicate_index()
+    if args.reset:
+        index.reset()
+        print("Index des quasi-doublons vidé")
+    if args.stats or not args.reset:
+        stats = index.stats()
+        print(f"{stats['documents']} documents, {stats['chunks']} chunks, {stats['vectors']} vectorisés, "
+              f"{stats['embeddings_avoided']} embeddings évités")
+        for doc in stats["top_documents"]:
+            print(f"  {doc['doc_id']}: {doc['duplicates']}/{doc['chunks']} chunks dupliqués")
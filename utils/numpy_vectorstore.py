@@ -0,0 +1,242 @@
+import os
+import json
+import uuid
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain.vectorstores.base import VectorStore
+
+from utils.vectorstores import matches_filter, metadata_mask
+
+class NumpyVectorStore(VectorStore):
+    """
+    Base vectorielle en mémoire à recherche exacte (force brute NumPy)
+
+    Adaptée aux petits corpus et aux tests : aucune dépendance native, résultats
+    exacts. Si persist_directory est fourni, l'index y est réécrit après chaque
+    ajout ou suppression (vectors.npy + docstore.json).
+
+    Les scores retournés sont des distances L2 au carré, comme Chroma (plus petit = plus proche).
+    """
+
+    def __init__(self, embedding_function, persist_directory: Optional[str] = None):
+        self._embedding = embedding_function
+        self.persist_directory = persist_directory
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._norms = None
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict] = []
+        # Colonnes de métadonnées extraites pour les filtres, valables pour une liste _metadatas donnée
+        self._filter_columns: Dict[str, Any] = {"metadatas": None, "columns": {}}
+        self._loaded_identity = None
+
+        if persist_directory:
+            os.makedirs(persist_directory, exist_ok=True)
+            self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    @property
+    def ids(self) -> List[str]:
+        """Identifiants des entrées de l'index"""
+        with self._lock:
+            self._refresh()
+            return list(self._ids)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _disk_identity(self) -> Optional[Tuple]:
+        """Identité du docstore sur disque (remplacé en dernier à chaque écriture, y compris d'un autre processus)"""
+        try:
+            stat = os.stat(self._path("docstore.json"))
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """Recharge l'index si un autre processus l'a modifié depuis la dernière lecture (appelé sous self._lock)"""
+        if self.persist_directory and self._disk_identity() != self._loaded_identity:
+            self._load()
+
+    def _load(self):
+        identity = self._disk_identity()
+        if identity is None:
+            return
+        with open(self._path("docstore.json"), 'r', encoding='utf-8') as f:
+            docstore = json.load(f)
+        vectors = np.load(self._path("vectors.npy")) if docstore["ids"] else None
+        if vectors is not None and len(vectors) != len(docstore["ids"]):
+            # Écriture d'un autre processus en cours (vecteurs déjà remplacés) : rechargé au prochain accès
+            return
+        self._ids = docstore["ids"]
+        self._texts = docstore["texts"]
+        self._metadatas = docstore["metadatas"]
+        self._vectors = vectors
+        self._norms = np.sum(vectors ** 2, axis=1) if vectors is not None else None
+        self._loaded_identity = identity
+
+    def _save(self):
+        if not self.persist_directory:
+            return
+        if self._vectors is not None:
+            np.save(self._path("vectors.tmp.npy"), self._vectors)
+            os.replace(self._path("vectors.tmp.npy"), self._path("vectors.npy"))
+        tmp_path = self._path("docstore.json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas}, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path("docstore.json"))
+        self._loaded_identity = self._disk_identity()
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """Ajoute des textes dont les embeddings sont déjà calculés"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if len(texts) == 0:
+            return []
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError("Les embeddings doivent former une matrice (nombre de textes, dimension)")
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        with self._lock:
+            self._refresh()
+            if self._vectors is None:
+                all_vectors = vectors
+            elif vectors.shape[1] != self._vectors.shape[1]:
+                raise ValueError(f"Dimension {vectors.shape[1]} incompatible avec l'index ({self._vectors.shape[1]})")
+            else:
+                all_vectors = np.vstack([self._vectors, vectors])
+
+            # Remplacer les références (et non modifier en place) : les recherches en cours
+            # continuent sur l'ancien état
+            self._vectors = all_vectors
+            self._norms = np.sum(all_vectors ** 2, axis=1)
+            self._ids = self._ids + list(ids)
+            self._texts = self._texts + list(texts)
+            self._metadatas = self._metadatas + list(metadatas)
+            self._save()
+
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        embeddings = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        targets = set(ids)
+        with self._lock:
+            self._refresh()
+            keep = [row for row, doc_id in enumerate(self._ids) if doc_id not in targets]
+            if len(keep) == len(self._ids):
+                return True
+            self._vectors = self._vectors[keep] if keep else None
+            self._norms = self._norms[keep] if keep else None
+            self._ids = [self._ids[row] for row in keep]
+            self._texts = [self._texts[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._save()
+        return True
+
+    def get(self, where: Optional[Dict] = None, **kwargs: Any) -> Dict[str, List]:
+        """Identifiants et métadonnées des entrées qui satisfont le filtre where (comme Chroma.get)"""
+        with self._lock:
+            self._refresh()
+            rows = [row for row, metadata in enumerate(self._metadatas) if matches_filter(metadata, where)]
+            return {"ids": [self._ids[row] for row in rows], "metadatas": [self._metadatas[row] for row in rows]}
+
+    def _columns_for(self, metadatas: List[Dict]) -> Dict[str, Any]:
+        """Cache des colonnes de filtre (les ajouts et suppressions remplacent la liste _metadatas)"""
+        with self._lock:
+            if self._filter_columns["metadatas"] is not metadatas:
+                self._filter_columns = {"metadatas": metadatas, "columns": {}}
+            return self._filter_columns["columns"]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        with self._lock:
+            self._refresh()
+            vectors, norms = self._vectors, self._norms
+            texts, metadatas = self._texts, self._metadatas
+        if vectors is None or k <= 0:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        distances = norms - 2 * (vectors @ query) + np.dot(query, query)
+
+        if filter:
+            allowed = metadata_mask(metadatas, filter, self._columns_for(metadatas))
+            distances = np.where(allowed, distances, np.inf)
+            available = int(allowed.sum())
+        else:
+            available = len(distances)
+        if available == 0:
+            return []
+
+        k = min(k, available)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+
+        return [
+            (Document(page_content=texts[row], metadata=dict(metadatas[row])), float(max(distances[row], 0.0)))
+            for row in top
+        ]
+
+    def similarity_search_with_score_by_vectors(self, embeddings: List[List[float]], k: int = 4,
+                                                filter: Optional[Dict] = None,
+                                                **kwargs: Any) -> List[List[Tuple[Document, float]]]:
+        """Recherche groupée : un seul produit matriciel pour toutes les requêtes"""
+        if filter:
+            return [self.similarity_search_with_score_by_vector(e, k=k, filter=filter) for e in embeddings]
+
+        with self._lock:
+            self._refresh()
+            vectors, norms = self._vectors, self._norms
+            texts, metadatas = self._texts, self._metadatas
+        if vectors is None or k <= 0:
+            return [[] for _ in embeddings]
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        distances = norms[None, :] - 2 * (queries @ vectors.T) + np.sum(queries ** 2, axis=1)[:, None]
+        k = min(k, len(norms))
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+        results = []
+        for i, rows in enumerate(top):
+            rows = rows[np.argsort(distances[i, rows])]
+            results.append([
+                (Document(page_content=texts[row], metadata=dict(metadatas[row])), float(max(distances[i, row], 0.0)))
+                for row in rows
+            ])
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = self._embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding, metadatas: Optional[List[dict]] = None,
+                   persist_directory: Optional[str] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding_function=embedding, persist_directory=persist_directory)
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        return store
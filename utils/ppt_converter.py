@@ -1,98 +1,377 @@
 import os
+import atexit
+import shutil
+import socket
 import tempfile
+import threading
 import subprocess
+import queue
 from pathlib import Path
 import re
 import time
 
+from config import SOFFICE_POOL_SIZE, SOFFICE_TIMEOUT
+
+# Filtre LibreOffice pour l'export en .pptx
+_PPTX_EXPORT_FILTER = "Impress MS PowerPoint 2007 XML"
+
 def clean_text(text):
     """Nettoie le texte extrait."""
     # Supprimer les caractères spéciaux et les retours à la ligne multiples
+    # ('|' est conservé : il sépare les cellules des tableaux, voir _iter_shape_texts)
     text = re.sub(r'\n{3,}', '\n\n', text)
-    text = re.sub(r'[^\w\s.,;:!?()-]', '', text)
+    text = re.sub(r'[^\w\s.,;:!?()|-]', '', text)
     return text
 
+def _iter_shape_texts(shapes):
+    """Parcourt récursivement les formes d'une slide et retourne leurs textes (groupes et tableaux inclus)."""
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from _iter_shape_texts(shape.shapes)
+        elif getattr(shape, "has_table", False) and shape.has_table:
+            rows = []
+            for row in shape.table.rows:
+                cells = [cell.text.strip() for cell in row.cells]
+                rows.append(" | ".join(cells))
+            if rows:
+                yield "\n".join(rows)
+        elif getattr(shape, "has_text_frame", False) and shape.has_text_frame:
+            if shape.text_frame.text.strip():
+                yield shape.text_frame.text
+
+def extract_slides_from_pptx(file_path):
+    """
+    Extrait le contenu d'un fichier .pptx slide par slide, directement en Python
+
+    Args:
+        file_path: Chemin du fichier .pptx
+
+    Returns:
+        Liste de dictionnaires (numéro, titre, texte, notes) pour chaque slide
+    """
+    import pptx
+
+    presentation = pptx.Presentation(file_path)
+    slides = []
+
+    for number, slide in enumerate(presentation.slides, start=1):
+        title = ""
+        if slide.shapes.title is not None and slide.shapes.title.has_text_frame:
+            title = slide.shapes.title.text_frame.text.strip()
+
+        notes = ""
+        if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+            notes = slide.notes_slide.notes_text_frame.text.strip()
+
+        slides.append({
+            "slide_number": number,
+            "slide_title": title,
+            "text": "\n\n".join(_iter_shape_texts(slide.shapes)),
+            "notes": notes
+        })
+
+    return slides
+
+def _free_port():
+    """Réserve un port TCP libre sur l'interface locale"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class _SofficeWorker:
+    """Processus LibreOffice persistant piloté via UNO"""
+
+    def __init__(self):
+        self.port = _free_port()
+        self.profile_dir = tempfile.mkdtemp(prefix="soffice_profile_")
+        self.process = subprocess.Popen(
+            [
+                'soffice', '--headless', '--invisible', '--nologo', '--norestore',
+                f'-env:UserInstallation={Path(self.profile_dir).as_uri()}',
+                f'--accept=socket,host=127.0.0.1,port={self.port};urp;'
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self.desktop = self._connect()
+
+    def _connect(self, timeout=30):
+        """Se connecte au processus LibreOffice une fois qu'il écoute"""
+        import uno
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+        url = f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+
+        start_time = time.time()
+        while True:
+            try:
+                context = resolver.resolve(url)
+                return context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+            except Exception:
+                if self.process.poll() is not None or time.time() - start_time > timeout:
+                    self.close()
+                    raise RuntimeError("Impossible de se connecter au processus LibreOffice")
+                time.sleep(0.2)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def ping(self, timeout=5):
+        """
+        Vérifie que le processus répond encore via UNO (un processus vivant peut avoir perdu son pont)
+
+        Au-delà de timeout secondes, le processus est tué et considéré comme mort.
+        """
+        if not self.alive():
+            return False
+        watchdog = threading.Timer(timeout, self.process.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            self.desktop.getFrames()
+            return True
+        except Exception:
+            return False
+        finally:
+            watchdog.cancel()
+
+    def convert_to_pptx(self, file_path, output_path, timeout=SOFFICE_TIMEOUT):
+        """
+        Convertit un fichier .ppt en .pptx dans le processus persistant
+
+        Au-delà de timeout secondes, le processus LibreOffice est tué : l'appel UNO bloqué échoue
+        et le pool remplace le worker mort à la prochaine conversion.
+        """
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def prop(name, value):
+            p = PropertyValue()
+            p.Name = name
+            p.Value = value
+            return p
+
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            self.process.kill()
+
+        watchdog = threading.Timer(timeout, expire)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            document = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(file_path)), "_blank", 0, (prop("Hidden", True),)
+            )
+            try:
+                document.storeToURL(
+                    uno.systemPathToFileUrl(os.path.abspath(output_path)),
+                    (prop("FilterName", _PPTX_EXPORT_FILTER),)
+                )
+            finally:
+                document.close(True)
+        except Exception as e:
+            if expired.is_set():
+                raise TimeoutError(f"Conversion LibreOffice interrompue après {timeout} s: {file_path}") from e
+            raise
+        finally:
+            watchdog.cancel()
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+class SofficeConverterPool:
+    """
+    Pool de processus LibreOffice persistants pour convertir les anciens fichiers .ppt
+
+    Les processus sont démarrés à la demande puis réutilisés entre les fichiers ; une conversion
+    qui dépasse SOFFICE_TIMEOUT tue son processus, remplacé à la conversion suivante.
+
+    Le pool nécessite le pont UNO (module uno, fourni avec le Python de LibreOffice ou le paquet
+    python3-uno). Sans lui, chaque fichier est converti par un processus 'soffice --convert-to'
+    distinct, démarré puis arrêté à chaque conversion (plusieurs secondes par fichier) :
+    installer le pont UNO pour les imports volumineux de .ppt.
+    """
+
+    def __init__(self, size=SOFFICE_POOL_SIZE):
+        self.size = max(1, size)
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._workers = []
+        self._cli_fallback_reported = False
+
+    def _acquire(self):
+        """Retourne un worker qui répond : un worker inactif mort entre-temps est remplacé"""
+        deadline = time.monotonic() + SOFFICE_TIMEOUT
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    if self._created < self.size:
+                        self._created += 1
+                        try:
+                            worker = _SofficeWorker()
+                        except Exception:
+                            self._created -= 1
+                            raise
+                        self._workers.append(worker)
+                        return worker
+                worker = self._idle.get(timeout=max(0, deadline - time.monotonic()))
+
+            if worker.ping():
+                return worker
+            self._discard(worker)
+
+    def _release(self, worker):
+        if worker.alive():
+            self._idle.put(worker)
+            return
+        self._discard(worker)
+
+    def _discard(self, worker):
+        """Processus mort : libérer sa place dans le pool"""
+        with self._lock:
+            self._created -= 1
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.close()
+
+    def convert_to_pptx(self, file_path, output_dir):
+        """
+        Convertit un fichier .ppt en .pptx
+
+        Args:
+            file_path: Chemin du fichier .ppt
+            output_dir: Répertoire de sortie
+
+        Returns:
+            Chemin du fichier .pptx produit
+        """
+        name_without_ext = os.path.splitext(os.path.basename(file_path))[0]
+        output_path = os.path.join(output_dir, f"{name_without_ext}.pptx")
+
+        try:
+            import uno  # noqa: F401 - disponible uniquement avec le Python de LibreOffice
+        except ImportError:
+            if not self._cli_fallback_reported:
+                self._cli_fallback_reported = True
+                print("⚠️ Module uno indisponible : conversion .ppt par un processus LibreOffice par fichier "
+                      "(installer python3-uno pour réutiliser les processus)")
+            return self._convert_with_cli(file_path, output_dir, output_path)
+
+        worker = self._acquire()
+        try:
+            worker.convert_to_pptx(file_path, output_path)
+        finally:
+            self._release(worker)
+        return output_path
+
+    def _convert_with_cli(self, file_path, output_dir, output_path):
+        """Conversion de secours via 'soffice --convert-to' (un processus par fichier)"""
+        cmd = ['soffice', '--headless', '--convert-to', 'pptx', file_path, '--outdir', output_dir]
+        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=SOFFICE_TIMEOUT)
+
+        if process.returncode != 0 or not os.path.exists(output_path):
+            raise Exception(f"Erreur lors de la conversion du fichier: {process.stderr.decode('utf-8', errors='ignore')}")
+        return output_path
+
+    def close(self):
+        """Arrête tous les processus LibreOffice du pool"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._created = 0
+        for worker in workers:
+            worker.close()
+
+_CONVERTER_POOL = None
+_CONVERTER_POOL_LOCK = threading.Lock()
+
+def get_converter_pool():
+    """Retourne le pool de conversion LibreOffice partagé"""
+    global _CONVERTER_POOL
+
+    with _CONVERTER_POOL_LOCK:
+        if _CONVERTER_POOL is None:
+            _CONVERTER_POOL = SofficeConverterPool()
+            atexit.register(_CONVERTER_POOL.close)
+        return _CONVERTER_POOL
+
+def extract_slides(file_path):
+    """
+    Extrait les slides d'un fichier PowerPoint (.pptx ou .ppt)
+
+    Les .pptx sont lus directement ; les .ppt sont d'abord convertis en .pptx
+    par le pool LibreOffice.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Le fichier {file_path} n'existe pas.")
+
+    if os.path.splitext(file_path)[1].lower() != '.ppt':
+        return extract_slides_from_pptx(file_path)
+
+    output_dir = tempfile.mkdtemp(prefix="ppt_conversion_")
+    try:
+        converted_file = get_converter_pool().convert_to_pptx(file_path, output_dir)
+        return extract_slides_from_pptx(converted_file)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def _format_slide(slide):
+    """Assemble le texte d'une slide et ses notes"""
+    parts = [slide["text"]] if slide["text"] else []
+    if slide["notes"]:
+        parts.append(f"Notes: {slide['notes']}")
+    return "\n\n".join(parts)
+
 def extract_text_from_pptx(file_path):
     """Extrait le texte d'un fichier PowerPoint (.pptx ou .ppt)."""
     try:
-        # Vérifier que le fichier existe
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Le fichier {file_path} n'existe pas.")
-        
-        # Créer un fichier temporaire pour la sortie
-        with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as tmp_file:
-            output_file = tmp_file.name
-        
-        # Utiliser un outil externe comme LibreOffice pour convertir PPT en texte
-        # Cette approche nécessite que LibreOffice soit installé
-        try:
-            cmd = ['soffice', '--headless', '--convert-to', 'txt', file_path, '--outdir', os.path.dirname(output_file)]
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            stdout, stderr = process.communicate()
-            
-            # Attendre la fin de la conversion
-            if process.returncode != 0:
-                raise Exception(f"Erreur lors de la conversion du fichier: {stderr.decode('utf-8')}")
-            
-            # Trouver le fichier de sortie
-            base_name = os.path.basename(file_path)
-            name_without_ext = os.path.splitext(base_name)[0]
-            converted_file = os.path.join(os.path.dirname(output_file), f"{name_without_ext}.txt")
-            
-            # Attendre que le fichier soit créé
-            timeout = 10  # secondes
-            start_time = time.time()
-            while not os.path.exists(converted_file) and time.time() - start_time < timeout:
-                time.sleep(0.5)
-            
-            if not os.path.exists(converted_file):
-                raise FileNotFoundError(f"Le fichier converti n'a pas été trouvé après {timeout} secondes.")
-            
-            # Lire le contenu du fichier
-            with open(converted_file, 'r', encoding='utf-8', errors='ignore') as f:
-                text = f.read()
-            
-            # Nettoyer le texte
-            text = clean_text(text)
-            
-            # Supprimer les fichiers temporaires
-            if os.path.exists(converted_file):
-                os.remove(converted_file)
-            if os.path.exists(output_file):
-                os.remove(output_file)
-            
-            return text
-            
-        except (FileNotFoundError, Exception):
-            # Utiliser une approche alternative avec python-pptx
-            import pptx
-            presentation = pptx.Presentation(file_path)
-            text_list = []
-            
-            # Extraire le texte de chaque slide
-            for slide in presentation.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text_list.append(shape.text)
-            
-            text = "\n\n".join(text_list)
-            return clean_text(text)
-    
+        slides = extract_slides(file_path)
+        text = "\n\n".join(_format_slide(slide) for slide in slides)
+        return clean_text(text)
     except Exception as e:
         print(f"Erreur lors de l'extraction du texte du fichier PPT: {str(e)}")
         return ""
 
 class PPTXTextLoader:
     """Chargeur personnalisé pour les fichiers PowerPoint."""
-    
+
     def __init__(self, file_path):
         self.file_path = file_path
-        
+
     def load(self):
-        """Charge le contenu du fichier PowerPoint comme un document LangChain."""
+        """Charge le contenu du fichier PowerPoint, un document LangChain par slide."""
         from langchain.schema import Document
-        
-        text = extract_text_from_pptx(self.file_path)
-        metadata = {"source": self.file_path}
-        
-        return [Document(page_content=text, metadata=metadata)]
+
+        # Les erreurs d'extraction sont propagées : la file d'indexation réessaie avec backoff,
+        # et rien n'est mis en cache
+        slides = extract_slides(self.file_path)
+
+        documents = []
+        for slide in slides:
+            text = clean_text(_format_slide(slide))
+            if not text.strip():
+                continue
+            metadata = {
+                "source": self.file_path,
+                "slide_number": slide["slide_number"],
+                "slide_title": slide["slide_title"],
+                "has_notes": bool(slide["notes"])
+            }
+            documents.append(Document(page_content=text, metadata=metadata))
+
+        return documents
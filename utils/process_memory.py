@@ -0,0 +1,11 @@
+import os
+
+# Module sans dépendance au projet : importable par les benchmarks avant la configuration de l'environnement
+
+def rss_bytes() -> int:
+    """Mémoire résidente du processus (Linux), 0 si indisponible"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
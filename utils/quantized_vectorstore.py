@@ -0,0 +1,516 @@
+import os
+import json
+import uuid
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain.vectorstores.base import VectorStore
+
+from utils.vectorstores import matches_filter, metadata_mask
+
+# Nombre de lignes traitées par bloc lors du parcours des codes
+_SCAN_BLOCK_SIZE = 65536
+# Nombre d'itérations du k-means d'apprentissage des codebooks PQ
+_KMEANS_ITERATIONS = 15
+
+QUANTIZATION_INT8 = "int8"
+QUANTIZATION_PQ = "pq"
+
+def train_pq_codebooks(vectors: np.ndarray, n_subvectors: int, n_centroids: int = 256,
+                       max_samples: int = 20000, seed: int = 0) -> np.ndarray:
+    """
+    Apprend les codebooks d'une quantification produit (k-means par sous-espace)
+
+    Returns:
+        Tableau (n_subvectors, n_centroids, dim // n_subvectors)
+    """
+    n, dim = vectors.shape
+    if dim % n_subvectors != 0:
+        raise ValueError(f"La dimension {dim} n'est pas divisible par {n_subvectors} sous-vecteurs")
+
+    rng = np.random.default_rng(seed)
+    if n > max_samples:
+        vectors = vectors[np.sort(rng.choice(n, max_samples, replace=False))]
+    sample = np.asarray(vectors, dtype=np.float32)
+    n_centroids = min(n_centroids, len(sample))
+    sub_dim = dim // n_subvectors
+
+    codebooks = np.empty((n_subvectors, n_centroids, sub_dim), dtype=np.float32)
+    for m in range(n_subvectors):
+        sub = sample[:, m * sub_dim:(m + 1) * sub_dim]
+        centroids = sub[rng.choice(len(sub), n_centroids, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            assignments = _nearest_centroids(sub, centroids)
+            for c in range(n_centroids):
+                members = sub[assignments == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+        codebooks[m] = centroids
+    return codebooks
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Indice du centroïde le plus proche (distance L2) pour chaque vecteur"""
+    distances = (
+        np.sum(vectors ** 2, axis=1, keepdims=True)
+        - 2 * vectors @ centroids.T
+        + np.sum(centroids ** 2, axis=1)
+    )
+    return np.argmin(distances, axis=1)
+
+def encode_pq(vectors: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """Encode des vecteurs avec des codebooks PQ (un octet par sous-vecteur)"""
+    n_subvectors, _, sub_dim = codebooks.shape
+    codes = np.empty((len(vectors), n_subvectors), dtype=np.uint8)
+    for m in range(n_subvectors):
+        sub = np.asarray(vectors[:, m * sub_dim:(m + 1) * sub_dim], dtype=np.float32)
+        codes[:, m] = _nearest_centroids(sub, codebooks[m])
+    return codes
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantification scalaire symétrique int8, avec un facteur d'échelle par vecteur"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+class QuantizedVectorStore(VectorStore):
+    """
+    Base vectorielle locale compacte, stockée dans des fichiers mappés en mémoire
+
+    Les embeddings sont conservés en float32 sur disque (vectors.f32) et sous forme
+    quantifiée (int8 ou quantification produit). La recherche parcourt les codes
+    quantifiés, puis recalcule la distance exacte pour les meilleurs candidats
+    (rescore_factor * k) en lisant uniquement leurs lignes float32.
+
+    Avec ivf_lists > 0, les vecteurs sont en outre répartis en listes par un k-means
+    grossier (index IVF) : seules les ivf_probes listes les plus proches de la requête
+    sont parcourues, ce qui en fait une recherche approchée (ANN) sous-linéaire.
+
+    Les scores retournés sont des distances L2 au carré, comme Chroma (plus petit = plus proche).
+    """
+
+    def __init__(self, persist_directory: str, embedding_function, quantization: str = QUANTIZATION_INT8,
+                 pq_subvectors: int = 48, pq_train_size: int = 1024, rescore_factor: int = 4,
+                 ivf_lists: int = 0, ivf_probes: int = 8):
+        if quantization not in (QUANTIZATION_INT8, QUANTIZATION_PQ):
+            raise ValueError(f"Quantification inconnue: {quantization}")
+
+        self.persist_directory = persist_directory
+        self._embedding = embedding_function
+        self.quantization = quantization
+        self.pq_subvectors = pq_subvectors
+        self.pq_train_size = pq_train_size
+        self.rescore_factor = max(1, rescore_factor)
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = max(1, ivf_probes)
+        self._lock = threading.RLock()
+
+        os.makedirs(persist_directory, exist_ok=True)
+        self._manifest_path = os.path.join(persist_directory, "manifest.json")
+        self._docstore_path = os.path.join(persist_directory, "docstore.jsonl")
+
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    # ------------------------------------------------------------------
+    # Stockage
+    # ------------------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _disk_identity(self) -> Tuple:
+        """Identité du manifeste et du docstore sur disque (changée par toute écriture, y compris d'un autre processus)"""
+        identity = []
+        for path in (self._manifest_path, self._docstore_path):
+            try:
+                stat = os.stat(path)
+                identity.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                identity.append(None)
+        return tuple(identity)
+
+    def _refresh(self):
+        """Recharge l'index si un autre processus l'a modifié depuis la dernière lecture (appelé sous self._lock)"""
+        if self._disk_identity() != self._loaded_identity:
+            self._load()
+
+    def _load(self):
+        # Identité relevée avant la lecture : une écriture concurrente provoquera un nouveau rechargement
+        self._loaded_identity = self._disk_identity()
+        self.dim = None
+        self.count = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict] = []
+        # Colonnes de métadonnées extraites pour les filtres (reconstruites quand des entrées sont ajoutées)
+        self._filter_columns: Dict[str, Any] = {}
+        self._deleted = set()
+        self._codebooks = None
+        self._ivf_centroids = None
+
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest["quantization"] != self.quantization:
+                raise ValueError(
+                    f"Index créé avec la quantification '{manifest['quantization']}', "
+                    f"'{self.quantization}' demandée"
+                )
+            self.dim = manifest["dim"]
+            self.count = manifest["count"]
+            self.pq_subvectors = manifest.get("pq_subvectors", self.pq_subvectors)
+
+        if os.path.exists(self._docstore_path):
+            records = {}
+            with open(self._docstore_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("deleted"):
+                        self._deleted.add(record["row"])
+                    elif record["row"] < self.count:
+                        # Une ligne réécrite après une écriture interrompue remplace l'ancienne
+                        records[record["row"]] = record
+            for row in range(self.count):
+                self._ids.append(records[row]["id"])
+                self._texts.append(records[row]["text"])
+                self._metadatas.append(records[row]["metadata"])
+
+        if os.path.exists(self._path("pq_codebooks.npy")):
+            self._codebooks = np.load(self._path("pq_codebooks.npy"))
+        if os.path.exists(self._path("ivf_centroids.npy")):
+            self._ivf_centroids = np.load(self._path("ivf_centroids.npy"))
+
+        self._open_memmaps()
+
+    def _memmap(self, name: str, dtype, width: Optional[int]):
+        if self.count == 0 or not os.path.exists(self._path(name)):
+            return None
+        shape = (self.count, width) if width else (self.count,)
+        return np.memmap(self._path(name), dtype=dtype, mode='r', shape=shape)
+
+    def _open_memmaps(self):
+        self._vectors = self._memmap("vectors.f32", np.float32, self.dim)
+        self._norms = self._memmap("norms.f32", np.float32, None)
+        if self.quantization == QUANTIZATION_INT8:
+            self._codes = self._memmap("codes.i8", np.int8, self.dim)
+            self._scales = self._memmap("scales.f32", np.float32, None)
+        else:
+            self._codes = self._memmap("codes.pq", np.uint8, self.pq_subvectors) if self._codebooks is not None else None
+            self._scales = None
+        self._ivf_assignments = self._memmap("ivf_lists.i32", np.int32, None) if self._ivf_centroids is not None else None
+
+    def _write_manifest(self):
+        manifest = {
+            "version": 1,
+            "dim": self.dim,
+            "count": self.count,
+            "quantization": self.quantization,
+            "pq_subvectors": self.pq_subvectors
+        }
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _append(self, name: str, array: np.ndarray):
+        """Écrit des lignes à la suite des self.count lignes validées par le manifeste"""
+        array = np.ascontiguousarray(array)
+        offset = self.count * (array.nbytes // len(array))
+        path = self._path(name)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            # Écraser les octets d'une écriture interrompue
+            f.seek(offset)
+            f.truncate()
+            f.write(array.tobytes())
+
+    def _train_pq(self):
+        """Apprend les codebooks PQ sur les vecteurs existants et encode tout l'index"""
+        vectors = self._vectors
+        self._codebooks = train_pq_codebooks(np.asarray(vectors), self.pq_subvectors)
+
+        with open(self._path("codes.pq"), 'wb') as f:
+            for start in range(0, self.count, _SCAN_BLOCK_SIZE):
+                f.write(encode_pq(vectors[start:start + _SCAN_BLOCK_SIZE], self._codebooks).tobytes())
+        np.save(self._path("pq_codebooks.npy"), self._codebooks)
+
+    def _train_ivf(self):
+        """Apprend les centroïdes IVF et affecte chaque vecteur existant à une liste"""
+        vectors = self._vectors
+        self._ivf_centroids = train_pq_codebooks(np.asarray(vectors), 1, n_centroids=self.ivf_lists)[0]
+
+        with open(self._path("ivf_lists.i32"), 'wb') as f:
+            for start in range(0, self.count, _SCAN_BLOCK_SIZE):
+                block = np.asarray(vectors[start:start + _SCAN_BLOCK_SIZE])
+                f.write(_nearest_centroids(block, self._ivf_centroids).astype(np.int32).tobytes())
+        np.save(self._path("ivf_centroids.npy"), self._ivf_centroids)
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """Ajoute des textes dont les embeddings sont déjà calculés"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError("Les embeddings doivent former une matrice (nombre de textes, dimension)")
+        if len(vectors) == 0:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        with self._lock:
+            self._refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Dimension {vectors.shape[1]} incompatible avec l'index ({self.dim})")
+
+            self._append("vectors.f32", vectors)
+            self._append("norms.f32", np.sum(vectors ** 2, axis=1).astype(np.float32))
+            if self.quantization == QUANTIZATION_INT8:
+                codes, scales = quantize_int8(vectors)
+                self._append("codes.i8", codes)
+                self._append("scales.f32", scales)
+            elif self._codebooks is not None:
+                self._append("codes.pq", encode_pq(vectors, self._codebooks))
+            if self._ivf_centroids is not None:
+                self._append("ivf_lists.i32", _nearest_centroids(vectors, self._ivf_centroids).astype(np.int32))
+
+            with open(self._docstore_path, 'a', encoding='utf-8') as f:
+                for row, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas), start=self.count):
+                    record = {"row": row, "id": doc_id, "text": text, "metadata": metadata}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+            self.count += len(texts)
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metadatas.extend(metadatas)
+            self._open_memmaps()
+
+            trained = False
+            if (self.quantization == QUANTIZATION_PQ and self._codebooks is None
+                    and self.count >= self.pq_train_size):
+                self._train_pq()
+                trained = True
+            if (self.ivf_lists > 0 and self._ivf_centroids is None
+                    and self.count >= max(self.pq_train_size, 4 * self.ivf_lists)):
+                self._train_ivf()
+                trained = True
+            if trained:
+                self._open_memmaps()
+
+            # Le manifeste est écrit en dernier : il rend les nouvelles lignes visibles
+            self._write_manifest()
+            self._loaded_identity = self._disk_identity()
+
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        embeddings = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Supprime logiquement des entrées (elles sont ignorées lors des recherches)"""
+        if not ids:
+            return False
+        targets = set(ids)
+        with self._lock:
+            self._refresh()
+            rows = [row for row, doc_id in enumerate(self._ids) if doc_id in targets and row not in self._deleted]
+            with open(self._docstore_path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps({"deleted": True, "row": row}) + "\n")
+            self._deleted = self._deleted | set(rows)
+            self._loaded_identity = self._disk_identity()
+        return True
+
+    def get(self, where: Optional[Dict] = None, **kwargs: Any) -> Dict[str, List]:
+        """Identifiants et métadonnées des entrées non supprimées qui satisfont le filtre where (comme Chroma.get)"""
+        with self._lock:
+            self._refresh()
+            rows = [row for row, metadata in enumerate(self._metadatas)
+                    if row not in self._deleted and matches_filter(metadata, where)]
+            return {"ids": [self._ids[row] for row in rows], "metadatas": [self._metadatas[row] for row in rows]}
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def _snapshot(self) -> Dict:
+        """État cohérent de l'index, lu sans bloquer les recherches concurrentes"""
+        with self._lock:
+            self._refresh()
+            return {
+                "count": self.count,
+                "vectors": self._vectors,
+                "norms": self._norms,
+                "codes": self._codes,
+                "scales": self._scales,
+                "codebooks": self._codebooks,
+                "ivf_centroids": self._ivf_centroids,
+                "ivf_assignments": self._ivf_assignments,
+                "deleted": self._deleted,
+                # Listes remplacées (et non modifiées) lors d'un rechargement
+                "texts": self._texts,
+                "metadatas": self._metadatas,
+                "filter_columns": self._filter_columns
+            }
+
+    def _approximate_scores(self, snapshot: Dict, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Produit scalaire approché entre la requête et les lignes demandées (toutes si rows est None)"""
+        total = snapshot["count"] if rows is None else len(rows)
+        scores = np.empty(total, dtype=np.float32)
+        codes = snapshot["codes"]
+
+        table = None
+        if self.quantization == QUANTIZATION_PQ and codes is not None:
+            # Distance asymétrique : table des produits scalaires par sous-espace
+            n_subvectors, _, sub_dim = snapshot["codebooks"].shape
+            table = np.einsum('mkd,md->mk', snapshot["codebooks"], query.reshape(n_subvectors, sub_dim))
+            columns = np.arange(n_subvectors)
+
+        for start in range(0, total, _SCAN_BLOCK_SIZE):
+            end = min(start + _SCAN_BLOCK_SIZE, total)
+            selection = slice(start, end) if rows is None else rows[start:end]
+            if self.quantization == QUANTIZATION_INT8:
+                block = np.asarray(codes[selection], dtype=np.float32)
+                scores[start:end] = (block @ query) * snapshot["scales"][selection]
+            elif table is not None:
+                scores[start:end] = table[columns, np.asarray(codes[selection])].sum(axis=1)
+            else:
+                # Codebooks pas encore appris (petit index) : parcours exact
+                scores[start:end] = np.asarray(snapshot["vectors"][selection]) @ query
+
+        return scores
+
+    def _probed_rows(self, snapshot: Dict, query: np.ndarray) -> Optional[np.ndarray]:
+        """Lignes des listes IVF les plus proches de la requête, ou None sans index IVF"""
+        centroids = snapshot["ivf_centroids"]
+        if centroids is None:
+            return None
+        distances = np.sum(centroids ** 2, axis=1) - 2 * centroids @ query
+        probes = np.argsort(distances)[:self.ivf_probes]
+        return np.flatnonzero(np.isin(np.asarray(snapshot["ivf_assignments"]), probes))
+
+    def _allowed_rows(self, snapshot: Dict, filter: Optional[Dict]) -> Optional[np.ndarray]:
+        """Lignes admissibles (filtre et suppressions), ou None si toutes le sont"""
+        deleted = snapshot["deleted"]
+        if not filter and not deleted:
+            return None
+        mask = metadata_mask(snapshot["metadatas"][:snapshot["count"]], filter, snapshot["filter_columns"])
+        if deleted:
+            mask[[row for row in deleted if row < snapshot["count"]]] = False
+        return np.flatnonzero(mask)
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        snapshot = self._snapshot()
+        if snapshot["count"] == 0 or k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+
+        rows = self._probed_rows(snapshot, query)
+        allowed = self._allowed_rows(snapshot, filter)
+        if allowed is not None:
+            probed = rows
+            rows = allowed if probed is None else np.intersect1d(probed, allowed, assume_unique=True)
+            if probed is not None and len(rows) < k:
+                # Filtre trop sélectif pour les listes sondées : parcourir toutes les lignes admissibles
+                rows = allowed
+        if rows is not None and len(rows) == 0:
+            return []
+
+        # Distance L2 approchée : |q|² + |v|² - 2 q·v (|q|² est constant pour le classement)
+        approx = self._approximate_scores(snapshot, query, rows)
+        norms = snapshot["norms"][:snapshot["count"]] if rows is None else snapshot["norms"][rows]
+        approx_distances = np.asarray(norms) - 2 * approx
+
+        n_candidates = min(len(approx_distances), k * self.rescore_factor)
+        selected = np.argpartition(approx_distances, n_candidates - 1)[:n_candidates]
+        candidates = np.sort(selected if rows is None else rows[selected])
+
+        # Recalcul exact sur les vecteurs float32 des seuls candidats
+        exact = np.sum((np.asarray(snapshot["vectors"][candidates]) - query) ** 2, axis=1)
+        order = np.argsort(exact)[:k]
+
+        return [
+            (Document(page_content=snapshot["texts"][row], metadata=dict(snapshot["metadatas"][row])), float(exact[i]))
+            for i, row in ((i, int(candidates[i])) for i in order)
+        ]
+
+    def similarity_search_with_score_by_vectors(self, embeddings: List[List[float]], k: int = 4,
+                                                filter: Optional[Dict] = None,
+                                                **kwargs: Any) -> List[List[Tuple[Document, float]]]:
+        """
+        Recherche groupée : les codes int8 sont parcourus une seule fois pour toutes les requêtes
+
+        Avec un filtre, un index IVF ou des codes PQ, chaque requête est traitée séparément.
+        """
+        snapshot = self._snapshot()
+        if (filter or snapshot["deleted"] or snapshot["ivf_centroids"] is not None
+                or self.quantization != QUANTIZATION_INT8):
+            return [self.similarity_search_with_score_by_vector(e, k=k, filter=filter) for e in embeddings]
+
+        count = snapshot["count"]
+        if count == 0 or k <= 0:
+            return [[] for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32)
+
+        approx = np.empty((len(queries), count), dtype=np.float32)
+        for start in range(0, count, _SCAN_BLOCK_SIZE):
+            end = min(start + _SCAN_BLOCK_SIZE, count)
+            block = np.asarray(snapshot["codes"][start:end], dtype=np.float32)
+            approx[:, start:end] = (queries @ block.T) * snapshot["scales"][start:end]
+        approx_distances = np.asarray(snapshot["norms"][:count])[None, :] - 2 * approx
+
+        n_candidates = min(count, k * self.rescore_factor)
+        selected = np.argpartition(approx_distances, n_candidates - 1, axis=1)[:, :n_candidates]
+
+        results = []
+        for query, candidates in zip(queries, selected):
+            candidates = np.sort(candidates)
+            exact = np.sum((np.asarray(snapshot["vectors"][candidates]) - query) ** 2, axis=1)
+            results.append([
+                (Document(page_content=snapshot["texts"][int(candidates[i])],
+                          metadata=dict(snapshot["metadatas"][int(candidates[i])])), float(exact[i]))
+                for i in np.argsort(exact)[:k]
+            ])
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = self._embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding, metadatas: Optional[List[dict]] = None,
+                   persist_directory: Optional[str] = None, **kwargs: Any) -> "QuantizedVectorStore":
+        if persist_directory is None:
+            raise ValueError("persist_directory est requis pour QuantizedVectorStore")
+        ids = kwargs.pop("ids", None)
+        store = cls(persist_directory=persist_directory, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def storage_stats(self) -> Dict[str, int]:
+        """Taille sur disque et empreinte mémoire résidente des codes (octets)"""
+        disk = sum(
+            os.path.getsize(self._path(name)) for name in os.listdir(self.persist_directory)
+            if os.path.isfile(self._path(name))
+        )
+        codes = 0 if self._codes is None else self._codes.nbytes
+        return {"disk_bytes": disk, "code_bytes": codes, "count": self.count}
@@ -0,0 +1,251 @@
+import json
+import math
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from utils.deadline import check_deadline, remaining_time
+from utils.tracing import trace_span, record_tokens
+from config import AZURE_RATE_LIMITS, LLM_DEFAULT_RPM, LLM_DEFAULT_TPM
+
+# Classes de priorité (plus petit = servi en premier)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Estimation des tokens d'une réponse, ajustée après l'appel avec l'usage réel
+COMPLETION_TOKENS_ESTIMATE = 256
+
+_PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+@contextmanager
+def priority_scope(priority: int):
+    """Fixe la classe de priorité des appels Azure effectués dans ce bloc (ex: PRIORITY_BATCH pour l'indexation)"""
+    token = _PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+def current_priority() -> int:
+    return _PRIORITY.get()
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (environ 4 caractères par token)"""
+    return max(1, len(text) // 4)
+
+class TokenBucket:
+    """Seau à jetons : capacity jetons au plus, rechargés de capacity par minute (0 = illimité)"""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def refill(self, now: float):
+        if not self.unlimited:
+            self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Secondes avant de pouvoir consommer amount (une demande plus grande que le seau attend qu'il soit plein)"""
+        if self.unlimited:
+            return 0.0
+        needed = min(amount, self.per_minute) - self.level
+        return max(needed, 0.0) * 60 / self.per_minute
+
+class DeploymentRateLimiter:
+    """
+    Limiteur côté client d'un déploiement Azure OpenAI (requêtes et tokens par minute)
+
+    Les demandes en attente sont servies par priorité puis par ordre d'arrivée : une
+    requête interactive passe devant l'indexation en masse. Le limiteur s'ajuste aux
+    en-têtes x-ratelimit-remaining-* renvoyés par Azure et se met en pause après un 429.
+    """
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._condition = threading.Condition()
+        self._waiters: List = []
+        self._sequence = itertools.count()
+        self.stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                      "throttled": 0, "by_priority": {}}
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.paused_until - now, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def acquire(self, tokens: int, requests: int = 1, priority: Optional[int] = None) -> float:
+        """
+        Attend que le quota permette l'appel puis le réserve
+
+        Returns:
+            Le temps d'attente en secondes
+
+        Raises:
+            DeadlineExceeded: si l'échéance de la requête arrive avant que le quota ne le permette
+                (Cancelled si le travail est annulé pendant l'attente)
+        """
+        priority = current_priority() if priority is None else priority
+        entry = (priority, next(self._sequence))
+        start_time = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_time(tokens, now)
+                    if self._waiters[0] == entry and wait <= 0:
+                        break
+                    # Échéance passée ou travail annulé : renoncer au quota
+                    check_deadline(f"quota {self.name}")
+                    remaining = remaining_time()
+                    # Réveil au plus tard quand le quota est rechargé (ou quand la tête de file change)
+                    timeout = wait if self._waiters[0] == entry else None
+                    if remaining is not None:
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                    self._condition.wait(timeout)
+                heapq.heappop(self._waiters)
+                self.requests.level -= requests
+                self.tokens.level -= tokens
+            except BaseException:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                raise
+            finally:
+                self._condition.notify_all()
+
+            waited = time.monotonic() - start_time
+            self.stats["acquired"] += 1
+            self.stats["waited"] += waited > 0.001
+            self.stats["wait_seconds"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+            by_priority = self.stats["by_priority"].setdefault(priority, {"acquired": 0, "wait_seconds": 0.0})
+            by_priority["acquired"] += 1
+            by_priority["wait_seconds"] += waited
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Corrige la réservation avec l'usage réel renvoyé par l'API"""
+        if actual_tokens is None:
+            return
+        with self._condition:
+            self.tokens.level += estimated_tokens - actual_tokens
+            self._condition.notify_all()
+
+    def observe_headers(self, headers: Optional[Dict[str, str]]):
+        """Aligne les seaux sur le quota restant annoncé par Azure (x-ratelimit-remaining-*)"""
+        if not headers:
+            return
+        headers = {key.lower(): value for key, value in dict(headers).items()}
+        with self._condition:
+            for header, bucket in (("x-ratelimit-remaining-requests", self.requests),
+                                   ("x-ratelimit-remaining-tokens", self.tokens)):
+                try:
+                    remaining = float(headers[header])
+                except (KeyError, ValueError):
+                    continue
+                if not bucket.unlimited:
+                    bucket.level = min(bucket.level, remaining)
+                elif remaining <= 0:
+                    # Quota inconnu mais épuisé : courte pause plutôt qu'une rafale de 429
+                    self.paused_until = max(self.paused_until, time.monotonic() + 1.0)
+
+    def observe_throttle(self, retry_after: Optional[float]):
+        """Après un 429 : suspendre tous les appels au déploiement pendant le délai demandé"""
+        with self._condition:
+            self.stats["throttled"] += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + (retry_after or 1.0))
+            self.requests.level = min(self.requests.level, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._condition:
+            depth_by_priority = {}
+            for priority, _ in self._waiters:
+                depth_by_priority[priority] = depth_by_priority.get(priority, 0) + 1
+            acquired = self.stats["acquired"]
+            return {
+                "rpm": self.requests.per_minute,
+                "tpm": self.tokens.per_minute,
+                "queue_depth": len(self._waiters),
+                "queue_depth_by_priority": depth_by_priority,
+                "acquired": acquired,
+                "waited": self.stats["waited"],
+                "avg_wait_seconds": round(self.stats["wait_seconds"] / acquired, 4) if acquired else 0.0,
+                "max_wait_seconds": round(self.stats["max_wait_seconds"], 4),
+                "throttled": self.stats["throttled"],
+                "by_priority": {
+                    priority: {"acquired": values["acquired"],
+                               "avg_wait_seconds": round(values["wait_seconds"] / values["acquired"], 4)}
+                    for priority, values in self.stats["by_priority"].items()
+                }
+            }
+
+# Un limiteur par déploiement, partagé par les agents, le routeur et l'indexation
+_LIMITERS: Dict[str, DeploymentRateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+def _configured_limits(deployment: str) -> Dict[str, float]:
+    limits = {}
+    if AZURE_RATE_LIMITS:
+        try:
+            limits = json.loads(AZURE_RATE_LIMITS).get(deployment, {})
+        except (ValueError, AttributeError):
+            raise ValueError("AZURE_RATE_LIMITS doit être un objet JSON {déploiement: {\"rpm\": ..., \"tpm\": ...}}")
+    return {"rpm": float(limits.get("rpm", LLM_DEFAULT_RPM)), "tpm": float(limits.get("tpm", LLM_DEFAULT_TPM))}
+
+def get_rate_limiter(name: str, deployment: Optional[str] = None) -> DeploymentRateLimiter:
+    """
+    Limiteur partagé d'un point d'accès
+
+    Args:
+        name: Identifiant du point d'accès (point d'accès + déploiement)
+        deployment: Nom du déploiement, pour lire ses quotas dans AZURE_RATE_LIMITS
+    """
+    with _LIMITERS_LOCK:
+        if name not in _LIMITERS:
+            limits = _configured_limits(deployment or name)
+            _LIMITERS[name] = DeploymentRateLimiter(name, rpm=limits["rpm"], tpm=limits["tpm"])
+        return _LIMITERS[name]
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Profondeur de file, attentes et 429 observés, par point d'accès"""
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    return {limiter.name: limiter.snapshot() for limiter in limiters}
+
+class RateLimitedEmbeddings(Embeddings):
+    """Embeddings soumis au limiteur partagé du déploiement (indexation et recherche)"""
+
+    def __init__(self, embeddings: Embeddings, name: str, deployment: Optional[str] = None, chunk_size: int = 2048):
+        self.embeddings = embeddings
+        self.limiter = get_rate_limiter(name, deployment)
+        self.chunk_size = chunk_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        with trace_span("embedding", texts=len(texts), deployment=self.limiter.name):
+            self.limiter.acquire(tokens, requests=max(1, math.ceil(len(texts) / self.chunk_size)))
+            # L'API d'embeddings ne renvoie pas l'usage à LangChain : tokens estimés
+            record_tokens(tokens)
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        tokens = estimate_tokens(text)
+        with trace_span("embedding", texts=1, deployment=self.limiter.name):
+            self.limiter.acquire(tokens)
+            record_tokens(tokens)
+            return self.embeddings.embed_query(text)
@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from utils.rate_limiter import estimate_tokens
+
+MODE_REPLAY = "replay"
+MODE_RECORD = "record"
+
+class Cassette:
+    """
+    Enregistrement des réponses LLM, embeddings et recherches web, indexées par empreinte de la requête
+
+    En mode record, les appels réels sont enregistrés puis rejoués à l'identique hors ligne.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(kind: str, payload: str) -> str:
+        return hashlib.sha256(f"{kind}\0{payload}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self.entries[key] = value
+
+    def save(self):
+        """Écriture atomique du fichier de la cassette"""
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+def synthetic_latency(key: str, latency: float, jitter: float) -> float:
+    """Latence déterministe pour une requête donnée : latency ± jitter (fraction), tirée de son empreinte"""
+    if latency <= 0:
+        return 0.0
+    return max(0.0, latency * (1 + random.Random(key).uniform(-jitter, jitter)))
+
+def default_answer(prompt: str) -> str:
+    """Réponse synthétique déterministe, au format ReAct pour que les agents à outils terminent"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    return f"Final Answer: réponse synthétique {digest}"
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Modèle de chat hors ligne pour les benchmarks
+
+    Rejoue la réponse enregistrée pour un prompt identique ; à défaut, appelle recorder
+    (mode record) ou produit une réponse synthétique (synthesize). La latence simulée
+    dépend uniquement du prompt, ce qui rend les mesures reproductibles.
+    """
+
+    cassette: Any
+    recorder: Any = None
+    synthesize: Callable[[str], str] = default_answer
+    latency: float = 0.0
+    jitter: float = 0.2
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt = "\n".join(f"{message.type}: {message.content}" for message in messages)
+        key = Cassette.key("chat", prompt + "\0" + "|".join(stop or []))
+        entry = self.cassette.get(key)
+        if entry is None:
+            if self.recorder is not None:
+                result = self.recorder._generate(messages, stop=stop, **kwargs)
+                usage = (result.llm_output or {}).get("token_usage") or {}
+                entry = {"text": result.generations[0].text,
+                         "prompt_tokens": usage.get("prompt_tokens"),
+                         "completion_tokens": usage.get("completion_tokens")}
+                self.cassette.put(key, entry)
+                return result
+            entry = {"text": self.synthesize(prompt)}
+
+        time.sleep(synthetic_latency(key, self.latency, self.jitter))
+        text = entry["text"]
+        prompt_tokens = entry.get("prompt_tokens") or estimate_tokens(prompt)
+        completion_tokens = entry.get("completion_tokens") or estimate_tokens(text)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={"token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                        "total_tokens": prompt_tokens + completion_tokens}}
+        )
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+def hashed_embedding(text: str, dim: int = 1536) -> List[float]:
+    """Embedding déterministe par hachage des mots : des textes proches ont des vecteurs proches"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+class ReplayEmbeddings(Embeddings):
+    """Embeddings hors ligne pour les benchmarks : rejoués, enregistrés ou hachés (hashed_embedding)"""
+
+    def __init__(self, cassette: Cassette, recorder: Optional[Embeddings] = None, dim: int = 1536,
+                 latency: float = 0.0, jitter: float = 0.2):
+        self.cassette = cassette
+        self.recorder = recorder
+        self.dim = dim
+        self.latency = latency
+        self.jitter = jitter
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [Cassette.key("embedding", text) for text in texts]
+        vectors = [self.cassette.get(key) for key in keys]
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing and self.recorder is not None:
+            for index, vector in zip(missing, self.recorder.embed_documents([texts[i] for i in missing])):
+                self.cassette.put(keys[index], vector)
+                vectors[index] = vector
+        else:
+            for index in missing:
+                vectors[index] = hashed_embedding(texts[index], self.dim)
+        # Un seul appel réseau simulé par lot, comme l'API d'embeddings
+        time.sleep(synthetic_latency("".join(keys), self.latency, self.jitter))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class ReplaySearch:
+    """Outil de recherche web hors ligne (même interface run() que SerpAPIWrapper)"""
+
+    def __init__(self, cassette: Cassette, recorder: Any = None, latency: float = 0.0, jitter: float = 0.2):
+        self.cassette = cassette
+        self.recorder = recorder
+        self.latency = latency
+        self.jitter = jitter
+
+    def run(self, query: str) -> str:
+        key = Cassette.key("search", query)
+        result = self.cassette.get(key)
+        if result is None:
+            if self.recorder is not None:
+                result = str(self.recorder.run(query))
+                self.cassette.put(key, result)
+                return result
+            result = f"Résultats synthétiques pour « {query} »"
+        time.sleep(synthetic_latency(key, self.latency, self.jitter))
+        return result
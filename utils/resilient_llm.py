@@ -0,0 +1,333 @@
+import json
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional
+
+import openai
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from utils.deadline import check_deadline, remaining_time
+from utils.tracing import trace_span, record_tokens
+from utils.rate_limiter import get_rate_limiter, estimate_tokens, COMPLETION_TOKENS_ESTIMATE
+from config import (
+    AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_API_VERSION, AZURE_REQUEST_TIMEOUT, AZURE_OPENAI_DEPLOYMENTS,
+    LLM_MAX_ATTEMPTS, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_HEDGE_AFTER, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET
+)
+
+class CircuitOpenError(Exception):
+    """Le déploiement est écarté par son disjoncteur"""
+
+class LLMUnavailableError(Exception):
+    """Aucun déploiement n'est disponible pour traiter l'appel"""
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Disjoncteur d'un déploiement
+
+    Après failure_threshold échecs consécutifs, le déploiement est écarté pendant
+    reset_timeout secondes ; un seul appel d'essai est ensuite autorisé (demi-ouvert) :
+    son succès referme le disjoncteur, son échec le rouvre. Un essai réservé resté sans
+    résultat pendant reset_timeout (appel jamais abouti) rouvre le disjoncteur.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+
+    def _expire_probe(self, now: float):
+        if self.state == BREAKER_HALF_OPEN and now - self.probe_at >= self.reset_timeout:
+            self.state = BREAKER_OPEN
+            self.opened_at = now
+
+    def available(self) -> bool:
+        """Le déploiement pourrait être appelé maintenant (sans réserver l'essai du demi-ouvert)"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire_probe(now)
+            if self.state == BREAKER_CLOSED:
+                return True
+            return self.state == BREAKER_OPEN and now - self.opened_at >= self.reset_timeout
+
+    def allow(self) -> bool:
+        """Autorise un appel, en réservant l'essai unique du demi-ouvert : à appeler juste avant l'appel"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire_probe(now)
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = BREAKER_HALF_OPEN
+                self.probe_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == BREAKER_HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+
+class LLMBackend:
+    """Un déploiement Azure OpenAI (point d'accès + nom de déploiement), son disjoncteur et son limiteur de quota"""
+
+    def __init__(self, name: str, model: BaseChatModel, breaker: CircuitBreaker, deployment: Optional[str] = None):
+        self.name = name
+        self.model = model
+        self.breaker = breaker
+        self.deployment = deployment or name
+        self.limiter = get_rate_limiter(name, deployment)
+
+# Disjoncteurs et compteurs partagés par tous les clients du processus, par déploiement
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BACKEND_STATS: Dict[str, Dict[str, float]] = {}
+_ROUND_ROBIN: Dict[str, int] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+def _record_call(name: str, seconds: float, error: Optional[Exception] = None):
+    with _REGISTRY_LOCK:
+        stats = _BACKEND_STATS.setdefault(name, {"calls": 0, "failures": 0, "total_seconds": 0.0})
+        stats["calls"] += 1
+        stats["failures"] += error is not None
+        stats["total_seconds"] += seconds
+
+def get_llm_backend_stats() -> Dict[str, Dict[str, Any]]:
+    """Appels, échecs, latence moyenne et état du disjoncteur de chaque déploiement"""
+    with _REGISTRY_LOCK:
+        return {
+            name: {
+                "calls": int(stats["calls"]),
+                "failures": int(stats["failures"]),
+                "avg_seconds": round(stats["total_seconds"] / stats["calls"], 3) if stats["calls"] else 0.0,
+                "breaker": _BREAKERS[name].state if name in _BREAKERS else BREAKER_CLOSED
+            }
+            for name, stats in _BACKEND_STATS.items()
+        }
+
+def deployment_targets(deployment_name: str) -> List[Dict[str, str]]:
+    """Points d'accès configurés pour un déploiement logique (AZURE_OPENAI_DEPLOYMENTS)"""
+    targets = None
+    if AZURE_OPENAI_DEPLOYMENTS:
+        try:
+            targets = json.loads(AZURE_OPENAI_DEPLOYMENTS).get(deployment_name)
+        except (ValueError, AttributeError):
+            raise ValueError("AZURE_OPENAI_DEPLOYMENTS doit être un objet JSON {déploiement: [points d'accès]}")
+    if not targets:
+        targets = [{"endpoint": AZURE_OPENAI_ENDPOINT, "deployment": deployment_name}]
+    return [
+        {
+            "endpoint": target.get("endpoint", AZURE_OPENAI_ENDPOINT),
+            "deployment": target.get("deployment", deployment_name),
+            "api_key": target.get("api_key", AZURE_OPENAI_API_KEY),
+            "api_version": target.get("api_version", AZURE_API_VERSION)
+        }
+        for target in targets
+    ]
+
+def create_backends(deployment_name: str, temperature: float = 0.0, timeout: Optional[float] = None,
+                    targets: Optional[List[Dict[str, str]]] = None) -> List[LLMBackend]:
+    """Crée un client Azure (sans nouvelles tentatives internes) par point d'accès du déploiement"""
+    from langchain_openai import AzureChatOpenAI
+
+    backends = []
+    for target in targets or deployment_targets(deployment_name):
+        name = f"{target['endpoint']}#{target['deployment']}"
+        with _REGISTRY_LOCK:
+            breaker = _BREAKERS.setdefault(name, CircuitBreaker())
+        model = AzureChatOpenAI(
+            azure_deployment=target["deployment"],
+            openai_api_version=target["api_version"],
+            azure_endpoint=target["endpoint"],
+            api_key=target["api_key"],
+            temperature=temperature,
+            timeout=timeout or AZURE_REQUEST_TIMEOUT,
+            max_retries=0,
+            include_response_headers=True
+        )
+        backends.append(LLMBackend(name, model, breaker, deployment=target["deployment"]))
+    return backends
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+def is_retryable(error: Exception) -> bool:
+    """Erreur transitoire : quota (429), erreur serveur (5xx), délai ou connexion"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, CircuitOpenError)):
+        return True
+    status = _status_code(error)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+def is_failover(error: Exception) -> bool:
+    """Erreur propre au déploiement : un autre déploiement peut réussir"""
+    return is_retryable(error) or _status_code(error) in (401, 403, 404)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Délai demandé par le serveur (en-têtes retry-after-ms / retry-after), en secondes"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+class ResilientChatModel(BaseChatModel):
+    """
+    Modèle de chat réparti sur plusieurs déploiements Azure OpenAI
+
+    - Répartition : les déploiements sont sollicités à tour de rôle.
+    - Bascule : une erreur propre à un déploiement (429, 5xx, délai, 401/403/404) fait
+      passer immédiatement au suivant ; les autres erreurs (400...) sont levées telles quelles.
+    - Nouvelles tentatives : quand tous ont échoué, attente exponentielle avec gigue
+      (ou le délai retry-after du serveur) avant un nouveau tour, dans la limite de
+      l'échéance de la requête.
+    - Doublement (hedging) : si hedge_after > 0 et que le déploiement n'a pas répondu
+      après ce délai, le suivant est sollicité en parallèle ; la première réponse l'emporte.
+    - Disjoncteurs partagés par le processus : un déploiement défaillant est écarté.
+    """
+
+    backends: List[Any]
+    max_attempts: int = LLM_MAX_ATTEMPTS
+    backoff_base: float = LLM_BACKOFF_BASE
+    backoff_max: float = LLM_BACKOFF_MAX
+    hedge_after: float = LLM_HEDGE_AFTER
+
+    @property
+    def _llm_type(self) -> str:
+        return "resilient-azure-openai"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"backends": [backend.name for backend in self.backends]}
+
+    def _candidates(self) -> List[LLMBackend]:
+        """Déploiements à essayer, en commençant par le suivant dans le tour de rôle"""
+        key = "|".join(backend.name for backend in self.backends)
+        with _REGISTRY_LOCK:
+            start = _ROUND_ROBIN.get(key, 0)
+            _ROUND_ROBIN[key] = start + 1
+        rotated = self.backends[start % len(self.backends):] + self.backends[:start % len(self.backends)]
+        # L'essai d'un disjoncteur demi-ouvert n'est réservé (allow) qu'au moment de l'appel
+        return [backend for backend in rotated if backend.breaker.available()]
+
+    def _call(self, backend: LLMBackend, messages: List[BaseMessage], stop: Optional[List[str]],
+              kwargs: Dict[str, Any]) -> ChatResult:
+        if not backend.breaker.allow():
+            # Essai du demi-ouvert déjà pris par un appel concurrent
+            raise CircuitOpenError(f"Déploiement {backend.name} écarté par son disjoncteur")
+        with trace_span("llm", backend=backend.name, deployment=backend.deployment) as span:
+            # Réserver le quota du déploiement (par priorité) avant l'appel
+            estimated = (sum(estimate_tokens(str(message.content)) for message in messages)
+                         + kwargs.get("max_tokens", COMPLETION_TOKENS_ESTIMATE))
+            waited = backend.limiter.acquire(estimated)
+            
+            remaining = remaining_time()
+            if remaining is not None:
+                # Le délai réseau de l'appel ne dépasse pas l'échéance de la requête
+                kwargs = {**kwargs, "timeout": max(remaining, 0.001)}
+            start_time = time.perf_counter()
+            try:
+                result = backend.model._generate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                _record_call(backend.name, time.perf_counter() - start_time, e)
+                if _status_code(e) == 429:
+                    backend.limiter.observe_throttle(_retry_after(e))
+                backend.limiter.observe_headers(getattr(getattr(e, "response", None), "headers", None))
+                if is_failover(e):
+                    backend.breaker.record_failure()
+                raise
+            _record_call(backend.name, time.perf_counter() - start_time)
+            backend.breaker.record_success()
+            
+            usage = (result.llm_output or {}).get("token_usage") or {}
+            backend.limiter.settle(estimated, usage.get("total_tokens"))
+            if result.generations:
+                backend.limiter.observe_headers((result.generations[0].generation_info or {}).get("headers"))
+            record_tokens(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+            if span is not None:
+                span.set_attribute("quota_wait_seconds", round(waited, 4))
+            result.llm_output = {**(result.llm_output or {}), "backend": backend.name}
+            return result
+
+    def _call_hedged(self, primary: LLMBackend, secondary: Optional[LLMBackend], messages, stop, kwargs,
+                     launched: List[LLMBackend]) -> ChatResult:
+        """Appelle primary ; sollicite aussi secondary si primary tarde plus de hedge_after secondes"""
+        launched.append(primary)
+        if secondary is None or self.hedge_after <= 0:
+            return self._call(primary, messages, stop, kwargs)
+
+        futures = [_HEDGE_EXECUTOR.submit(contextvars.copy_context().run, self._call, primary, messages, stop, kwargs)]
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            launched.append(secondary)
+            futures.append(_HEDGE_EXECUTOR.submit(contextvars.copy_context().run,
+                                                  self._call, secondary, messages, stop, kwargs))
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=remaining_time(), return_when=FIRST_COMPLETED)
+            if not done:
+                check_deadline("llm")
+            for future in done:
+                if future.exception() is None:
+                    # La requête perdante se termine en arrière-plan, sa réponse est ignorée
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        last_error = None
+        for attempt in range(max(1, self.max_attempts)):
+            check_deadline("llm")
+            candidates = self._candidates()
+            if not candidates:
+                last_error = last_error or LLMUnavailableError("Tous les déploiements sont écartés par leur disjoncteur")
+            index = 0
+            while index < len(candidates):
+                primary = candidates[index]
+                secondary = candidates[index + 1] if index + 1 < len(candidates) else None
+                launched = []
+                try:
+                    return self._call_hedged(primary, secondary, messages, stop, kwargs, launched)
+                except Exception as e:
+                    if not is_failover(e):
+                        raise
+                    last_error = e
+                index += len(launched)
+
+            if attempt + 1 >= self.max_attempts or not is_retryable(last_error):
+                break
+            delay = _retry_after(last_error)
+            if delay is None:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+            remaining = remaining_time()
+            if remaining is not None and delay >= remaining:
+                break
+            time.sleep(delay)
+        raise last_error
@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# Ajouter le répertoire parent au path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TRACING_ENABLED, TRACE_EXPORT_PATH, METRICS_PORT
+
+# Bornes des histogrammes de durée (secondes)
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# Compteurs cumulés d'un span vers ses ancêtres (tokens et cache de toute la sous-arborescence)
+COUNTERS = ("prompt_tokens", "completion_tokens", "cache_hits", "cache_misses")
+
+class Span:
+    """
+    Étape chronométrée d'une requête, à la manière d'un span OpenTelemetry
+
+    Les spans d'une même requête partagent un trace_id et sont reliés par parent_id ;
+    le span courant suit la requête dans les threads (contextvars copiés par _submit
+    et call_with_deadline).
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.status = "ok"
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, counter: str, amount: int):
+        """Incrémente un compteur du span et de tous ses ancêtres"""
+        span = self
+        while span is not None:
+            span.counters[counter] += amount
+            span = span.parent
+
+    def end(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.start,
+            "duration": round(self.duration or 0.0, 6),
+            "status": self.status,
+            "attributes": self.attributes,
+            **self.counters
+        }
+
+_CURRENT: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _CURRENT.get()
+
+@contextmanager
+def trace_span(name: str, **attributes: Any):
+    """
+    Chronomètre le bloc comme une étape de la requête en cours
+
+    Exemple:
+        with trace_span("recherche_documents", limit=5) as span:
+            ...
+            span.set_attribute("results", len(results))
+
+    Yields:
+        Le span créé, ou None si le traçage est désactivé (TRACING_ENABLED)
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    span = Span(name, _CURRENT.get(), attributes)
+    token = _CURRENT.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _CURRENT.reset(token)
+        span.end()
+        _export(span)
+
+def set_span_attribute(key: str, value: Any):
+    """Ajoute un attribut au span courant (sans effet hors span)"""
+    span = _CURRENT.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+def record_tokens(prompt_tokens: Optional[int] = 0, completion_tokens: Optional[int] = 0):
+    """Comptabilise les tokens d'un appel dans le span courant et ses ancêtres"""
+    span = _CURRENT.get()
+    if span is not None:
+        span.add("prompt_tokens", prompt_tokens or 0)
+        span.add("completion_tokens", completion_tokens or 0)
+
+def record_cache(hit: bool):
+    """Comptabilise un succès ou un échec de cache dans le span courant et ses ancêtres"""
+    span = _CURRENT.get()
+    if span is not None:
+        span.add("cache_hits" if hit else "cache_misses", 1)
+
+class StageMetrics:
+    """Métriques agrégées par étape : nombre, erreurs, histogramme de durée, tokens et cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+
+    def observe(self, span: Span):
+        with self._lock:
+            stage = self._stages.setdefault(span.name, {
+                "count": 0, "errors": 0, "seconds": 0.0, "buckets": [0] * len(LATENCY_BUCKETS),
+                **dict.fromkeys(COUNTERS, 0)
+            })
+            stage["count"] += 1
+            stage["errors"] += span.status != "ok"
+            stage["seconds"] += span.duration
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if span.duration <= bound:
+                    stage["buckets"][index] += 1
+            for counter in COUNTERS:
+                stage[counter] += span.counters[counter]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: {**values, "buckets": list(values["buckets"])} for name, values in self._stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def render_prometheus(self) -> str:
+        """Métriques au format d'exposition texte de Prometheus"""
+        lines = [
+            "# HELP agent_stage_duration_seconds Durée des étapes des requêtes",
+            "# TYPE agent_stage_duration_seconds histogram"
+        ]
+        stages = self.snapshot()
+        for name, values in sorted(stages.items()):
+            for bound, count in zip(LATENCY_BUCKETS, values["buckets"]):
+                lines.append(f'agent_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'agent_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {values["count"]}')
+            lines.append(f'agent_stage_duration_seconds_sum{{stage="{name}"}} {values["seconds"]:.6f}')
+            lines.append(f'agent_stage_duration_seconds_count{{stage="{name}"}} {values["count"]}')
+        for metric, help_text in (("errors", "Étapes terminées en erreur"),
+                                  ("prompt_tokens", "Tokens d'entrée consommés (sous-étapes comprises)"),
+                                  ("completion_tokens", "Tokens de sortie générés (sous-étapes comprises)"),
+                                  ("cache_hits", "Succès de cache (sous-étapes comprises)"),
+                                  ("cache_misses", "Échecs de cache (sous-étapes comprises)")):
+            lines.append(f"# HELP agent_stage_{metric}_total {help_text}")
+            lines.append(f"# TYPE agent_stage_{metric}_total counter")
+            for name, values in sorted(stages.items()):
+                lines.append(f'agent_stage_{metric}_total{{stage="{name}"}} {values[metric]}')
+        return "\n".join(lines) + "\n"
+
+METRICS = StageMetrics()
+
+_EXPORT_LOCK = threading.Lock()
+_METRICS_SERVER = None
+# Démarrage du serveur de métriques déjà tenté sans succès (port occupé...) : ne pas réessayer à chaque span
+_METRICS_SERVER_FAILED = False
+# Erreurs d'export déjà signalées (une seule fois par type d'erreur)
+_REPORTED_EXPORT_ERRORS = set()
+
+def _report_export_error(error: Exception):
+    key = (type(error).__name__, str(error))
+    if key not in _REPORTED_EXPORT_ERRORS:
+        _REPORTED_EXPORT_ERRORS.add(key)
+        print(f"⚠️ Erreur d'export des traces (ignorée): {str(error)}")
+
+def _export(span: Span):
+    """Enregistre le span (métriques, fichier JSON Lines) ; une erreur d'export n'interrompt jamais l'appel tracé"""
+    METRICS.observe(span)
+    if METRICS_PORT and _METRICS_SERVER is None and not _METRICS_SERVER_FAILED:
+        try:
+            start_metrics_server(METRICS_PORT)
+        except Exception as e:
+            _report_export_error(e)
+    if TRACE_EXPORT_PATH:
+        try:
+            line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+            with _EXPORT_LOCK:
+                directory = os.path.dirname(TRACE_EXPORT_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            _report_export_error(e)
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """Sert les métriques sur http://host:port/metrics dans un thread de fond (un seul serveur par processus)"""
+    global _METRICS_SERVER, _METRICS_SERVER_FAILED
+    with _EXPORT_LOCK:
+        if _METRICS_SERVER is not None:
+            return _METRICS_SERVER
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = METRICS.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError:
+            _METRICS_SERVER_FAILED = True
+            raise
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        _METRICS_SERVER = server
+        print(f"📈 Métriques exposées sur http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def summarize_trace_file(path: str) -> Dict[str, Dict[str, Any]]:
+    """Latences (p50/p95/max), erreurs, tokens et cache par étape d'un fichier de spans JSON Lines"""
+    durations: Dict[str, List[float]] = {}
+    totals: Dict[str, Dict[str, int]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            span = json.loads(line)
+            durations.setdefault(span["name"], []).append(span["duration"])
+            stage = totals.setdefault(span["name"], {"errors": 0, **dict.fromkeys(COUNTERS, 0)})
+            stage["errors"] += span["status"] != "ok"
+            for counter in COUNTERS:
+                stage[counter] += span.get(counter, 0)
+    return {
+        name: {
+            "count": len(values),
+            "p50": round(_percentile(values, 0.5), 4),
+            "p95": round(_percentile(values, 0.95), 4),
+            "max": round(max(values), 4),
+            **totals[name]
+        }
+        for name, values in durations.items()
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Résume un fichier de spans (TRACE_EXPORT_PATH) par étape")
+    parser.add_argument('path', nargs='?', default=TRACE_EXPORT_PATH, help='Fichier JSON Lines des spans')
+    args = parser.parse_args()
+
+    if not args.path or not os.path.exists(args.path):
+        print("Aucun fichier de spans: définissez TRACE_EXPORT_PATH ou passez un chemin")
+        sys.exit(1)
+
+    summary = summarize_trace_file(args.path)
+    print(f"{'étape':<28}{'n':>7}{'p50 (s)':>10}{'p95 (s)':>10}{'max (s)':>10}{'erreurs':>9}"
+          f"{'tok. in':>10}{'tok. out':>10}{'cache':>9}")
+    for name, stage in sorted(summary.items(), key=lambda item: -item[1]["p95"]):
+        print(f"{name:<28}{stage['count']:>7}{stage['p50']:>10}{stage['p95']:>10}{stage['max']:>10}"
+              f"{stage['errors']:>9}{stage['prompt_tokens']:>10}{stage['completion_tokens']:>10}"
+              f"{stage['cache_hits']:>4}/{stage['cache_hits'] + stage['cache_misses']:<4}")
@@ -0,0 +1,153 @@
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+import argparse
+import traceback
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+# Ajouter le répertoire parent au path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.vectorstores import VECTOR_BACKENDS
+
+class HashEmbeddings:
+    """Embeddings déterministes et hors ligne : vecteur pseudo-aléatoire normalisé par texte"""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).normal(size=self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+TEXTS = [f"passage {i:03d} sur la sécurité des installations de gaz" for i in range(40)]
+
+def _fresh_store(backend: str, directory: str):
+    return VECTOR_BACKENDS[backend](HashEmbeddings(), directory)
+
+def check_empty_store(backend: str, directory: str):
+    """Une base vide retourne une liste vide"""
+    store = _fresh_store(backend, directory)
+    assert store.similarity_search_with_score(TEXTS[0], k=3) == []
+
+def check_exact_match_first(backend: str, directory: str):
+    """Un texte indexé est son propre plus proche voisin, avec une distance quasi nulle"""
+    store = _fresh_store(backend, directory)
+    store.add_texts(TEXTS, metadatas=[{"row": i} for i in range(len(TEXTS))])
+    for i in (0, 17, 39):
+        results = store.similarity_search_with_score(TEXTS[i], k=3)
+        assert results[0][0].page_content == TEXTS[i], f"attendu {TEXTS[i]!r}, obtenu {results[0][0].page_content!r}"
+        assert results[0][1] < 1e-3, f"distance {results[0][1]} pour un texte identique"
+
+def check_k_and_ordering(backend: str, directory: str):
+    """Au plus k résultats, triés par distance croissante, métadonnées conservées"""
+    store = _fresh_store(backend, directory)
+    store.add_texts(TEXTS, metadatas=[{"row": i} for i in range(len(TEXTS))])
+    results = store.similarity_search_with_score(TEXTS[5], k=7)
+    assert len(results) == 7
+    scores = [score for _, score in results]
+    assert scores == sorted(scores), f"scores non triés: {scores}"
+    assert all("row" in doc.metadata for doc, _ in results)
+    assert len(store.similarity_search_with_score(TEXTS[5], k=100)) == len(TEXTS)
+
+def check_metadata_filter(backend: str, directory: str):
+    """Le filtre de métadonnées (égalité et $in) restreint les résultats"""
+    store = _fresh_store(backend, directory)
+    store.add_texts(TEXTS, metadatas=[{"doc_id": f"d{i % 4}"} for i in range(len(TEXTS))])
+    results = store.similarity_search_with_score(TEXTS[0], k=5, filter={"doc_id": "d2"})
+    assert results and all(doc.metadata["doc_id"] == "d2" for doc, _ in results)
+    results = store.similarity_search_with_score(TEXTS[0], k=5, filter={"doc_id": {"$in": ["d1", "d3"]}})
+    assert results and all(doc.metadata["doc_id"] in ("d1", "d3") for doc, _ in results)
+
+def check_delete(backend: str, directory: str):
+    """Une entrée supprimée n'est plus retournée"""
+    store = _fresh_store(backend, directory)
+    ids = store.add_texts(TEXTS)
+    store.delete(ids=[ids[3]])
+    results = store.similarity_search_with_score(TEXTS[3], k=5)
+    assert all(doc.page_content != TEXTS[3] for doc, _ in results)
+
+def check_get_by_filter(backend: str, directory: str):
+    """get(where=...) retourne les identifiants des entrées filtrées (suppression par document)"""
+    store = _fresh_store(backend, directory)
+    ids = store.add_texts(TEXTS, metadatas=[{"doc_id": f"d{i % 4}"} for i in range(len(TEXTS))])
+    expected = {ids[i] for i in range(len(TEXTS)) if i % 4 == 2}
+    assert set(store.get(where={"doc_id": "d2"})["ids"]) == expected
+    store.delete(ids=sorted(expected))
+    assert store.get(where={"doc_id": "d2"})["ids"] == []
+
+def check_persistence(backend: str, directory: str):
+    """Une nouvelle instance sur le même répertoire retrouve les données"""
+    store = _fresh_store(backend, directory)
+    store.add_texts(TEXTS[:20])
+    del store
+    reopened = _fresh_store(backend, directory)
+    reopened.add_texts(TEXTS[20:])
+    results = reopened.similarity_search_with_score(TEXTS[2], k=1)
+    assert results[0][0].page_content == TEXTS[2]
+    results = reopened.similarity_search_with_score(TEXTS[30], k=1)
+    assert results[0][0].page_content == TEXTS[30]
+
+def check_sees_other_instance_writes(backend: str, directory: str):
+    """Une instance déjà ouverte voit les ajouts et suppressions faits par une autre (ex: autre processus)"""
+    reader = _fresh_store(backend, directory)
+    writer = _fresh_store(backend, directory)
+    ids = writer.add_texts(TEXTS[:10])
+    results = reader.similarity_search_with_score(TEXTS[3], k=1)
+    assert results and results[0][0].page_content == TEXTS[3], "ajouts de l'autre instance invisibles"
+    writer.delete(ids=[ids[3]])
+    assert ids[3] not in reader.get()["ids"], "suppression de l'autre instance invisible"
+
+CHECKS: List[Callable] = [
+    check_empty_store,
+    check_exact_match_first,
+    check_k_and_ordering,
+    check_metadata_filter,
+    check_delete,
+    check_get_by_filter,
+    check_persistence,
+    check_sees_other_instance_writes,
+]
+
+def run_conformance(backends: List[str]) -> List[Tuple[str, str, bool, str]]:
+    """Exécute chaque vérification sur chaque backend, dans un répertoire temporaire neuf"""
+    results = []
+    for backend in backends:
+        for check in CHECKS:
+            directory = tempfile.mkdtemp(prefix=f"conformance_{backend}_")
+            try:
+                check(backend, directory)
+                results.append((backend, check.__name__, True, ""))
+            except Exception as e:
+                detail = str(e) or traceback.format_exc(limit=1)
+                results.append((backend, check.__name__, False, detail))
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Vérifie que chaque backend vectoriel respecte le même contrat')
+    parser.add_argument('--backends', type=str, default=','.join(sorted(VECTOR_BACKENDS)),
+                        help='Backends à vérifier, séparés par des virgules')
+    args = parser.parse_args()
+
+    results = run_conformance(args.backends.split(','))
+    failures = 0
+    for backend, name, passed, detail in results:
+        status = "✅" if passed else "❌"
+        print(f"{status} [{backend}] {name}" + (f": {detail}" if detail else ""))
+        failures += not passed
+
+    print(f"\n{len(results) - failures}/{len(results)} vérifications réussies")
+    sys.exit(1 if failures else 0)
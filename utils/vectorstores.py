@@ -0,0 +1,145 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config import (
+    VECTOR_BACKEND, VECTOR_DB_PATH, NUMPY_VECTOR_DB_PATH, QUANTIZED_VECTOR_DB_PATH,
+    VECTOR_QUANTIZATION, VECTOR_PQ_SUBVECTORS, VECTOR_RESCORE_FACTOR, VECTOR_IVF_LISTS, VECTOR_IVF_PROBES
+)
+
+# Registre des backends : nom -> fabrique (embeddings, persist_directory) -> VectorStore LangChain
+VECTOR_BACKENDS: Dict[str, Callable] = {}
+
+# Instances partagées par processus, indexées par (backend, répertoire)
+_VECTORSTORES = {}
+_VECTORSTORES_LOCK = threading.Lock()
+
+def matches_filter(metadata: Dict, filter: Optional[Dict]) -> bool:
+    """Filtre de métadonnées minimal (égalité, $eq, $in) compatible avec la syntaxe Chroma"""
+    if not filter:
+        return True
+    for key, expected in filter.items():
+        value = metadata.get(key)
+        if isinstance(expected, dict):
+            if "$in" in expected and value not in expected["$in"]:
+                return False
+            if "$eq" in expected and value != expected["$eq"]:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+def metadata_mask(metadatas: List[Dict], filter: Optional[Dict], columns: Optional[Dict[str, Any]] = None):
+    """
+    Version vectorisée de matches_filter sur toutes les métadonnées d'une base
+
+    Args:
+        columns: Cache des colonnes de métadonnées déjà extraites (clé -> tableau NumPy), à vider
+            par l'appelant lorsque les métadonnées changent
+
+    Returns:
+        Un tableau NumPy de booléens, une valeur par métadonnée
+    """
+    import numpy as np
+
+    mask = np.ones(len(metadatas), dtype=bool)
+    for key, expected in (filter or {}).items():
+        column = columns.get(key) if columns is not None else None
+        if column is None or len(column) < len(metadatas):
+            column = np.empty(len(metadatas), dtype=object)
+            column[:] = [metadata.get(key) for metadata in metadatas]
+            if columns is not None:
+                columns[key] = column
+        column = column[:len(metadatas)]
+        if isinstance(expected, dict):
+            if "$in" in expected:
+                accepted = np.zeros(len(metadatas), dtype=bool)
+                for value in expected["$in"]:
+                    accepted |= column == value
+                mask &= accepted
+            if "$eq" in expected:
+                mask &= column == expected["$eq"]
+        else:
+            mask &= column == expected
+    return mask
+
+def register_vector_backend(name: str):
+    """Décorateur enregistrant une fabrique de base vectorielle sous un nom"""
+    def decorator(factory):
+        VECTOR_BACKENDS[name] = factory
+        return factory
+    return decorator
+
+@register_vector_backend("chroma")
+def _create_chroma(embeddings, persist_directory: Optional[str] = None):
+    """Base Chroma persistante (float32, index HNSW)"""
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=persist_directory or VECTOR_DB_PATH, embedding_function=embeddings)
+
+@register_vector_backend("numpy")
+def _create_numpy(embeddings, persist_directory: Optional[str] = None):
+    """Recherche exacte en mémoire, pour les petits corpus et les tests"""
+    from utils.numpy_vectorstore import NumpyVectorStore
+    return NumpyVectorStore(embedding_function=embeddings, persist_directory=persist_directory or NUMPY_VECTOR_DB_PATH)
+
+@register_vector_backend("quantized")
+def _create_quantized(embeddings, persist_directory: Optional[str] = None):
+    """Index compact mappé en mémoire (int8/PQ), approché (ANN) si VECTOR_IVF_LISTS > 0"""
+    from utils.quantized_vectorstore import QuantizedVectorStore
+    return QuantizedVectorStore(
+        persist_directory=persist_directory or QUANTIZED_VECTOR_DB_PATH,
+        embedding_function=embeddings,
+        quantization=VECTOR_QUANTIZATION,
+        pq_subvectors=VECTOR_PQ_SUBVECTORS,
+        rescore_factor=VECTOR_RESCORE_FACTOR,
+        ivf_lists=VECTOR_IVF_LISTS,
+        ivf_probes=VECTOR_IVF_PROBES
+    )
+
+def create_vectorstore(embeddings, backend: str = VECTOR_BACKEND, persist_directory: Optional[str] = None,
+                       shared: bool = True):
+    """
+    Crée (ou réutilise) la base vectorielle du backend demandé
+
+    Args:
+        embeddings: Fonction d'embeddings LangChain
+        backend: Nom du backend enregistré (VECTOR_BACKEND par défaut)
+        persist_directory: Répertoire de stockage (par défaut celui de la génération d'index active,
+            ou du backend en l'absence de générations)
+        shared: Réutiliser l'instance déjà ouverte par ce processus
+
+    Raises:
+        ValueError: si le backend n'est pas enregistré
+    """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Backend vectoriel inconnu: {backend} (disponibles: {', '.join(sorted(VECTOR_BACKENDS))})")
+
+    if persist_directory is None:
+        # Génération d'index active (ou en construction dans ce contexte), sinon répertoire du backend
+        from utils.index_generations import generation_paths
+        paths = generation_paths(backend)
+        if paths:
+            persist_directory = paths["vectors"]
+
+    if not shared:
+        return VECTOR_BACKENDS[backend](embeddings, persist_directory)
+
+    key = (backend, persist_directory)
+    with _VECTORSTORES_LOCK:
+        if key not in _VECTORSTORES:
+            _VECTORSTORES[key] = VECTOR_BACKENDS[backend](embeddings, persist_directory)
+        return _VECTORSTORES[key]
+
+def release_vectorstores(directory: Optional[str], backend: Optional[str] = None):
+    """
+    Oublie les instances partagées stockées sous directory (génération d'index supprimée ou remplacée)
+
+    directory None : instances du répertoire par défaut de backend (index historique hors générations)
+    """
+    if directory is None:
+        stale = lambda key: key == (backend, None)
+    else:
+        prefix = directory.rstrip("/") + "/"
+        stale = lambda key: key[1] is not None and (key[1] + "/").startswith(prefix)
+    with _VECTORSTORES_LOCK:
+        for key in [key for key in _VECTORSTORES if stale(key)]:
+            del _VECTORSTORES[key]